@@ -0,0 +1,89 @@
+# benchmarks/benchmark_cache_backend.py
+"""
+Compara os backends do cache de dados brutos (SQLite x Parquet) em escrita,
+leitura completa e leitura com projeção de colunas.
+
+Usa as tabelas já presentes no cache local quando existirem; caso contrário,
+gera um DataFrame sintético com o formato do Orçado.
+
+Uso:
+    python -m benchmarks.benchmark_cache_backend [--linhas 500000] [--repeticoes 3]
+"""
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from processamento.extracao import (
+    TABELA_CC_CACHE, TABELA_ORCADO_CACHE, BackendCacheParquet, BackendCacheSQLite, obter_backend_cache,
+)
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def _gerar_orcado_sintetico(linhas: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'PROJETO': rng.choice([f"Projeto {i}" for i in range(800)], linhas),
+        'ACAO': rng.choice([f"Ação {i}" for i in range(2500)], linhas),
+        'UNIDADE': rng.choice([f"SP - Unidade {i}" for i in range(120)], linhas),
+        'ANO': rng.choice(['2023', '2024', '2025'], linhas),
+        'MES': rng.integers(1, 13, linhas),
+        'Descricao_PPA': rng.choice(['PPA 2025 - 2025/DEZ', 'PPA 2025 - 2025/JUN'], linhas),
+        'Codigo_Natureza_Orcamentaria': rng.choice([f"3.1.{i:02d}.01" for i in range(60)], linhas),
+        'Valor_Ajustado': rng.normal(10_000, 3_000, linhas).round(2),
+    })
+
+
+def _carregar_tabelas(linhas: int) -> dict[str, pd.DataFrame]:
+    backend = obter_backend_cache()
+    if backend.existe(TABELA_ORCADO_CACHE) and backend.existe(TABELA_CC_CACHE):
+        print(f"Usando as tabelas do cache local (backend '{backend.nome}').")
+        return {tabela: backend.carregar(tabela) for tabela in (TABELA_ORCADO_CACHE, TABELA_CC_CACHE)}
+    print(f"Cache local não encontrado. Usando Orçado sintético com {linhas} linhas.")
+    return {TABELA_ORCADO_CACHE: _gerar_orcado_sintetico(linhas)}
+
+
+def _cronometrar(funcao, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark dos backends do cache de dados brutos.")
+    parser.add_argument("--linhas", type=int, default=500_000, help="Linhas do Orçado sintético (sem cache local).")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições por medição (vale o menor tempo).")
+    args = parser.parse_args()
+
+    tabelas = _carregar_tabelas(args.linhas)
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [BackendCacheSQLite(Path(tmp) / "bench.db"), BackendCacheParquet(Path(tmp) / "parquet")]
+        print(f"\n{'tabela':<22}{'backend':<10}{'escrita (s)':>13}{'leitura (s)':>13}{'projeção (s)':>14}{'disco (MB)':>12}")
+        for tabela, df in tabelas.items():
+            colunas_projetadas = list(df.columns[:3])
+            for backend in backends:
+                t_escrita = _cronometrar(lambda: backend.salvar(tabela, df), args.repeticoes)
+                t_leitura = _cronometrar(lambda: backend.carregar(tabela), args.repeticoes)
+                t_projecao = _cronometrar(lambda: backend.carregar(tabela, colunas_projetadas), args.repeticoes)
+                arquivos = [backend.caminho] if backend.nome == "sqlite" else list(backend.diretorio.glob(f"{tabela}.parquet"))
+                tamanho_mb = sum(arquivo.stat().st_size for arquivo in arquivos) / 1024 / 1024
+                print(f"{tabela:<22}{backend.nome:<10}{t_escrita:>13.3f}{t_leitura:>13.3f}{t_projecao:>14.3f}{tamanho_mb:>12.1f}")
+            dtypes_sqlite = backends[0].carregar(tabela).dtypes.to_dict()
+            dtypes_parquet = backends[1].carregar(tabela).dtypes.to_dict()
+            if dtypes_parquet != df.dtypes.to_dict():
+                print(f"  ! Parquet não preservou os dtypes de '{tabela}'.")
+            if dtypes_sqlite != df.dtypes.to_dict():
+                print(f"  - SQLite alterou os dtypes de '{tabela}' (esperado).")
+        backends[0].limpar()
+
+
+if __name__ == "__main__":
+    main()
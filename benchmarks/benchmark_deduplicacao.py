@@ -0,0 +1,96 @@
+# benchmarks/benchmark_deduplicacao.py
+"""
+Compara a deduplicação no grão final antes de gravar no SQL: o groupby.agg
+antigo (soma ou 'first' em todas as colunas, projeção e dropna depois) contra
+processamento.deduplicacao.deduplicar_no_grao (projeção e descarte de chaves
+nulas antes, agregação por hash sobre a chave codificada).
+
+Usa um resultado enriquecido sintético, com as colunas auxiliares de texto que
+o fluxo carrega até a gravação e parte das linhas sem CODCCUSTO.
+
+Uso:
+    python -m benchmarks.benchmark_deduplicacao [--linhas 1000000] [--repeticoes 3]
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from processamento.deduplicacao import deduplicar_no_grao
+from processamento.esquema import aplicar_esquema
+
+logging.basicConfig(level=logging.WARNING)
+
+CHAVE_PRIMARIA_FINAL = ['ANO', 'MES', 'CODCCUSTO', 'PROJETO', 'ACAO', 'Codigo_Natureza_Orcamentaria']
+COLUNAS_FINAIS = ['ANO', 'MES', 'PROJETO', 'ACAO', 'UNIDADE', 'CODCCUSTO', 'Valor_Ajustado', 'Codigo_Natureza_Orcamentaria']
+
+
+def _gerar_resultado_sintetico(linhas: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    projetos = rng.integers(0, 800, linhas)
+    acoes = rng.integers(0, 2500, linhas)
+    df = pd.DataFrame({
+        'PROJETO': pd.Series([f"Projeto {i}" for i in range(800)]).to_numpy()[projetos],
+        'ACAO': pd.Series([f"Ação {i}" for i in range(2500)]).to_numpy()[acoes],
+        'UNIDADE': rng.choice([f"SP - Unidade {i}" for i in range(120)], linhas),
+        'ANO': rng.choice([2023, 2024, 2025], linhas),
+        'MES': rng.integers(1, 13, linhas),
+        'Descricao_PPA': rng.choice(['PPA 2025 - 2025/DEZ', 'PPA 2025 - 2025/JUN'], linhas),
+        'Codigo_Natureza_Orcamentaria': rng.choice([f"3.1.{i:02d}.01" for i in range(60)], linhas),
+        'Valor_Ajustado': rng.normal(10_000, 3_000, linhas).round(2),
+        'CHAVE_CONCAT': [f"Projeto {p}|Ação {a}" for p, a in zip(projetos, acoes)],
+    })
+    codccusto = pd.Series([f"1.{p:03d}.{a:04d}" for p, a in zip(projetos, acoes)], dtype=object)
+    df['CODCCUSTO'] = codccusto.where(rng.random(linhas) > 0.05)
+    return aplicar_esquema(df)
+
+
+def _deduplicar_groupby_agg(df: pd.DataFrame) -> pd.DataFrame:
+    # Caminho anterior de main.preparar_resultado_para_sql.
+    chave = [col for col in CHAVE_PRIMARIA_FINAL if col in df.columns]
+    regras_agg = {col: ('sum' if pd.api.types.is_numeric_dtype(df[col]) else 'first') for col in df.columns if col not in chave}
+    df_agregado = df.groupby(chave, as_index=False, observed=True).agg(regras_agg)
+    df_final = df_agregado[[col for col in COLUNAS_FINAIS if col in df_agregado.columns]].copy()
+    df_final.dropna(subset=['CODCCUSTO'], inplace=True)
+    return df_final
+
+
+def _cronometrar(funcao, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark da deduplicação no grão final.")
+    parser.add_argument("--linhas", type=int, default=1_000_000, help="Linhas do resultado sintético.")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições por medição (vale o menor tempo).")
+    args = parser.parse_args()
+
+    df = _gerar_resultado_sintetico(args.linhas)
+    print(f"Resultado sintético: {len(df)} linhas, {len(df.columns)} colunas.")
+    t_antigo = _cronometrar(lambda: _deduplicar_groupby_agg(df), args.repeticoes)
+    t_novo = _cronometrar(lambda: deduplicar_no_grao(df, CHAVE_PRIMARIA_FINAL, COLUNAS_FINAIS), args.repeticoes)
+
+    esperado = _deduplicar_groupby_agg(df).reset_index(drop=True)
+    resultado, estatisticas = deduplicar_no_grao(df, CHAVE_PRIMARIA_FINAL, COLUNAS_FINAIS)
+    chaves_iguais = resultado[CHAVE_PRIMARIA_FINAL].astype(str).equals(esperado[CHAVE_PRIMARIA_FINAL].astype(str))
+    somas_iguais = np.allclose(resultado['Valor_Ajustado'], esperado['Valor_Ajustado'])
+
+    print(f"\n{'caminho':<28}{'tempo (s)':>11}{'linhas':>10}")
+    print(f"{'groupby.agg (antigo)':<28}{t_antigo:>11.3f}{len(esperado):>10}")
+    print(f"{'deduplicar_no_grao':<28}{t_novo:>11.3f}{len(resultado):>10}")
+    print(f"\nGanho: {t_antigo / t_novo:.1f}x. Resultados equivalentes: {chaves_iguais and somas_iguais}.")
+    print(
+        f"Duplicidade: {estatisticas.linhas_agregadas} linhas agregadas em {estatisticas.grupos_duplicados} chaves "
+        f"(até {estatisticas.multiplicidade_maxima} linhas por chave); {estatisticas.linhas_chave_nula} linhas com chave nula."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# compilar_mapa_correcoes.py
+import argparse
+import json
+import logging
+
+from sqlalchemy import text
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+from config.config import CONFIG
+from processamento.regras_correcao import SUPORTE_MINIMO_PADRAO, compilar_regras
+from processamento.validacao import carregar_mapa_correcoes, preparar_dados_para_validacao
+
+
+def verificar_compilacao(mapa: dict, mapa_compilado: dict) -> list[str]:
+    """Retorna as chaves do mapa original que o mapa compilado NÃO corrige para o mesmo destino."""
+    from processamento.regras_correcao import RegrasCorrecao
+    regras = RegrasCorrecao.do_mapa(mapa_compilado)
+    return [quebrada for quebrada, correta in mapa.items() if '*' not in quebrada.split('|') and regras.corrigir_chave(quebrada) != correta]
+
+
+def verificar_chaves_validas(mapa: dict, mapa_compilado: dict, chaves_validas: list[str]) -> list[str]:
+    """
+    Retorna as chaves válidas no CC que o mapa compilado reescreveria sem que o
+    mapa original as corrigisse. Uma regra que alcança uma chave dessas
+    moveria linhas corretas para outra chave (ou para fora do CC).
+    """
+    from processamento.regras_correcao import RegrasCorrecao
+    regras = RegrasCorrecao.do_mapa(mapa_compilado)
+    return [chave for chave in chaves_validas if chave not in mapa and regras.corrigir_chave(chave) is not None]
+
+
+def carregar_chaves_validas_cc() -> list[str]:
+    """Chaves 'PROJETO|ACAO|UNIDADE|ANO' da referência de CC, preparada como no pipeline principal."""
+    from processamento.chaves import obter_codificador
+    from processamento.extracao import TABELA_CC_CACHE, obter_dado_bruto
+    df_cc = preparar_dados_para_validacao(obter_dado_bruto(TABELA_CC_CACHE), ['PROJETO', 'ACAO', 'UNIDADE'], incluir_ano_na_chave=True)
+    return [chave for chave in obter_codificador().decodificar(df_cc['CHAVE_COD'].unique()) if chave is not None]
+
+
+def gravar_no_sql(mapa_compilado: dict) -> None:
+    """Substitui o conteúdo de dbo.MapaCorrecoesChaves pelo mapa compilado, numa única transação."""
+    from config.database import get_conexao
+    engine = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM dbo.MapaCorrecoesChaves"))
+        connection.execute(
+            text("INSERT INTO dbo.MapaCorrecoesChaves (ChaveQuebrada, ChaveCorreta) VALUES (:quebrada, :correta)"),
+            [{"quebrada": quebrada, "correta": correta} for quebrada, correta in mapa_compilado.items()],
+        )
+    # A próxima sincronização da cópia local detecta os baldes alterados.
+    logging.info("dbo.MapaCorrecoesChaves regravado com %d entradas.", len(mapa_compilado))
+
+
+def gravar_no_json(mapa_compilado: dict) -> None:
+    with open(CONFIG.paths.mapa_correcoes, 'w', encoding='utf-8') as f:
+        json.dump(mapa_compilado, f, ensure_ascii=False, indent=4)
+    logging.info("'%s' regravado com %d entradas.", CONFIG.paths.mapa_correcoes, len(mapa_compilado))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compila as correções de chave inteira em regras por campo (ex.: PROJETO X -> Y) e relata o ganho."
+    )
+    parser.add_argument("--fonte", choices=["sql", "json"], default="sql", help="Mapa compilado: dbo.MapaCorrecoesChaves (padrão) ou dados/mapa_correcoes.json.")
+    parser.add_argument("--suporte-minimo", type=int, default=SUPORTE_MINIMO_PADRAO, help="Entradas que precisam confirmar uma regra para ela ser criada.")
+    parser.add_argument("--aplicar", action="store_true", help="Substitui o mapa da fonte pelas regras + exceções.")
+    parser.add_argument("--listar", action="store_true", help="Lista as regras derivadas.")
+    args = parser.parse_args()
+
+    if args.fonte == "json":
+        with open(CONFIG.paths.mapa_correcoes, 'r', encoding='utf-8') as f:
+            mapa = json.load(f)
+    else:
+        mapa = carregar_mapa_correcoes()
+
+    # Sem as chaves do CC, uma regra pode renomear valores que só são corretos fora do mapa.
+    chaves_validas = carregar_chaves_validas_cc()
+    if not chaves_validas:
+        logging.error("Referência de CC vazia: sem as chaves válidas não é possível compilar regras com segurança. Nada foi gravado.")
+        return
+    logging.info("Referência de CC carregada: %d chaves válidas.", len(chaves_validas))
+
+    regras = compilar_regras(mapa, suporte_minimo=args.suporte_minimo, chaves_validas=chaves_validas)
+    mapa_compilado = regras.para_mapa()
+    if args.listar:
+        for quebrada, correta in mapa_compilado.items():
+            if quebrada not in regras.excecoes:
+                print(f"{quebrada} -> {correta}")
+
+    divergentes = verificar_compilacao(mapa, mapa_compilado)
+    if divergentes:
+        logging.error("%d chaves do mapa original não seriam corrigidas igual pelo mapa compilado. Nada foi gravado.", len(divergentes))
+        for chave in divergentes[:20]:
+            logging.error("  - %s", chave)
+        return
+    reescritas = verificar_chaves_validas(mapa, mapa_compilado, chaves_validas)
+    if reescritas:
+        logging.error("%d chaves válidas no CC seriam reescritas pelo mapa compilado. Nada foi gravado.", len(reescritas))
+        for chave in reescritas[:20]:
+            logging.error("  - %s", chave)
+        return
+
+    logging.info(
+        "%d entradas -> %d (%d regras + %d exceções).",
+        len(mapa), len(mapa_compilado), len(mapa_compilado) - len(regras.excecoes), len(regras.excecoes),
+    )
+    if not args.aplicar:
+        logging.info("Use --aplicar para gravar o mapa compilado.")
+        return
+    if args.fonte == "json":
+        gravar_no_json(mapa_compilado)
+    else:
+        gravar_no_sql(mapa_compilado)
+
+
+if __name__ == "__main__":
+    main()
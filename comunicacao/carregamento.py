@@ -1,11 +1,182 @@
 # comunicacao/carregamento.py (VERSÃO FINAL COM CRIAÇÃO DINÂMICA DE TABELA)
 import logging
+import time
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 from sqlalchemy.engine import Engine, reflection
-from sqlalchemy import text
+from sqlalchemy import inspect, text, types
+
+from config.config import CONFIG
 
 logger = logging.getLogger(__name__)
 
+# Na temporária de cada carga, textos viram NVARCHAR(n) do tamanho dos dados, com n
+# entre estes limites; acima do máximo, NVARCHAR(max).
+TAMANHO_MINIMO_NVARCHAR = 50
+TAMANHO_MAXIMO_NVARCHAR = 4000
+# Tabelas que recebem outras cargas (final e estágio) não podem ter o tamanho medido
+# nos dados da primeira: os textos fora da chave viram NVARCHAR(max) e os da chave
+# dividem igualmente o que sobra do limite do índice depois das colunas numéricas.
+# O limite vale para a chave inteira (todas as colunas somadas), não por coluna:
+# 900 bytes no índice clusterizado do SQL Server, 2 bytes por caractere em NVARCHAR.
+LIMITE_BYTES_CHAVE_INDICE = 900
+
+
+def mapear_tipos_sql(
+    df: pd.DataFrame,
+    conexao,
+    nome_tabela_destino: Optional[str] = None,
+    schema: str = 'dbo',
+    chave_primaria: Optional[list[str]] = None,
+    persistente: bool = False,
+) -> dict[str, types.TypeEngine]:
+    """
+    Tipos SQL explícitos para gravar 'df' (o 'dtype' do to_sql). Se a tabela de
+    destino existir, as colunas numéricas e de data recebem o tipo que têm lá,
+    para que o MERGE compare colunas de mesmo tipo; as demais recebem o tipo
+    derivado do DataFrame: inteiros pela largura do dtype, FLOAT para decimais e
+    NVARCHAR do tamanho do maior texto. Com 'persistente' (tabela final ou de
+    estágio, que receberão outras cargas), os textos têm largura fixa:
+    NVARCHAR(max) fora da 'chave_primaria' e, nela, NVARCHAR da largura de
+    'tamanho_texto_chave', para que a chave inteira caiba no índice.
+    """
+    tipos_destino = {}
+    if nome_tabela_destino is not None:
+        insp = inspect(conexao)
+        if insp.has_table(nome_tabela_destino, schema=schema):
+            tipos_destino = {col['name']: col['type'] for col in insp.get_columns(nome_tabela_destino, schema=schema)}
+    tipos = {}
+    for col in df.columns:
+        tipo = tipos_destino.get(col)
+        if tipo is None or isinstance(tipo, types.String):
+            # Texto nunca copia o tamanho do destino: um valor mais longo quebraria a carga da temporária.
+            tipo = _tipo_sql_da_coluna(df[col], persistente)
+        tipos[col] = tipo
+    if persistente and chave_primaria:
+        textos_chave = [col for col in chave_primaria if isinstance(tipos.get(col), types.String)]
+        tamanho = tamanho_texto_chave(tipos, chave_primaria)
+        for col in textos_chave:
+            tipos[col] = _tipo_sql_da_coluna(df[col], persistente, tamanho)
+    return tipos
+
+
+def tamanho_texto_chave(tipos: dict[str, types.TypeEngine], chave_primaria: list[str]) -> int:
+    """
+    Largura (em caracteres) de cada coluna de texto da chave para que a chave
+    inteira ocupe no máximo LIMITE_BYTES_CHAVE_INDICE: o que sobra das colunas
+    não textuais, dividido igualmente entre as de texto.
+    """
+    textos = [col for col in chave_primaria if isinstance(tipos.get(col), types.String)]
+    if not textos:
+        return 0
+    bytes_fixos = sum(_bytes_no_indice(tipos[col]) for col in chave_primaria if col in tipos and col not in textos)
+    return (LIMITE_BYTES_CHAVE_INDICE - bytes_fixos) // (2 * len(textos))
+
+
+def gravar_em_lotes(
+    df: pd.DataFrame,
+    nome_tabela: str,
+    conexao,
+    tipos: dict[str, types.TypeEngine],
+    if_exists: str = 'replace',
+    schema: Optional[str] = None,
+    tamanho_lote: Optional[int] = None,
+) -> float:
+    """
+    Grava 'df' com os tipos de 'mapear_tipos_sql', em lotes de 'tamanho_lote'
+    linhas (TAMANHO_LOTE_CARGA_SQL). Na engine do SQL Server, criada com
+    fast_executemany, cada lote é enviado como um único array de parâmetros.
+    Retorna a vazão em registros por segundo, que também vai para o log.
+    """
+    tamanho_lote = tamanho_lote or CONFIG.tamanho_lote_carga_sql
+    if conexao.dialect.name == 'mssql' and not getattr(conexao.dialect, 'fast_executemany', False):
+        logger.warning(f"fast_executemany está desativado (DB_FAST_EXECUTEMANY): a carga de '{nome_tabela}' será linha a linha.")
+    inicio = time.perf_counter()
+    df.to_sql(nome_tabela, conexao, if_exists=if_exists, index=False, schema=schema, dtype=tipos, chunksize=tamanho_lote)
+    duracao = time.perf_counter() - inicio
+    vazao = len(df) / duracao if duracao > 0 else float('inf')
+    logger.info(
+        "%d registros gravados em '%s' em %.2f s (%.0f registros/s, lotes de %d).",
+        len(df), nome_tabela, duracao, vazao, tamanho_lote,
+    )
+    return vazao
+
+
+def indexar_chave(
+    nome_tabela: str,
+    connection,
+    chave_primaria: list[str],
+    tipos: dict[str, types.TypeEngine],
+    schema: Optional[str] = None,
+) -> bool:
+    """
+    Indexa a tabela de estágio pela chave primária depois da carga, para que o
+    MERGE (ou o GROUP BY) percorra a chave em vez de varrer a tabela. No SQL
+    Server o índice é clusterizado. Chaves com texto sem tamanho, ou que somam
+    mais que LIMITE_BYTES_CHAVE_INDICE, não são indexadas: o CREATE INDEX só
+    avisaria, e a linha que passasse do limite faria a carga falhar.
+    """
+    sem_tamanho = [col for col in chave_primaria if isinstance(tipos.get(col), types.String) and tipos[col].length is None]
+    if sem_tamanho:
+        logger.warning(f"As colunas {sem_tamanho} da chave são NVARCHAR(max): '{nome_tabela}' não será indexada.")
+        return False
+    bytes_chave = sum(_bytes_no_indice(tipos[col]) for col in chave_primaria if col in tipos)
+    if bytes_chave > LIMITE_BYTES_CHAVE_INDICE:
+        logger.warning(
+            f"A chave de '{nome_tabela}' ocupa até {bytes_chave} bytes (limite do índice: {LIMITE_BYTES_CHAVE_INDICE}): a tabela não será indexada."
+        )
+        return False
+    tabela = f"[{schema}].[{nome_tabela}]" if schema else f"[{nome_tabela}]"
+    tipo_indice = "CLUSTERED INDEX" if connection.dialect.name == 'mssql' else "INDEX"
+    nome_indice = f"IX_{nome_tabela.lstrip('#')}_chave"
+    colunas_str = ", ".join(f"[{col}]" for col in chave_primaria)
+    inicio = time.perf_counter()
+    connection.execute(text(f"CREATE {tipo_indice} [{nome_indice}] ON {tabela} ({colunas_str});"))
+    logger.info(f"Tabela '{nome_tabela}' indexada pela chave em {time.perf_counter() - inicio:.2f} s.")
+    return True
+
+
+def _bytes_no_indice(tipo: types.TypeEngine) -> int:
+    # Ocupação máxima de uma coluna na chave do índice (NVARCHAR: 2 bytes por caractere).
+    if isinstance(tipo, types.String):
+        return 2 * (tipo.length or 0)
+    if isinstance(tipo, types.SmallInteger):
+        return 2
+    if isinstance(tipo, types.BigInteger):
+        return 8
+    if isinstance(tipo, types.Integer):
+        return 4
+    if isinstance(tipo, types.Boolean):
+        return 1
+    return 8
+
+
+def _tipo_sql_da_coluna(serie: pd.Series, persistente: bool = False, tamanho_chave: int = 0) -> types.TypeEngine:
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Tipo e tamanho vêm do dicionário de categorias, sem percorrer as linhas.
+        return _tipo_sql_da_coluna(pd.Series(dtype.categories), persistente, tamanho_chave)
+    if pd.api.types.is_bool_dtype(dtype):
+        return types.Boolean()
+    if pd.api.types.is_integer_dtype(dtype):
+        dtype_numpy = np.dtype(getattr(dtype, 'numpy_dtype', dtype))
+        # Inteiros sem sinal precisam do tipo SQL seguinte (com sinal) para caber.
+        largura = dtype_numpy.itemsize * (2 if dtype_numpy.kind == 'u' else 1)
+        return types.SmallInteger() if largura <= 2 else types.Integer() if largura <= 4 else types.BigInteger()
+    if pd.api.types.is_float_dtype(dtype):
+        return types.Float(precision=53)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return types.DateTime()
+    textos = serie.dropna().astype(str)
+    comprimento = int(textos.str.len().max()) if len(textos) else 0
+    if persistente:
+        return types.NVARCHAR(tamanho_chave) if tamanho_chave and comprimento <= tamanho_chave else types.UnicodeText()
+    comprimento = max(comprimento, TAMANHO_MINIMO_NVARCHAR)
+    return types.NVARCHAR(comprimento) if comprimento <= TAMANHO_MAXIMO_NVARCHAR else types.UnicodeText()
+
+
 def carregar_dataframe_para_sql_com_merge(
     df: pd.DataFrame,
     nome_tabela_final: str,
@@ -31,55 +202,205 @@ def carregar_dataframe_para_sql_com_merge(
     if not insp.has_table(nome_tabela_final, schema='dbo'):
         logger.warning(f"A tabela de destino '{nome_tabela_final}' não existe. Criando-a e realizando carga inicial.")
         try:
-            df.to_sql(nome_tabela_final, engine, if_exists='replace', index=False, schema='dbo')
+            tipos = mapear_tipos_sql(df, engine, chave_primaria=chave_primaria, persistente=True)
+            gravar_em_lotes(df, nome_tabela_final, engine, tipos, schema='dbo')
             logger.info(f"Tabela '{nome_tabela_final}' criada e dados carregados com sucesso.")
             return # Finaliza a execução para este fluxo, pois a carga já foi feita
         except Exception as e:
             logger.exception(f"Falha ao tentar criar a tabela '{nome_tabela_final}'.")
             raise e
 
-    # O fluxo de MERGE continua se a tabela já existir
-    nome_tabela_temp = f"##{nome_tabela_final}_temp_upsert"
+    # O fluxo de MERGE continua se a tabela já existir. A tabela temporária é local
+    # (#) e vive só na conexão da transação: carga, índice, MERGE e remoção usam a
+    # mesma conexão, e uma falha desfaz tudo, inclusive a criação da temporária.
+    nome_tabela_temp = f"#{nome_tabela_final}_temp_upsert"
     logger.info(f"Iniciando carga de {len(df)} registros para a tabela temporária '{nome_tabela_temp}'...")
 
     try:
-        df.to_sql(nome_tabela_temp, engine, if_exists='replace', index=False)
-        logger.info("Carga para tabela temporária concluída.")
-
-        colunas = [col for col in df.columns]
-        colunas_str = ", ".join(f"[{col}]" for col in colunas)
-        on_clause = " AND ".join(f"target.[{key}] = source.[{key}]" for key in chave_primaria)
-        update_clause = ", ".join(f"target.[{col}] = source.[{col}]" for col in colunas if col not in chave_primaria)
-        insert_values = ", ".join(f"source.[{col}]" for col in colunas)
-
-        if not update_clause:
-            update_clause = f"target.[{chave_primaria[0]}] = source.[{chave_primaria[0]}]"
-
-        merge_sql = f"""
-        MERGE [{nome_tabela_final}] AS target
-        USING {nome_tabela_temp} AS source
-        ON ({on_clause})
-        WHEN MATCHED THEN
-            UPDATE SET {update_clause}
-        WHEN NOT MATCHED BY TARGET THEN
-            INSERT ({colunas_str})
-            VALUES ({insert_values});
-        """
-        
-        logger.info("Executando comando MERGE para sincronizar os dados...")
+        tipos = mapear_tipos_sql(df, engine, nome_tabela_final)
         with engine.begin() as connection:
+            gravar_em_lotes(df, nome_tabela_temp, connection, tipos)
+            indexar_chave(nome_tabela_temp, connection, chave_primaria, tipos)
+
+            colunas = [col for col in df.columns]
+            colunas_str = ", ".join(f"[{col}]" for col in colunas)
+            on_clause = " AND ".join(f"target.[{key}] = source.[{key}]" for key in chave_primaria)
+            update_clause = ", ".join(f"target.[{col}] = source.[{col}]" for col in colunas if col not in chave_primaria)
+            insert_values = ", ".join(f"source.[{col}]" for col in colunas)
+
+            if not update_clause:
+                update_clause = f"target.[{chave_primaria[0]}] = source.[{chave_primaria[0]}]"
+
+            merge_sql = f"""
+            MERGE [{nome_tabela_final}] AS target
+            USING [{nome_tabela_temp}] AS source
+            ON ({on_clause})
+            WHEN MATCHED THEN
+                UPDATE SET {update_clause}
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT ({colunas_str})
+                VALUES ({insert_values});
+            """
+
+            logger.info("Executando comando MERGE para sincronizar os dados...")
+            inicio = time.perf_counter()
             connection.execute(text(merge_sql))
-        
-        logger.info(f"Comando MERGE para '{nome_tabela_final}' executado com sucesso.")
+            connection.execute(text(f"DROP TABLE [{nome_tabela_temp}];"))
+
+        logger.info(f"Comando MERGE para '{nome_tabela_final}' executado com sucesso em {time.perf_counter() - inicio:.2f} s.")
 
     except Exception as e:
         logger.exception(f"ERRO AO EXECUTAR O PROCESSO DE MERGE PARA A TABELA '{nome_tabela_final}'")
         raise
+
+
+def anexar_em_tabela_de_estagio(
+    df: pd.DataFrame,
+    nome_tabela_estagio: str,
+    engine: Engine,
+    substituir: bool = False,
+    chave_primaria: Optional[list[str]] = None,
+) -> None:
+    """
+    Acrescenta um lote à tabela de estágio (criada no primeiro lote com 'substituir').
+    Usada pelo modo em lotes: cada lote é gravado assim que processado. Os textos
+    do estágio têm largura fixa (ver 'mapear_tipos_sql'), não a do primeiro lote,
+    para que lotes seguintes com valores mais longos também caibam.
+    """
+    if df.empty:
+        return
+    tipos = mapear_tipos_sql(df, engine, chave_primaria=chave_primaria, persistente=True)
+    gravar_em_lotes(df, nome_tabela_estagio, engine, tipos, if_exists='replace' if substituir else 'append', schema='dbo')
+
+
+def montar_consulta_agregacao_estagio(
+    nome_tabela_estagio: str, chave_primaria: list[str], colunas_soma: list[str], colunas_texto: list[str]
+) -> str:
+    """
+    SELECT que reduz a tabela de estágio (todos os lotes) a uma linha por chave
+    primária, somando 'colunas_soma' e mantendo um valor de 'colunas_texto'.
+    """
+    chaves_str = ", ".join(f"[{key}]" for key in chave_primaria)
+    select_agregado = ", ".join(
+        [f"[{key}]" for key in chave_primaria]
+        + [f"SUM([{col}]) AS [{col}]" for col in colunas_soma]
+        + [f"MIN([{col}]) AS [{col}]" for col in colunas_texto]
+    )
+    return f"SELECT {select_agregado} FROM [dbo].[{nome_tabela_estagio}] GROUP BY {chaves_str}"
+
+
+def consolidar_estagio_com_merge(
+    nome_tabela_estagio: str,
+    nome_tabela_final: str,
+    engine: Engine,
+    chave_primaria: list[str],
+    colunas_soma: list[str],
+    colunas_texto: list[str],
+) -> None:
+    """
+    Agrega a tabela de estágio no grão da chave primária (somando 'colunas_soma'
+    e mantendo um valor de 'colunas_texto') e sincroniza o resultado com a
+    tabela final via MERGE. Como a agregação é feita no servidor sobre todos os
+    lotes, chaves repetidas em lotes diferentes são consolidadas corretamente.
+    """
+    insp = reflection.Inspector.from_engine(engine)
+    if not insp.has_table(nome_tabela_estagio, schema='dbo'):
+        logger.warning(f"Tabela de estágio '{nome_tabela_estagio}' não existe. Nada a consolidar.")
+        return
+
+    tipos_estagio = {col['name']: col['type'] for col in insp.get_columns(nome_tabela_estagio, schema='dbo')}
+    colunas_estagio = set(tipos_estagio)
+    colunas_soma = [col for col in colunas_soma if col in colunas_estagio]
+    colunas_texto = [col for col in colunas_texto if col in colunas_estagio and col not in chave_primaria]
+    colunas = chave_primaria + colunas_soma + colunas_texto
+
+    origem = f"({montar_consulta_agregacao_estagio(nome_tabela_estagio, chave_primaria, colunas_soma, colunas_texto)})"
+
+    try:
+        if not insp.has_table(nome_tabela_final, schema='dbo'):
+            logger.warning(f"A tabela de destino '{nome_tabela_final}' não existe. Criando-a a partir do estágio.")
+            sql = f"SELECT * INTO [dbo].[{nome_tabela_final}] FROM {origem} AS source;"
+        else:
+            colunas_str = ", ".join(f"[{col}]" for col in colunas)
+            on_clause = " AND ".join(f"target.[{key}] = source.[{key}]" for key in chave_primaria)
+            update_clause = ", ".join(f"target.[{col}] = source.[{col}]" for col in colunas if col not in chave_primaria)
+            if not update_clause:
+                update_clause = f"target.[{chave_primaria[0]}] = source.[{chave_primaria[0]}]"
+            insert_values = ", ".join(f"source.[{col}]" for col in colunas)
+            sql = f"""
+            MERGE [{nome_tabela_final}] AS target
+            USING {origem} AS source
+            ON ({on_clause})
+            WHEN MATCHED THEN
+                UPDATE SET {update_clause}
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT ({colunas_str})
+                VALUES ({insert_values});
+            """
+        logger.info(f"Consolidando '{nome_tabela_estagio}' em '{nome_tabela_final}'...")
+        with engine.begin() as connection:
+            indexar_chave(nome_tabela_estagio, connection, chave_primaria, tipos_estagio, schema='dbo')
+            connection.execute(text(sql))
+        logger.info(f"Consolidação de '{nome_tabela_final}' concluída com sucesso.")
+    except Exception:
+        logger.exception(f"ERRO AO CONSOLIDAR A TABELA DE ESTÁGIO '{nome_tabela_estagio}'")
+        raise
     finally:
         try:
             with engine.begin() as connection:
-                connection.execute(text(f"DROP TABLE IF EXISTS {nome_tabela_temp};"))
-            logger.info(f"Tabela temporária '{nome_tabela_temp}' removida.")
+                connection.execute(text(f"DROP TABLE IF EXISTS [dbo].[{nome_tabela_estagio}];"))
+            logger.info(f"Tabela de estágio '{nome_tabela_estagio}' removida.")
         except Exception as drop_error:
-            logger.warning(f"Não foi possível remover a tabela temporária '{nome_tabela_temp}'. Erro: {drop_error}")
+            logger.warning(f"Não foi possível remover a tabela de estágio '{nome_tabela_estagio}'. Erro: {drop_error}")
+
+
+def acumular_dataframe_com_merge(
+    df: pd.DataFrame,
+    nome_tabela_final: str,
+    connection,
+    chave_primaria: list[str],
+    colunas_soma: list[str],
+) -> None:
+    """
+    Soma um DataFrame (já agregado no grão da chave primária) à tabela final via
+    MERGE: nas chaves existentes, 'colunas_soma' são acumuladas e as demais
+    colunas atualizadas; as novas são inseridas. Roda na transação de
+    'connection', para que o chamador confirme a soma junto com outras escritas.
+    """
+    if df.empty:
+        return
+
+    if not inspect(connection).has_table(nome_tabela_final, schema='dbo'):
+        logger.warning(f"A tabela de destino '{nome_tabela_final}' não existe. Criando-a com {len(df)} registros.")
+        tipos = mapear_tipos_sql(df, connection, chave_primaria=chave_primaria, persistente=True)
+        gravar_em_lotes(df, nome_tabela_final, connection, tipos, if_exists='fail', schema='dbo')
+        return
+
+    nome_tabela_temp = f"#{nome_tabela_final}_acumulo"
+    tipos = mapear_tipos_sql(df, connection, nome_tabela_final)
+    gravar_em_lotes(df, nome_tabela_temp, connection, tipos)
+    indexar_chave(nome_tabela_temp, connection, chave_primaria, tipos)
+
+    colunas = list(df.columns)
+    colunas_str = ", ".join(f"[{col}]" for col in colunas)
+    on_clause = " AND ".join(f"target.[{key}] = source.[{key}]" for key in chave_primaria)
+    update_clause = ", ".join(
+        f"target.[{col}] = ISNULL(target.[{col}], 0) + source.[{col}]" if col in colunas_soma else f"target.[{col}] = source.[{col}]"
+        for col in colunas if col not in chave_primaria
+    )
+    if not update_clause:
+        update_clause = f"target.[{chave_primaria[0]}] = source.[{chave_primaria[0]}]"
+    insert_values = ", ".join(f"source.[{col}]" for col in colunas)
 
+    connection.execute(text(f"""
+    MERGE [{nome_tabela_final}] AS target
+    USING [{nome_tabela_temp}] AS source
+    ON ({on_clause})
+    WHEN MATCHED THEN
+        UPDATE SET {update_clause}
+    WHEN NOT MATCHED BY TARGET THEN
+        INSERT ({colunas_str})
+        VALUES ({insert_values});
+    """))
+    connection.execute(text(f"DROP TABLE [{nome_tabela_temp}];"))
+    logger.info(f"{len(df)} registros acumulados em '{nome_tabela_final}'.")
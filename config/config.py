@@ -8,9 +8,12 @@ from dotenv import load_dotenv
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
-@dataclass
+@dataclass(frozen=True)
 class DbConfig:
-    """Define a estrutura para configurações de conexão, compatível com database.py."""
+    """
+    Define a estrutura para configurações de conexão, compatível com database.py.
+    É imutável para servir de chave no registro de engines (um pool por configuração).
+    """
     tipo: str
     servidor: Optional[str] = None
     banco: Optional[str] = None
@@ -19,6 +22,27 @@ class DbConfig:
     data_source: Optional[str] = None
     catalog: Optional[str] = None
     caminho: Optional[Path] = None
+    # Parâmetros do pool de conexões (usados nas conexões 'sql')
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_pre_ping: bool = True
+    pool_recycle: int = 1800
+    fast_executemany: bool = True
+
+@dataclass
+class FonteCache:
+    """
+    Define uma fonte de dados brutos mantida no cache local.
+
+    Se 'coluna_watermark' for informada, a atualização busca apenas as linhas
+    com valor >= ao maior valor já presente no cache (rowversion, data, ano/PPA).
+    'chaves' permite descartar do cache versões antigas de linhas alteradas.
+    """
+    tabela_cache: str
+    query: Path
+    conexao: str
+    coluna_watermark: Optional[str] = None
+    chaves: Optional[list[str]] = None
 
 class Config:
     """Classe principal para centralizar as configurações do projeto."""
@@ -40,18 +64,28 @@ class Config:
         # Converte o caminho da DLL de string para Path, se existir
         self.adomd_dll_path: Optional[Path] = Path(adomd_dll_path_str) if adomd_dll_path_str else None
 
+        parametros_pool = dict(
+            pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("DB_POOL_MAX_OVERFLOW", 10)),
+            pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "1").lower() not in ("0", "false", "nao", "não"),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            fast_executemany=os.getenv("DB_FAST_EXECUTEMANY", "1").lower() not in ("0", "false", "nao", "não"),
+        )
+
         self.conexoes = {
             "FINANCA_SQL": DbConfig(
                 tipo='sql',
                 servidor=db_server_financa,
                 banco=db_database_financa,
-                driver="ODBC Driver 18 for SQL Server"
+                driver="ODBC Driver 18 for SQL Server",
+                **parametros_pool
             ),
             "HubDados": DbConfig(
                 tipo='sql',
                 servidor=db_server_hub,
                 banco=db_database_hub,
-                driver="ODBC Driver 18 for SQL Server"
+                driver="ODBC Driver 18 for SQL Server",
+                **parametros_pool
             ),
             "CacheDB": DbConfig(
                 tipo='sqlite',
@@ -59,6 +93,40 @@ class Config:
             ),
         }
 
+        # Backend do cache de dados brutos: 'parquet' (padrão, requer pyarrow) ou 'sqlite'.
+        self.cache_backend = os.getenv("CACHE_BACKEND", "parquet")
+
+        # Fontes do cache local e suas colunas de watermark para atualização incremental.
+        # Podem ser sobrescritas no .env (valor vazio = recarga completa da fonte).
+        self.fontes_cache = {
+            "orcado_nacional_raw": FonteCache(
+                tabela_cache="orcado_nacional_raw",
+                query=self.paths.query_nacional,
+                conexao="FINANCA_SQL",
+                coluna_watermark=os.getenv("WATERMARK_ORCADO", "[Tempo].[Ano].[Número Ano].[MEMBER_CAPTION]") or None,
+            ),
+            "cc_estrutura_raw": FonteCache(
+                tabela_cache="cc_estrutura_raw",
+                query=self.paths.query_cc,
+                conexao="HubDados",
+                coluna_watermark=os.getenv("WATERMARK_CC") or None,
+                chaves=["CODCCUSTO"],
+            ),
+        }
+
+        # TTL (em horas) do cache de resultados de consultas, por fonte, e seu tamanho máximo em disco.
+        self.cache_ttl_horas = {
+            "padrao": float(os.getenv("CACHE_TTL_HORAS", 12)),
+            "base_processada": float(os.getenv("CACHE_TTL_BASE_PROCESSADA_HORAS", 12)),
+            "comprometido": float(os.getenv("CACHE_TTL_COMPROMETIDO_HORAS", 12)),
+            "correlacao": float(os.getenv("CACHE_TTL_CORRELACAO_HORAS", 24)),
+        }
+        self.cache_consultas_max_mb = int(os.getenv("CACHE_CONSULTAS_MAX_MB", 2048))
+
+        # Linhas por lote nas cargas para o SQL Server (cada lote é um executemany; com
+        # fast_executemany, o lote inteiro vai em um único array de parâmetros).
+        self.tamanho_lote_carga_sql = int(os.getenv("TAMANHO_LOTE_CARGA_SQL", 50_000))
+
     class _Paths:
         """Classe interna que APENAS define os caminhos do projeto."""
         def __init__(self, base_dir):
@@ -73,6 +141,11 @@ class Config:
             self.dados_dir = self.base_dir / "dados"
             self.cache_dir = self.base_dir / "cache"
             self.cache_db = self.cache_dir / "local_cache.db"
+            self.cache_consultas_dir = self.cache_dir / "consultas"
+            self.cache_parquet_dir = self.cache_dir / "parquet"
+            self.indice_cc = self.cache_parquet_dir / "indice_cc.parquet"
+            self.mapa_correcoes_db = self.cache_dir / "mapa_correcoes.db"
+            self.sugestoes_correcao = self.cache_dir / "sugestoes_correcao.parquet"
             self.query_nacional = self.queries_dir / "nacional.sql"
             self.query_cc = self.queries_dir / "cc.sql"
             self.gerentes_csv = self.dados_dir / "gerentes.csv"
@@ -1,9 +1,12 @@
 # database.py
 import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
 from typing import Union
 
 from pyadomd import Pyadomd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine, URL
 
 from .config import DbConfig
@@ -13,10 +16,48 @@ logger = logging.getLogger(__name__)
 Conexao = Union[Engine, Pyadomd]
 
 
+@dataclass
+class EstatisticasPool:
+    """Contadores de uso de um pool de conexões, para medir o custo de conexão nos logs."""
+    checkouts: int = 0
+    conexoes_abertas: int = 0
+    tempo_conexao_total: float = 0.0
+    # Checkouts feitos com o pool já no limite de 'pool_size' (uso de overflow ou espera por conexão).
+    checkouts_pool_saturado: int = 0
+
+    @property
+    def tempo_conexao_medio(self) -> float:
+        return self.tempo_conexao_total / self.conexoes_abertas if self.conexoes_abertas else 0.0
+
+
+# Registro de engines do processo: uma engine (e um pool) por configuração.
+_engines: dict[DbConfig, Engine] = {}
+_estatisticas: dict[DbConfig, EstatisticasPool] = {}
+_lock = threading.Lock()
+
+
 def get_conexao(config: DbConfig) -> Conexao:
     """
-    Cria e retorna um objeto de conexão de banco de dados com base na configuração.
+    Retorna um objeto de conexão de banco de dados com base na configuração.
+
+    Para 'sql' e 'sqlite' a engine é criada uma única vez por processo e
+    reaproveitada (com seu pool) em todas as chamadas seguintes.
+    Conexões 'olap' continuam sendo abertas a cada chamada.
     """
+    if config.tipo == "olap":
+        return _abrir_conexao_olap(config)
+
+    with _lock:
+        engine = _engines.get(config)
+        if engine is None:
+            engine = _criar_engine(config)
+            _engines[config] = engine
+            _estatisticas[config] = EstatisticasPool()
+            _instrumentar_pool(engine, _estatisticas[config], config)
+        return engine
+
+
+def _criar_engine(config: DbConfig) -> Engine:
     destino_log = config.banco or config.caminho
     logger.info("Criando conexão do tipo '%s' para '%s'...", config.tipo, destino_log)
 
@@ -34,28 +75,97 @@ def get_conexao(config: DbConfig) -> Conexao:
                 )
             },
         )
-        return create_engine(conn_url, fast_executemany=True)
-
-    elif config.tipo == "olap":
-        conn_str_olap = (
-            f"Provider={config.provider};"
-            f"Data Source={config.data_source};"
-            f"Initial Catalog={config.catalog};"
-            "Trusted_Connection=yes;"
+        return create_engine(
+            conn_url,
+            fast_executemany=config.fast_executemany,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_pre_ping=config.pool_pre_ping,
+            pool_recycle=config.pool_recycle,
         )
-        try:
-            conn = Pyadomd(conn_str_olap)
-            conn.open()
-            logger.info("Conexão OLAP aberta com sucesso.")
-            return conn
-        except Exception as e:
-            logger.exception("Falha ao abrir conexão OLAP.")
-            raise e
 
     elif config.tipo == "sqlite":
         # Garante que o caminho seja absoluto para evitar ambiguidades
         conn_str = f"sqlite:///{config.caminho.resolve()}"
-        return create_engine(conn_str)
+        # Arquivos SQLite também usam QueuePool: os mesmos parâmetros de pool valem aqui.
+        return create_engine(
+            conn_str,
+            pool_size=config.pool_size,
+            max_overflow=config.max_overflow,
+            pool_pre_ping=config.pool_pre_ping,
+            pool_recycle=config.pool_recycle,
+        )
 
     else:
         raise ValueError(f"Tipo de conexão desconhecido: '{config.tipo}'.")
+
+
+def _abrir_conexao_olap(config: DbConfig) -> Pyadomd:
+    logger.info("Criando conexão do tipo '%s' para '%s'...", config.tipo, config.catalog)
+    conn_str_olap = (
+        f"Provider={config.provider};"
+        f"Data Source={config.data_source};"
+        f"Initial Catalog={config.catalog};"
+        "Trusted_Connection=yes;"
+    )
+    try:
+        conn = Pyadomd(conn_str_olap)
+        conn.open()
+        logger.info("Conexão OLAP aberta com sucesso.")
+        return conn
+    except Exception as e:
+        logger.exception("Falha ao abrir conexão OLAP.")
+        raise e
+
+
+def _instrumentar_pool(engine: Engine, estatisticas: EstatisticasPool, config: DbConfig) -> None:
+    """Registra eventos do pool para contar checkouts e medir o tempo de handshake."""
+
+    @event.listens_for(engine, "do_connect")
+    def _antes_de_conectar(dialect, conn_rec, cargs, cparams):
+        conn_rec.info["_inicio_conexao"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def _ao_conectar(dbapi_connection, connection_record):
+        inicio = connection_record.info.pop("_inicio_conexao", None)
+        with _lock:
+            estatisticas.conexoes_abertas += 1
+            if inicio is not None:
+                estatisticas.tempo_conexao_total += time.perf_counter() - inicio
+
+    @event.listens_for(engine, "checkout")
+    def _ao_fazer_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool = engine.pool
+        saturado = hasattr(pool, "checkedout") and hasattr(pool, "size") and pool.checkedout() > pool.size()
+        with _lock:
+            estatisticas.checkouts += 1
+            if saturado:
+                estatisticas.checkouts_pool_saturado += 1
+
+
+def estatisticas_pool() -> dict[str, dict]:
+    """Retorna um resumo das estatísticas de cada pool registrado."""
+    with _lock:
+        return {
+            str(config.banco or config.caminho): {**asdict(estat), "tempo_conexao_medio": estat.tempo_conexao_medio}
+            for config, estat in _estatisticas.items()
+        }
+
+
+def registrar_estatisticas_pool() -> None:
+    """Escreve no log o uso de cada pool de conexões do processo."""
+    for destino, estat in estatisticas_pool().items():
+        logger.info(
+            "Pool '%s': %d checkouts, %d conexões abertas (%.2f s no total, %.3f s em média), %d checkouts com pool saturado.",
+            destino, estat["checkouts"], estat["conexoes_abertas"], estat["tempo_conexao_total"],
+            estat["tempo_conexao_medio"], estat["checkouts_pool_saturado"],
+        )
+
+
+def descartar_engines() -> None:
+    """Fecha todas as engines registradas e limpa o registro."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _estatisticas.clear()
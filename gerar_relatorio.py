@@ -18,7 +18,10 @@ except (ImportError, FileNotFoundError) as e:
 from processamento.processamento_dados_base import obter_dados_processados, formatar_brl
 from comunicacao.enviar_relatorios import carregar_gerentes_do_csv
 from config.config import CONFIG, CORES
-from processamento.extracao import obter_dados_correlacao
+from config.database import registrar_estatisticas_pool
+from processamento.cache_consultas import MODO_OFFLINE, MODO_REFRESH, definir_modo_cache
+from processamento.extracao import IndiceCorrelacao, carregar_correlacao_compartilhada, obter_dados_correlacao
+from processamento.hierarquia_cc import HierarquiaCC
 from visualizacao.componentes_plotly import (
     criar_grafico_sunburst,
     criar_grafico_heatmap,
@@ -35,7 +38,40 @@ from visualizacao.preparadores_dados import (
 
 logger = logging.getLogger(__name__)
 
-def gerar_relatorio_para_unidade(unidade_antiga: str, unidade_nova: str, df_base_total: pd.DataFrame):
+QUERY_FORNECEDORES = "fatofechamento_v2.sql"
+QUERY_COMPROMETIDO = "comprometido.sql"
+
+
+def _obter_correlacao(nome_query: str, centros_de_custo: list[str], truncate_cc_keys: bool, correlacoes: dict[str, IndiceCorrelacao] | None) -> pd.DataFrame | None:
+    """Fatia o dataset compartilhado da execução, se houver; senão consulta o banco."""
+    if correlacoes and nome_query in correlacoes:
+        return correlacoes[nome_query].fatiar(centros_de_custo, truncate_cc_keys=truncate_cc_keys)
+    return obter_dados_correlacao(nome_query, centros_de_custo=centros_de_custo, truncate_cc_keys=truncate_cc_keys)
+
+
+def carregar_correlacoes_da_execucao(df_base_total: pd.DataFrame, unidades_antigas: list[str]) -> dict[str, IndiceCorrelacao]:
+    """
+    Busca cada fonte de correlação uma única vez para todas as unidades
+    selecionadas, retornando os datasets indexados por CC.
+    """
+    df_selecionado = df_base_total[df_base_total['UNIDADE_FINAL'].isin(unidades_antigas)]
+    if 'CODCCUSTO' not in df_selecionado.columns:
+        return {}
+    cc_exclusivos = df_selecionado.loc[df_selecionado['tipo_projeto'] == 'Exclusivo', 'CODCCUSTO'].dropna().unique().tolist()
+    todos_os_cc = df_selecionado['CODCCUSTO'].dropna().unique().tolist()
+
+    # Pai de cada CC calculado uma vez; as unidades só consultam o índice ao truncar.
+    hierarquia = HierarquiaCC(todos_os_cc)
+
+    correlacoes = {}
+    for nome_query, centros_de_custo, truncar in [(QUERY_FORNECEDORES, cc_exclusivos, False), (QUERY_COMPROMETIDO, todos_os_cc, True)]:
+        indice = carregar_correlacao_compartilhada(nome_query, centros_de_custo, truncate_cc_keys=truncar, hierarquia=hierarquia)
+        if indice is not None:
+            correlacoes[nome_query] = indice
+    return correlacoes
+
+
+def gerar_relatorio_para_unidade(unidade_antiga: str, unidade_nova: str, df_base_total: pd.DataFrame, correlacoes: dict[str, IndiceCorrelacao] | None = None):
     logger.info(f"Iniciando a geração do dashboard para: '{unidade_nova}' (dados de: '{unidade_antiga}')...")
     df_unidade = df_base_total[df_base_total['UNIDADE_FINAL'] == unidade_antiga].copy()
     if df_unidade.empty:
@@ -82,7 +118,7 @@ def gerar_relatorio_para_unidade(unidade_antiga: str, unidade_nova: str, df_base
         cc_exclusivos = df_exclusivos['CODCCUSTO'].dropna().unique().tolist()
         todos_os_cc_da_unidade = df_unidade['CODCCUSTO'].dropna().unique().tolist()
 
-        df_fato_v2 = obter_dados_correlacao("fatofechamento_v2.sql", centros_de_custo=cc_exclusivos)
+        df_fato_v2 = _obter_correlacao(QUERY_FORNECEDORES, cc_exclusivos, False, correlacoes)
         if df_fato_v2 is not None and not df_fato_v2.empty:
             df_fornecedores = df_fato_v2.groupby('FORNECEDOR')['VALOR'].sum().reset_index().sort_values(by='VALOR', ascending=False).head(20)
             df_fornecedores['VALOR'] = df_fornecedores['VALOR'].apply(formatar_brl)
@@ -91,7 +127,7 @@ def gerar_relatorio_para_unidade(unidade_antiga: str, unidade_nova: str, df_base
             df_fato_v2.to_excel(path_fato_v2, index=False)
             logger.info(f"Arquivo de correlação de fornecedores salvo em: {path_fato_v2}")
 
-        df_comprometido = obter_dados_correlacao("comprometido.sql", centros_de_custo=todos_os_cc_da_unidade, truncate_cc_keys=True)
+        df_comprometido = _obter_correlacao(QUERY_COMPROMETIDO, todos_os_cc_da_unidade, True, correlacoes)
         if df_comprometido is not None and not df_comprometido.empty:
             df_comprometido_visual = df_comprometido.copy()
             path_comprometido = CONFIG.paths.relatorios_excel_dir / f"correlacao_comprometido_{output_sanitized_name}.xlsx"
@@ -148,7 +184,13 @@ def main():
     parser = argparse.ArgumentParser(description="Gera dashboards de performance orçamentária por unidade.")
     parser.add_argument("--unidade", type=str, help="Gera o dashboard para uma unidade específica (usar o nome novo).")
     parser.add_argument("--todas", action="store_true", help="Gera relatórios para todas as unidades disponíveis.")
+    parser.add_argument("--correlacao-compartilhada", action="store_true", help="Busca as queries de correlação uma única vez por execução e fatia por unidade.")
+    grupo_cache = parser.add_mutually_exclusive_group()
+    grupo_cache.add_argument("--refresh", action="store_true", help="Ignora o cache de consultas, busca os dados no banco e regrava o cache.")
+    grupo_cache.add_argument("--offline", action="store_true", help="Usa apenas resultados do cache de consultas, sem acessar o banco.")
     args = parser.parse_args()
+    if args.refresh: definir_modo_cache(MODO_REFRESH)
+    elif args.offline: definir_modo_cache(MODO_OFFLINE)
 
     df_base_total = obter_dados_processados()
     if df_base_total is None or df_base_total.empty: logger.error("A base de dados não pôde ser carregada. Encerrando."); sys.exit(1)
@@ -173,12 +215,16 @@ def main():
 
     if unidades_a_gerar_chaves:
         logger.info(f"Gerando dashboards para: {', '.join([unidades_map[k]['nome_novo'] for k in unidades_a_gerar_chaves])}")
+        correlacoes = None
+        if args.correlacao_compartilhada:
+            correlacoes = carregar_correlacoes_da_execucao(df_base_total, unidades_a_gerar_chaves)
         for chave_antiga in unidades_a_gerar_chaves:
             nome_novo = unidades_map[chave_antiga]['nome_novo']
-            gerar_relatorio_para_unidade(chave_antiga, nome_novo, df_base_total)
+            gerar_relatorio_para_unidade(chave_antiga, nome_novo, df_base_total, correlacoes)
     else:
         logger.info("Nenhuma unidade selecionada. Encerrando.")
     
+    registrar_estatisticas_pool()
     logger.info("\n--- FIM DO SCRIPT DE GERAÇÃO DE DASHBOARD ---")
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@
 import argparse
 import logging
 import sys
+import time
 import pandas as pd
 
 try:
@@ -13,12 +14,26 @@ except Exception as e:
     logging.basicConfig(level=logging.INFO); logging.critical("Falha na inicialização: %s", e, exc_info=True); sys.exit(1)
 
 from config.config import CONFIG
-from config.database import get_conexao
-from comunicacao.carregamento import carregar_dataframe_para_sql_com_merge
-from processamento.extracao import obter_dados_brutos, obter_dados_comprometidos_brutos
+from config.database import get_conexao, registrar_estatisticas_pool
+from comunicacao.carregamento import anexar_em_tabela_de_estagio, carregar_dataframe_para_sql_com_merge, consolidar_estagio_com_merge
+from processamento.alocacao_comprometido import (
+    POLITICA_PADRAO, POLITICA_PROPORCIONAL, POLITICAS_ALOCACAO, ReferenciaComprometido, alocar_comprometido, calcular_pesos_orcado,
+)
+from processamento.cache_consultas import MODO_OFFLINE, MODO_REFRESH, definir_modo_cache
+from processamento.chaves import definir_normalizacao_chaves
+from processamento.extracao import (
+    TABELA_CC_CACHE, TABELA_ORCADO_CACHE, ExtracaoUnica, assinatura_dado_bruto, iterar_dado_bruto_em_lotes, iterar_dados_comprometidos_em_lotes,
+    obter_dado_bruto, obter_dados_comprometidos_brutos,
+)
 from processamento.correcao_chaves import iniciar_correcao_interativa_chaves
+from processamento.deduplicacao import deduplicar_no_grao, registrar_estatisticas_duplicidade
+from processamento.indice_cc import IndiceCC, obter_indice_cc
+from processamento.quarentena import (
+    COLUNA_CHAVE_QUARENTENA, TABELA_DESTINO_QUARENTENA, carregar_quarentena, gravar_quarentena, montar_quarentena, resolver_quarentena,
+)
+from processamento.sugestoes_correcao import LIMIAR_PADRAO
 from processamento.validacao import aplicar_mapa_correcoes, carregar_mapa_correcoes, preparar_dados_para_validacao
-from processamento.enriquecimento import enriquecer_orcado_com_cc
+from processamento.enriquecimento import enriquecer_orcado_com_cc, verificar_resultado_enriquecido
 
 
 logger = logging.getLogger(__name__)
@@ -29,7 +44,10 @@ def executar_fluxo_de_enriquecimento(
     df_cc_referencia: pd.DataFrame, 
     mapa_correcoes: dict, 
     nome_fluxo: str, 
-    args: argparse.Namespace
+    args: argparse.Namespace,
+    indice_cc: IndiceCC | None = None,
+    referencia_comprometido: ReferenciaComprometido | None = None,
+    pesos_orcado: pd.Series | None = None,
 ) -> pd.DataFrame:
     
     logger.info(f"--- Iniciando fluxo de enriquecimento para: {nome_fluxo} ---")
@@ -49,34 +67,18 @@ def executar_fluxo_de_enriquecimento(
         df_processado = enriquecer_orcado_com_cc(
             df_orcado_pronto=df_corrigido, 
             df_cc_pronto=df_cc_referencia, 
-            args=args
+            args=args,
+            indice_cc=indice_cc,
         )
 
     elif nome_fluxo == "Comprometido Nacional":
         # FLUXO ESPECIAL: 1. Enriquece com CC (via chave truncada) -> 2. Valida/Corrige chaves
         logger.info("Fluxo 'Comprometido' detectado. Enriquecendo com dados de CC ANTES da validação de chaves.")
-        df_para_validar = df_raw.copy()
-        
-        df_cc_ref_comprometido = df_cc_referencia.copy()
-        logger.info("Aplicando truncagem de chave na referência de CC para correspondência.")
-        df_cc_ref_comprometido['CODCCUSTO_TRUNCADO'] = df_cc_ref_comprometido['CODCCUSTO'].astype(str).str.rsplit('.', n=1).str[0]
-        df_para_validar['CODCCUSTO'] = df_para_validar['CODCCUSTO'].astype(str).str.strip()
-        
-        df_enriquecido_inicial = pd.merge(
-            df_para_validar,
-            df_cc_ref_comprometido[['CODCCUSTO_TRUNCADO', 'PROJETO', 'ACAO', 'UNIDADE', 'CODCCUSTO']].rename(columns={'CODCCUSTO': 'CODCCUSTO_COMPLETO'}),
-            left_on='CODCCUSTO',
-            right_on='CODCCUSTO_TRUNCADO',
-            how='left'
-        )
-        
-        df_enriquecido_inicial.drop(columns=['CODCCUSTO', 'CODCCUSTO_TRUNCADO'], inplace=True)
-        df_enriquecido_inicial.rename(columns={'CODCCUSTO_COMPLETO': 'CODCCUSTO'}, inplace=True)
-        
-        linhas_sem_match = df_enriquecido_inicial['PROJETO'].isnull().sum()
-        if linhas_sem_match > 0:
-            logger.warning(f"{linhas_sem_match} linhas do Comprometido não encontraram correspondência e serão descartadas.")
-            df_enriquecido_inicial.dropna(subset=['PROJETO'], inplace=True)
+        referencia_comprometido = referencia_comprometido or ReferenciaComprometido.da_referencia(df_cc_referencia)
+        politica = getattr(args, 'alocacao_comprometido', POLITICA_PADRAO)
+        logger.info(f"Alocando o Comprometido aos CCs completos (política '{politica}').")
+        df_enriquecido_inicial = alocar_comprometido(df_raw, referencia_comprometido, politica=politica, pesos_orcado=pesos_orcado)
+        df_enriquecido_inicial.dropna(subset=['PROJETO'], inplace=True)
         
         if df_enriquecido_inicial.empty:
             logger.error("Nenhum dado do Comprometido restou após a junção. Verifique o formato dos 'CODCCUSTO'.")
@@ -86,64 +88,193 @@ def executar_fluxo_de_enriquecimento(
         df_preparado = preparar_dados_para_validacao(df_enriquecido_inicial, chaves_base, incluir_ano_na_chave=True)
         df_processado = aplicar_mapa_correcoes(df_preparado, mapa_correcoes)
     
-    # Verificação final unificada
-    if df_processado.empty or 'CODCCUSTO' not in df_processado.columns or df_processado['CODCCUSTO'].isnull().all():
-        logger.error(f"Coluna 'CODCCUSTO' foi perdida ou está vazia para o fluxo '{nome_fluxo}'.")
-        return pd.DataFrame()
+    # Verificação final unificada (o Orçado sem nenhum CC segue para a quarentena)
+    return verificar_resultado_enriquecido(df_processado, nome_fluxo, manter_sem_cc=nome_fluxo == "Orçado Nacional")
 
-    return df_processado
 
 
 
+def extrair_fontes(args: argparse.Namespace) -> dict:
+    """
+    Busca em paralelo todas as fontes do pipeline (Orçado, estrutura de CC,
+    Comprometido e mapa de correções). São consultas de I/O em servidores
+    distintos, então o tempo total fica próximo ao da consulta mais lenta.
+    """
+    inicio = time.perf_counter()
+    with ExtracaoUnica(max_workers=4) as extracao:
+        futuros = {
+            "orcado": extracao.submeter(TABELA_ORCADO_CACHE, obter_dado_bruto, TABELA_ORCADO_CACHE, args.atualizar_cache),
+            "cc": extracao.submeter(TABELA_CC_CACHE, obter_dado_bruto, TABELA_CC_CACHE, args.atualizar_cache),
+            "comprometido": extracao.submeter("comprometido", obter_dados_comprometidos_brutos),
+            "mapa_correcoes": extracao.submeter("mapa_correcoes", carregar_mapa_correcoes),
+        }
+        fontes = {nome: futuro.result() for nome, futuro in futuros.items()}
+    logger.info("Extração paralela das fontes concluída em %.1f s.", time.perf_counter() - inicio)
+    return fontes
+
 
-# O restante do arquivo permanece o mesmo
 def run_pipelines_principais(args: argparse.Namespace) -> None:
-    _, df_cc_raw = obter_dados_brutos()
-    mapa_correcoes = carregar_mapa_correcoes()
+    fontes = extrair_fontes(args)
+    df_cc_raw, df_orcado_raw = fontes["cc"], fontes["orcado"]
+    mapa_correcoes = fontes["mapa_correcoes"]
     chaves_base = ['PROJETO', 'ACAO', 'UNIDADE']
     df_cc_referencia = preparar_dados_para_validacao(df_cc_raw, chaves_base, incluir_ano_na_chave=True)
+    indice_cc = obter_indice_cc(df_cc_referencia, assinatura_dado_bruto(TABELA_CC_CACHE))
+    referencia_comprometido = ReferenciaComprometido.da_referencia(df_cc_referencia)
     engine_financa = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
-    df_orcado_raw, _ = obter_dados_brutos()
-    df_orcado_final = executar_fluxo_de_enriquecimento(df_raw=df_orcado_raw, df_cc_referencia=df_cc_referencia, mapa_correcoes=mapa_correcoes, nome_fluxo="Orçado Nacional", args=args)
+    df_orcado_final = executar_fluxo_de_enriquecimento(df_raw=df_orcado_raw, df_cc_referencia=df_cc_referencia, mapa_correcoes=mapa_correcoes, nome_fluxo="Orçado Nacional", args=args, indice_cc=indice_cc)
     if not df_orcado_final.empty:
         logger.info("Salvando resultado do 'Orçado Nacional'...")
         salvar_resultado_no_sql(df_orcado_final, "ORCADO_ENRIQUECIDO_COM_CC", engine_financa)
+        gravar_quarentena(montar_quarentena(df_orcado_final), engine_financa)
     if args.modo_interativo: mapa_correcoes = carregar_mapa_correcoes()
-    df_comprometido_raw = obter_dados_comprometidos_brutos()
-    df_comprometido_final = executar_fluxo_de_enriquecimento(df_raw=df_comprometido_raw, df_cc_referencia=df_cc_referencia, mapa_correcoes=mapa_correcoes, nome_fluxo="Comprometido Nacional", args=args)
+    pesos_orcado = calcular_pesos_orcado(df_orcado_final) if args.alocacao_comprometido == POLITICA_PROPORCIONAL and not df_orcado_final.empty else None
+    if args.alocacao_comprometido == POLITICA_PROPORCIONAL and pesos_orcado is None:
+        logger.error("Sem Orçado enriquecido para ratear o Comprometido. Usando a política padrão.")
+        args.alocacao_comprometido = POLITICA_PADRAO
+    df_comprometido_raw = fontes["comprometido"]
+    df_comprometido_final = executar_fluxo_de_enriquecimento(df_raw=df_comprometido_raw, df_cc_referencia=df_cc_referencia, mapa_correcoes=mapa_correcoes, nome_fluxo="Comprometido Nacional", args=args, referencia_comprometido=referencia_comprometido, pesos_orcado=pesos_orcado)
     if not df_comprometido_final.empty:
         logger.info("Salvando resultado do 'Comprometido Nacional'...")
         salvar_resultado_no_sql(df_comprometido_final, "COMPROMETIDO_ENRIQUECIDO_COM_CC", engine_financa)
 
 
-def salvar_resultado_no_sql(df_para_salvar: pd.DataFrame, nome_tabela: str, engine):
-    logger.info(f"Organizando colunas para a tabela final '{nome_tabela}'...")
+CHAVE_PRIMARIA_FINAL = ['ANO', 'MES', 'CODCCUSTO', 'PROJETO', 'ACAO', 'Codigo_Natureza_Orcamentaria']
+COLUNAS_FINAIS = ['ANO', 'MES', 'PROJETO', 'ACAO', 'UNIDADE', 'CODCCUSTO', 'Valor_Ajustado', 'Codigo_Natureza_Orcamentaria']
+
+
+def preparar_resultado_para_sql(df_para_salvar: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
+    """Deduplica o resultado no grão final, só sobre as colunas gravadas, retornando também a chave usada."""
     if 'COMPROMETIDO' in df_para_salvar.columns: df_para_salvar.rename(columns={'COMPROMETIDO': 'Valor_Ajustado'}, inplace=True)
-    chave_primaria = ['ANO', 'MES', 'CODCCUSTO', 'PROJETO', 'ACAO', 'Codigo_Natureza_Orcamentaria']
-    chave_existente = [col for col in chave_primaria if col in df_para_salvar.columns]
+    chave_existente = [col for col in CHAVE_PRIMARIA_FINAL if col in df_para_salvar.columns]
     logger.info(f"Garantindo unicidade dos registros com base na chave: {chave_existente}")
-    regras_agg = {col: ('sum' if pd.api.types.is_numeric_dtype(df_para_salvar[col]) else 'first') for col in df_para_salvar.columns if col not in chave_existente}
-    df_agregado = df_para_salvar.groupby(chave_existente, as_index=False).agg(regras_agg)
-    if len(df_agregado) < len(df_para_salvar): logger.warning(f"Foram agregadas {len(df_para_salvar) - len(df_agregado)} linhas duplicadas.")
-    colunas_finais = ['ANO', 'MES', 'PROJETO', 'ACAO', 'UNIDADE', 'CODCCUSTO', 'Valor_Ajustado', 'Codigo_Natureza_Orcamentaria']
-    colunas_presentes = [col for col in colunas_finais if col in df_agregado.columns]
-    df_final = df_agregado[colunas_presentes].copy()
-    df_final.dropna(subset=['CODCCUSTO'], inplace=True)
+    df_final, estatisticas = deduplicar_no_grao(df_para_salvar, chave_existente, COLUNAS_FINAIS)
+    registrar_estatisticas_duplicidade(estatisticas, chave_existente)
+    return df_final, chave_existente
+
+
+def salvar_resultado_no_sql(df_para_salvar: pd.DataFrame, nome_tabela: str, engine):
+    logger.info(f"Organizando colunas para a tabela final '{nome_tabela}'...")
+    df_final, chave_existente = preparar_resultado_para_sql(df_para_salvar)
     carregar_dataframe_para_sql_com_merge(df=df_final, nome_tabela_final=nome_tabela, engine=engine, chave_primaria=chave_existente)
     logger.info(f"Processo para a tabela '{nome_tabela}' concluído com sucesso.")
 
 
+def run_pipelines_em_lotes(args: argparse.Namespace) -> None:
+    """
+    Modo em lotes (--chunk-size): lê cada fonte em lotes, corrige e enriquece
+    cada lote contra a referência de CC em memória e o grava em uma tabela de
+    estágio. Ao final, o estágio é agregado no servidor e sincronizado com a
+    tabela final, garantindo a unicidade do grão mesmo entre lotes diferentes.
+    O consumo de memória fica limitado ao tamanho do lote.
+    """
+    df_cc_raw = obter_dado_bruto(TABELA_CC_CACHE, args.atualizar_cache)
+    mapa_correcoes = carregar_mapa_correcoes()
+    chaves_base = ['PROJETO', 'ACAO', 'UNIDADE']
+    df_cc_referencia = preparar_dados_para_validacao(df_cc_raw, chaves_base, incluir_ano_na_chave=True)
+    indice_cc = obter_indice_cc(df_cc_referencia, assinatura_dado_bruto(TABELA_CC_CACHE))
+    referencia_comprometido = ReferenciaComprometido.da_referencia(df_cc_referencia)
+    engine_financa = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
+
+    fluxos = [
+        ("Orçado Nacional", iterar_dado_bruto_em_lotes(TABELA_ORCADO_CACHE, args.chunk_size), "ORCADO_ENRIQUECIDO_COM_CC"),
+        ("Comprometido Nacional", iterar_dados_comprometidos_em_lotes(args.chunk_size), "COMPROMETIDO_ENRIQUECIDO_COM_CC"),
+    ]
+    for nome_fluxo, lotes, nome_tabela in fluxos:
+        nome_tabela_estagio = f"{nome_tabela}_ESTAGIO_LOTES"
+        chave_existente, linhas_lidas, primeiro_lote = None, 0, True
+        for numero_lote, df_lote_raw in enumerate(lotes, start=1):
+            linhas_lidas += len(df_lote_raw)
+            logger.info(f"[{nome_fluxo}] Processando lote {numero_lote} ({len(df_lote_raw)} linhas, {linhas_lidas} no total)...")
+            df_lote = executar_fluxo_de_enriquecimento(df_raw=df_lote_raw, df_cc_referencia=df_cc_referencia, mapa_correcoes=mapa_correcoes, nome_fluxo=nome_fluxo, args=args, indice_cc=indice_cc, referencia_comprometido=referencia_comprometido)
+            if nome_tabela == TABELA_DESTINO_QUARENTENA:
+                gravar_quarentena(montar_quarentena(df_lote), engine_financa, substituir=numero_lote == 1)
+            if df_lote.empty:
+                continue
+            df_final_lote, chave_lote = preparar_resultado_para_sql(df_lote)
+            if df_final_lote.empty:
+                # Lote sem nenhum CC: as linhas já foram para a quarentena e o estágio não é tocado.
+                continue
+            chave_existente = chave_lote
+            anexar_em_tabela_de_estagio(df_final_lote, nome_tabela_estagio, engine_financa, substituir=primeiro_lote, chave_primaria=chave_existente)
+            primeiro_lote = False
+        if chave_existente is None:
+            logger.warning(f"Nenhum lote do '{nome_fluxo}' produziu dados para gravar.")
+            continue
+        consolidar_estagio_com_merge(
+            nome_tabela_estagio, nome_tabela, engine_financa, chave_primaria=chave_existente,
+            colunas_soma=['Valor_Ajustado'], colunas_texto=[col for col in COLUNAS_FINAIS if col not in chave_existente],
+        )
+        logger.info(f"Processo em lotes para a tabela '{nome_tabela}' concluído com sucesso.")
+
+
+def run_reprocessamento_quarentena(args: argparse.Namespace) -> None:
+    """
+    Modo --reprocessar-quarentena: corrige e enriquece de novo só as linhas do
+    Orçado que ficaram sem CODCCUSTO na última carga, com o mapa de correções
+    atual. As linhas resolvidas são somadas à tabela final e saem da quarentena;
+    as demais continuam lá. O Orçado completo não é lido.
+    """
+    engine_financa = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
+    df_quarentena = carregar_quarentena(engine_financa)
+    if df_quarentena.empty:
+        logger.info("A quarentena está vazia. Nada a reprocessar.")
+        return
+    logger.info(f"Reprocessando {len(df_quarentena)} linhas ({df_quarentena[COLUNA_CHAVE_QUARENTENA].nunique()} chaves) da quarentena...")
+    df_cc_raw = obter_dado_bruto(TABELA_CC_CACHE, args.atualizar_cache)
+    chaves_base = ['PROJETO', 'ACAO', 'UNIDADE']
+    df_cc_referencia = preparar_dados_para_validacao(df_cc_raw, chaves_base, incluir_ano_na_chave=True)
+    indice_cc = obter_indice_cc(df_cc_referencia, assinatura_dado_bruto(TABELA_CC_CACHE))
+    df_preparado = preparar_dados_para_validacao(df_quarentena, chaves_base, incluir_ano_na_chave=True)
+    df_corrigido = aplicar_mapa_correcoes(df_preparado, carregar_mapa_correcoes())
+    df_enriquecido = enriquecer_orcado_com_cc(df_orcado_pronto=df_corrigido, df_cc_pronto=df_cc_referencia, args=args, indice_cc=indice_cc)
+
+    df_resolvido = df_enriquecido[df_enriquecido['CODCCUSTO'].notna()]
+    if df_resolvido.empty:
+        logger.warning("Nenhuma chave da quarentena foi resolvida pelo mapa de correções atual.")
+        return
+    df_final, chave_existente = preparar_resultado_para_sql(df_resolvido)
+    resolver_quarentena(df_final, chave_existente, df_resolvido[COLUNA_CHAVE_QUARENTENA].unique(), engine_financa)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Robô de Enriquecimento de Dados.")
     parser.add_argument("--modo-interativo", action="store_true", help="Ativa o modo interativo para correção de chaves.")
+    parser.add_argument("--atualizar-cache", action="store_true", help="Atualiza o cache local de forma incremental (watermark por fonte) antes de processar.")
+    grupo_cache = parser.add_mutually_exclusive_group()
+    grupo_cache.add_argument("--refresh", action="store_true", help="Ignora o cache de consultas, busca os dados no banco e regrava o cache.")
+    grupo_cache.add_argument("--offline", action="store_true", help="Usa apenas resultados do cache de consultas, sem acessar o banco.")
+    parser.add_argument("--chunk-size", type=int, metavar="N", help="Processa as fontes em lotes de N linhas, com memória limitada (modo em lotes).")
+    parser.add_argument("--normalizar-chaves", action="store_true", help="Compara as chaves de junção ignorando maiúsculas, acentos e espaços extras.")
+    parser.add_argument("--auto-corrigir", action="store_true", help="Salva sem perguntar as correções sugeridas com similaridade acima de --limiar.")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_PADRAO, help=f"Similaridade mínima (0-100) aceita por --auto-corrigir (padrão: {LIMIAR_PADRAO}).")
+    parser.add_argument("--alocacao-comprometido", choices=POLITICAS_ALOCACAO, default=POLITICA_PADRAO, help=f"Como alocar o Comprometido de um CC truncado com vários CCs completos: primeiro CC, rateio proporcional ao Orçado ou rejeitar (padrão: {POLITICA_PADRAO}).")
+    parser.add_argument("--reprocessar-quarentena", action="store_true", help="Reprocessa apenas as linhas do Orçado em quarentena (sem CODCCUSTO) com o mapa de correções atual.")
     args = parser.parse_args()
+    if args.chunk_size is not None and args.chunk_size <= 0: parser.error("--chunk-size deve ser um inteiro positivo.")
+    if args.chunk_size and args.modo_interativo: parser.error("--chunk-size não pode ser combinado com --modo-interativo.")
+    if args.chunk_size and args.alocacao_comprometido == POLITICA_PROPORCIONAL: parser.error("--alocacao-comprometido proporcional não pode ser combinado com --chunk-size (o rateio usa o Orçado completo).")
+    if args.chunk_size and args.reprocessar_quarentena: parser.error("--chunk-size não pode ser combinado com --reprocessar-quarentena.")
+    if not 0 <= args.limiar <= 100: parser.error("--limiar deve estar entre 0 e 100.")
+    if args.refresh: definir_modo_cache(MODO_REFRESH)
+    elif args.offline: definir_modo_cache(MODO_OFFLINE)
+    if args.normalizar_chaves: definir_normalizacao_chaves(True)
     logger.info("--- INICIANDO ROBÔ DE ENRIQUECIMENTO DE DADOS ---")
     if args.modo_interativo: logger.info("Modo interativo ATIVADO.")
+    if args.auto_corrigir: logger.info(f"Correção automática ATIVADA (limiar de {args.limiar:.0f}%).")
     try:
-        run_pipelines_principais(args)
+        if args.reprocessar_quarentena:
+            logger.info("Modo de reprocessamento da quarentena ATIVADO.")
+            run_reprocessamento_quarentena(args)
+        elif args.chunk_size:
+            logger.info(f"Modo em lotes ATIVADO ({args.chunk_size} linhas por lote).")
+            run_pipelines_em_lotes(args)
+        else:
+            run_pipelines_principais(args)
     except Exception:
         logger.exception("--- ERRO CRÍTICO E INESPERADO NA EXECUÇÃO ---")
     finally:
+        registrar_estatisticas_pool()
         logger.info("--- FIM DA EXECUÇÃO ---")
 
 if __name__ == "__main__":
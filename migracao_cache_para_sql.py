@@ -1,75 +1,61 @@
-import json
+import argparse
 import logging
-import pandas as pd
-import sqlalchemy # Necessário para os dtypes
+from pathlib import Path
 
 # Configuração básica para vermos o que está acontecendo
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Importe suas configurações de conexão
 from config.config import CONFIG
-from config.database import get_conexao
+from processamento.repositorio_correcoes import REPOSITORIO_CORRECOES
 
-def run_one_time_migration():
+def run_one_time_migration(caminho_json: Path | None = None):
     """
-    Lê o mapa de correções de um arquivo JSON local e o carrega em massa
-    para a tabela MapaCorrecoesChaves no SQL Server.
+    Envia o mapa de correções local (cache/mapa_correcoes.db) para a tabela
+    MapaCorrecoesChaves no SQL Server. Com 'caminho_json', o arquivo JSON é
+    antes importado para a cópia local.
     
     ATENÇÃO: Substitui completamente os dados na tabela de destino!
     """
-    logging.info("--- INICIANDO MIGRAÇÃO DO CACHE LOCAL PARA O SQL SERVER ---")
+    logging.info("--- INICIANDO MIGRAÇÃO DO MAPA LOCAL PARA O SQL SERVER ---")
     
-    # --- ALTERE AQUI O CAMINHO PARA SEU ARQUIVO DE CACHE ---
-    # Coloque o caminho exato para o arquivo que contém suas correções.
-    # Geralmente é algo como 'cache/mapa_correcoes.json'
-    # Se você não o moveu, ele pode estar na raiz ou em uma pasta 'cache'.
-    CAMINHO_ARQUIVO_CACHE = "dados/mapa_correcoes.json" # <<< CONFIRME ESTE CAMINHO
-    
-    try:
-        with open(CAMINHO_ARQUIVO_CACHE, 'r', encoding='utf-8') as f:
-            mapa_local = json.load(f)
-        logging.info(f"Arquivo de cache '{CAMINHO_ARQUIVO_CACHE}' lido com sucesso.")
-    except FileNotFoundError:
-        logging.error(f"!!! ERRO CRÍTICO: O arquivo de cache '{CAMINHO_ARQUIVO_CACHE}' não foi encontrado.")
-        logging.error("A migração não pode continuar. Verifique o caminho e tente novamente.")
-        return
-    except json.JSONDecodeError:
-        logging.error(f"!!! ERRO CRÍTICO: O arquivo '{CAMINHO_ARQUIVO_CACHE}' parece estar corrompido.")
-        return
+    if caminho_json is not None:
+        try:
+            REPOSITORIO_CORRECOES.importar_json(caminho_json)
+        except FileNotFoundError:
+            logging.error(f"!!! ERRO CRÍTICO: O arquivo '{caminho_json}' não foi encontrado.")
+            logging.error("A migração não pode continuar. Verifique o caminho e tente novamente.")
+            return
+        except ValueError:
+            logging.error(f"!!! ERRO CRÍTICO: O arquivo '{caminho_json}' parece estar corrompido.")
+            return
 
-    if not mapa_local:
-        logging.warning("O arquivo de cache está vazio. Nenhuma correção para migrar.")
+    if REPOSITORIO_CORRECOES.consultar_total() == 0:
+        logging.warning("O mapa local está vazio. Nenhuma correção para migrar.")
         return
 
-    df_correcoes = pd.DataFrame(
-        list(mapa_local.items()),
-        columns=['ChaveQuebrada', 'ChaveCorreta']
-    )
-    
-    logging.info(f"Encontradas {len(df_correcoes)} correções no arquivo local. Preparando para enviar ao SQL Server...")
-
     try:
-        engine_financa = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
-        
         logging.warning("Conectando ao SQL... A tabela 'MapaCorrecoesChaves' será substituída.")
-        
-        df_correcoes.to_sql(
-            name='MapaCorrecoesChaves',
-            con=engine_financa,
-            if_exists='replace', # Apaga tudo o que existe lá e insere esta nova carga
-            index=False,
-            dtype={ # Garante que os tipos de texto sejam compatíveis com o SQL Server
-                'ChaveQuebrada': sqlalchemy.types.NVARCHAR(255),
-                'ChaveCorreta': sqlalchemy.types.NVARCHAR(255)
-            }
-        )
+        total = REPOSITORIO_CORRECOES.enviar_para_servidor(substituir=True)
         
         logging.info("--- SUCESSO! ---")
-        logging.info(f"As {len(df_correcoes)} correções foram migradas para a tabela 'MapaCorrecoesChaves'.")
+        logging.info(f"As {total} correções foram migradas para a tabela 'MapaCorrecoesChaves'.")
         
     except Exception as e:
         logging.exception("--- FALHA CRÍTICA DURANTE A MIGRAÇÃO PARA O SQL ---")
         raise
 
+def main():
+    parser = argparse.ArgumentParser(description="Importa/exporta o mapa de correções local e o envia para dbo.MapaCorrecoesChaves.")
+    parser.add_argument("--json", type=Path, nargs="?", const=CONFIG.paths.mapa_correcoes, default=None,
+                        help="Importa antes um JSON {quebrada: correta} para o mapa local (padrão: dados/mapa_correcoes.json).")
+    parser.add_argument("--exportar-json", type=Path, default=None, help="Apenas grava o mapa local neste arquivo JSON, sem enviar ao SQL.")
+    args = parser.parse_args()
+
+    if args.exportar_json is not None:
+        REPOSITORIO_CORRECOES.exportar_json(args.exportar_json)
+        return
+    run_one_time_migration(args.json)
+
 if __name__ == "__main__":
-    run_one_time_migration()
+    main()
@@ -0,0 +1,95 @@
+# podar_mapa_correcoes.py
+import argparse
+import json
+import logging
+
+from sqlalchemy import bindparam, text
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+from config.config import CONFIG
+from processamento.validacao import carregar_mapa_correcoes, classificar_correcoes_para_normalizacao
+
+# O SQL Server aceita no máximo 2100 parâmetros por comando.
+TAMANHO_LOTE_EXCLUSAO = 1000
+
+
+def remover_do_sql(chaves_quebradas: list[str]) -> None:
+    """Exclui as chaves de dbo.MapaCorrecoesChaves e da cópia local do mapa."""
+    from config.database import get_conexao
+    from processamento.repositorio_correcoes import REPOSITORIO_CORRECOES
+    engine = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
+    stmt = text("DELETE FROM dbo.MapaCorrecoesChaves WHERE ChaveQuebrada IN :chaves").bindparams(
+        bindparam("chaves", expanding=True)
+    )
+    with engine.begin() as connection:
+        for inicio in range(0, len(chaves_quebradas), TAMANHO_LOTE_EXCLUSAO):
+            connection.execute(stmt, {"chaves": chaves_quebradas[inicio:inicio + TAMANHO_LOTE_EXCLUSAO]})
+    REPOSITORIO_CORRECOES.remover(chaves_quebradas)
+    logging.info("%d correções removidas de dbo.MapaCorrecoesChaves.", len(chaves_quebradas))
+
+
+def remover_do_json(mapa: dict, chaves_quebradas: list[str]) -> None:
+    """Regrava o arquivo JSON do mapa sem as chaves informadas."""
+    removidas = set(chaves_quebradas)
+    mapa_podado = {quebrada: correta for quebrada, correta in mapa.items() if quebrada not in removidas}
+    with open(CONFIG.paths.mapa_correcoes, 'w', encoding='utf-8') as f:
+        json.dump(mapa_podado, f, ensure_ascii=False, indent=4)
+    logging.info("%d correções removidas de '%s'.", len(removidas), CONFIG.paths.mapa_correcoes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Relata (e opcionalmente remove) as correções que ficam desnecessárias com --normalizar-chaves."
+    )
+    parser.add_argument("--fonte", choices=["sql", "json"], default="sql", help="Mapa analisado: dbo.MapaCorrecoesChaves (padrão) ou dados/mapa_correcoes.json.")
+    parser.add_argument(
+        "--aplicar", action="store_true",
+        help="Remove da fonte as entradas redundantes e duplicadas. ATENÇÃO: depois disso, execuções sem "
+             "--normalizar-chaves voltam a falhar na junção dessas chaves. Exige --somente-chaves-normalizadas.",
+    )
+    parser.add_argument(
+        "--somente-chaves-normalizadas", action="store_true",
+        help="Confirma que, após a poda, o pipeline (main.py) só será executado com --normalizar-chaves.",
+    )
+    parser.add_argument("--listar", action="store_true", help="Lista cada entrada encontrada, além do resumo.")
+    args = parser.parse_args()
+    if args.aplicar and not args.somente_chaves_normalizadas:
+        parser.error(
+            "--aplicar remove do mapa compartilhado correções que o modo de chaves exato (o padrão) ainda usa: "
+            "execuções sem --normalizar-chaves voltariam a falhar nessas chaves. "
+            "Confirme com --somente-chaves-normalizadas."
+        )
+
+    if args.fonte == "json":
+        with open(CONFIG.paths.mapa_correcoes, 'r', encoding='utf-8') as f:
+            mapa = json.load(f)
+    else:
+        mapa = carregar_mapa_correcoes()
+
+    classificacao = classificar_correcoes_para_normalizacao(mapa)
+    logging.info("Mapa analisado: %d correções.", len(mapa))
+    for grupo, chaves in classificacao.items():
+        logging.info("  - %s: %d", grupo, len(chaves))
+        if args.listar:
+            for chave in chaves:
+                print(f"[{grupo}] {chave} -> {mapa[chave]}")
+    if classificacao['conflitantes']:
+        logging.warning("Entradas conflitantes não são removidas: com chaves normalizadas vale a primeira do mapa. Revise-as manualmente.")
+
+    podaveis = classificacao['redundantes'] + classificacao['duplicadas']
+    if not args.aplicar:
+        logging.info("%d correções podem ser removidas. Use --aplicar para removê-las.", len(podaveis))
+        return
+    if not podaveis:
+        logging.info("Nada a remover.")
+        return
+    logging.warning("Removendo %d correções: a partir de agora, execute main.py sempre com --normalizar-chaves.", len(podaveis))
+    if args.fonte == "json":
+        remover_do_json(mapa, podaveis)
+    else:
+        remover_do_sql(podaveis)
+
+
+if __name__ == "__main__":
+    main()
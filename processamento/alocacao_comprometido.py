@@ -0,0 +1,149 @@
+# processamento/alocacao_comprometido.py
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from processamento.esquema import transformar_texto
+from processamento.hierarquia_cc import HierarquiaCC
+
+logger = logging.getLogger(__name__)
+
+# O Comprometido vem com o CC truncado (sem o segmento da ação); um CC truncado
+# costuma ter vários CCs completos abaixo dele. A política decide para qual deles
+# vai o valor de cada (CC truncado, ANO, MES):
+POLITICA_PRIMEIRO_FILHO = "primeiro"      # o menor CC completo (em ordem de CODCCUSTO)
+POLITICA_PROPORCIONAL = "proporcional"    # rateado pelo Orçado de cada CC completo no ano
+POLITICA_REJEITAR = "rejeitar"            # só CCs truncados com um único CC completo
+POLITICAS_ALOCACAO = (POLITICA_PRIMEIRO_FILHO, POLITICA_PROPORCIONAL, POLITICA_REJEITAR)
+POLITICA_PADRAO = POLITICA_PRIMEIRO_FILHO
+
+COLUNA_VALOR_COMPROMETIDO = "COMPROMETIDO"
+COLUNA_LINHAS_ORIGEM = "LINHAS_ORIGEM"
+COLUNAS_CC_REFERENCIA = ["PROJETO", "ACAO", "UNIDADE", "CODCCUSTO"]
+# Ordem da referência: a escolha do CC completo não pode depender da ordem das
+# linhas de queries/cc.sql nem do cache, senão o destino muda entre execuções.
+COLUNAS_ORDEM_REFERENCIA = ["CODCCUSTO", "ANO", "PROJETO", "ACAO", "UNIDADE"]
+
+
+@dataclass(frozen=True)
+class ReferenciaComprometido:
+    """Referência de CC com um CC completo por linha e o índice da sua hierarquia, montados uma vez por execução."""
+    cc: pd.DataFrame
+    hierarquia: HierarquiaCC
+
+    @classmethod
+    def da_referencia(cls, df_cc_referencia: pd.DataFrame) -> "ReferenciaComprometido":
+        """
+        Uma linha por CODCCUSTO, em ordem de CODCCUSTO: o "primeiro filho" de um
+        CC truncado é o menor CC completo abaixo dele, em qualquer execução.
+        """
+        ordem = [col for col in COLUNAS_ORDEM_REFERENCIA if col in df_cc_referencia.columns]
+        df_ordenado = df_cc_referencia.sort_values(ordem, key=lambda col: col.astype(str).str.strip(), kind="stable")
+        df_cc = df_ordenado.drop_duplicates(subset="CODCCUSTO", keep="first")[COLUNAS_CC_REFERENCIA].reset_index(drop=True)
+        return cls(cc=df_cc, hierarquia=HierarquiaCC(df_cc["CODCCUSTO"]))
+
+
+def calcular_pesos_orcado(df_orcado: pd.DataFrame) -> pd.Series:
+    """Orçado (Valor_Ajustado) por (CODCCUSTO, ANO), usado como peso da política proporcional."""
+    df_pesos = df_orcado.dropna(subset=["CODCCUSTO"])
+    return df_pesos.groupby(
+        [df_pesos["CODCCUSTO"].astype(str).str.strip(), df_pesos["ANO"].astype("int64")], observed=True
+    )["Valor_Ajustado"].sum()
+
+
+def agregar_comprometido(df_raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Soma o COMPROMETIDO no grão (CC truncado, ANO, MES), ou seja, por todas as
+    demais colunas. LINHAS_ORIGEM guarda quantas linhas brutas cada grão somou.
+    """
+    df = df_raw.assign(CODCCUSTO=transformar_texto(df_raw["CODCCUSTO"], lambda textos: textos.str.strip()))
+    grao = [col for col in df.columns if col != COLUNA_VALOR_COMPROMETIDO]
+    return df.groupby(grao, as_index=False, observed=True, sort=False, dropna=False).agg(
+        **{COLUNA_VALOR_COMPROMETIDO: (COLUNA_VALOR_COMPROMETIDO, "sum"), COLUNA_LINHAS_ORIGEM: (COLUNA_VALOR_COMPROMETIDO, "size")}
+    )
+
+
+def alocar_comprometido(
+    df_raw: pd.DataFrame,
+    referencia: ReferenciaComprometido,
+    politica: str = POLITICA_PADRAO,
+    pesos_orcado: Optional[pd.Series] = None,
+) -> pd.DataFrame:
+    """
+    Atribui PROJETO, ACAO, UNIDADE e o CODCCUSTO completo ao Comprometido, que
+    chega com o CC truncado. O valor é antes agregado no grão (CC truncado,
+    ANO, MES); sobre esse grão, mede-se a quantos CCs completos distintos cada
+    linha bruta corresponde (registrado no log) e cada linha agregada é
+    alocada segundo 'politica', de modo que nenhum valor é contado em dobro.
+    Linhas sem nenhum CC completo correspondente são descartadas.
+    """
+    if politica not in POLITICAS_ALOCACAO:
+        raise ValueError(f"Política de alocação do Comprometido desconhecida: '{politica}'. Use uma de {POLITICAS_ALOCACAO}.")
+    if politica == POLITICA_PROPORCIONAL and pesos_orcado is None:
+        raise ValueError("A política 'proporcional' requer os pesos do Orçado (calcular_pesos_orcado).")
+    hierarquia = referencia.hierarquia
+
+    df_agregado = agregar_comprometido(df_raw)
+    linhas_origem = df_agregado.pop(COLUNA_LINHAS_ORIGEM).to_numpy()
+    quantidade = hierarquia.contar_filhos(df_agregado["CODCCUSTO"])
+    encontradas = quantidade > 0
+    if encontradas.any():
+        linhas_encontradas = int(linhas_origem[encontradas].sum())
+        linhas_expandidas = int((linhas_origem * quantidade).sum())
+        logger.info(
+            "Comprometido pelo CC truncado: %d linhas brutas correspondem a %d pares (linha, CC completo distinto); "
+            "média de %.2f CCs completos por linha, até %d por CC truncado.",
+            linhas_encontradas, linhas_expandidas, linhas_expandidas / linhas_encontradas, int(quantidade.max()),
+        )
+    linhas_sem_match = int(linhas_origem[~encontradas].sum())
+    if linhas_sem_match > 0:
+        logger.warning(f"{linhas_sem_match} linhas do Comprometido não encontraram correspondência e serão descartadas.")
+    df_agregado, quantidade = df_agregado[encontradas].reset_index(drop=True), quantidade[encontradas]
+    logger.info(f"Comprometido agregado no grão (CC truncado, ANO, MES): {len(df_raw)} -> {len(df_agregado)} linhas.")
+
+    if politica == POLITICA_REJEITAR:
+        ambiguas = quantidade > 1
+        if ambiguas.any():
+            logger.warning(
+                "%d linhas agregadas (COMPROMETIDO de %.2f) rejeitadas: o CC truncado tem mais de um CC completo.",
+                int(ambiguas.sum()), float(df_agregado.loc[ambiguas, COLUNA_VALOR_COMPROMETIDO].sum()),
+            )
+        df_agregado = df_agregado[~ambiguas].reset_index(drop=True)
+        return _anexar_cc(df_agregado, referencia, hierarquia.primeiro_filho(df_agregado["CODCCUSTO"]))
+
+    if politica == POLITICA_PRIMEIRO_FILHO:
+        return _anexar_cc(df_agregado, referencia, hierarquia.primeiro_filho(df_agregado["CODCCUSTO"]))
+
+    # Proporcional: cada linha agregada vai para os CCs completos com Orçado no ano,
+    # na proporção desse Orçado; sem Orçado em nenhum deles, vale o primeiro CC.
+    linhas_agregado, linhas_cc = hierarquia.expandir_filhos(df_agregado["CODCCUSTO"])
+    chaves_peso = pd.MultiIndex.from_arrays([
+        referencia.cc["CODCCUSTO"].astype(str).str.strip().to_numpy()[linhas_cc],
+        df_agregado["ANO"].astype("int64").to_numpy()[linhas_agregado],
+    ])
+    pesos = np.clip(pesos_orcado.reindex(chaves_peso).fillna(0).to_numpy(dtype=float), 0, None)
+    peso_total = np.bincount(linhas_agregado, weights=pesos, minlength=len(df_agregado))
+    com_peso = pesos > 0
+    sem_orcado = peso_total == 0
+    if sem_orcado.any():
+        logger.warning(f"{int(sem_orcado.sum())} linhas agregadas sem Orçado nos CCs completos: alocadas ao primeiro CC.")
+
+    df_rateado = _anexar_cc(df_agregado.iloc[linhas_agregado[com_peso]].reset_index(drop=True), referencia, linhas_cc[com_peso])
+    df_rateado[COLUNA_VALOR_COMPROMETIDO] *= pesos[com_peso] / peso_total[linhas_agregado[com_peso]]
+    df_sem_orcado = df_agregado[sem_orcado].reset_index(drop=True)
+    df_sem_orcado = _anexar_cc(df_sem_orcado, referencia, hierarquia.primeiro_filho(df_sem_orcado["CODCCUSTO"]))
+    df_alocado = pd.concat([df_rateado, df_sem_orcado], ignore_index=True)
+    if len(df_alocado) > len(df_raw):
+        logger.warning(f"O rateio proporcional gerou {len(df_alocado)} linhas, mais que as {len(df_raw)} de entrada.")
+    return df_alocado
+
+
+def _anexar_cc(df_agregado: pd.DataFrame, referencia: ReferenciaComprometido, linhas_cc: np.ndarray) -> pd.DataFrame:
+    """Troca o CC truncado pelas colunas do CC completo nas 'linhas_cc' da referência."""
+    df_alocado = df_agregado.drop(columns=["CODCCUSTO"])
+    for col in COLUNAS_CC_REFERENCIA:
+        df_alocado[col] = referencia.cc[col].array.take(linhas_cc)
+    return df_alocado
@@ -0,0 +1,156 @@
+# processamento/cache_consultas.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+from config.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Modos de operação do cache, selecionados pela linha de comando (--refresh / --offline)
+MODO_NORMAL = "normal"
+MODO_REFRESH = "refresh"
+MODO_OFFLINE = "offline"
+
+_ARQUIVO_INDICE = "indice.json"
+_modo_atual = MODO_NORMAL
+_lock = threading.Lock()
+
+
+def definir_modo_cache(modo: str) -> None:
+    """
+    Define como as consultas usam o cache:
+    - 'normal': usa o resultado em cache enquanto estiver dentro do TTL da fonte.
+    - 'refresh': ignora o cache, consulta o banco e regrava o resultado.
+    - 'offline': nunca consulta o banco; usa o cache mesmo se expirado.
+    """
+    global _modo_atual
+    if modo not in (MODO_NORMAL, MODO_REFRESH, MODO_OFFLINE):
+        raise ValueError(f"Modo de cache desconhecido: '{modo}'.")
+    _modo_atual = modo
+    logger.info("Cache de consultas em modo '%s'.", modo)
+
+
+def obter_modo_cache() -> str:
+    """Retorna o modo de cache em vigor ('normal', 'refresh' ou 'offline')."""
+    return _modo_atual
+
+
+def calcular_fingerprint(sql: str, nome_conexao: str, params=None) -> str:
+    """Gera a chave do cache a partir do texto SQL, dos parâmetros e da conexão."""
+    conteudo = json.dumps(
+        {"sql": sql.strip(), "params": params, "conexao": nome_conexao}, sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def obter_com_cache(
+    fonte: str,
+    sql: str,
+    nome_conexao: str,
+    carregador: Callable[[], Optional[pd.DataFrame]],
+    params=None,
+) -> Optional[pd.DataFrame]:
+    """
+    Retorna o resultado de uma consulta a partir do cache local quando ele
+    ainda é válido para a fonte; caso contrário executa 'carregador' e grava
+    o resultado. Resultados None (falha na consulta) não são armazenados.
+    """
+    fingerprint = calcular_fingerprint(sql, nome_conexao, params)
+    ttl_segundos = CONFIG.cache_ttl_horas.get(fonte, CONFIG.cache_ttl_horas["padrao"]) * 3600
+
+    if _modo_atual != MODO_REFRESH:
+        df = _ler_do_cache(fonte, fingerprint, ttl_segundos)
+        if df is not None:
+            return df
+    if _modo_atual == MODO_OFFLINE:
+        raise FileNotFoundError(f"Modo offline: não há resultado em cache para a fonte '{fonte}'.")
+
+    df = carregador()
+    if df is not None:
+        _gravar_no_cache(fonte, fingerprint, df)
+    return df
+
+
+def _ler_do_cache(fonte: str, fingerprint: str, ttl_segundos: float) -> Optional[pd.DataFrame]:
+    diretorio = CONFIG.paths.cache_consultas_dir
+    with _lock:
+        indice = _carregar_indice(diretorio)
+        entrada = indice.get(fingerprint)
+        caminho = diretorio / f"{fingerprint}.pkl"
+        if entrada is None or not caminho.exists():
+            logger.info("Cache de consultas: sem resultado para '%s'.", fonte)
+            return None
+        idade = time.time() - entrada["criado_em"]
+        # '>=': com TTL 0, duas chamadas no mesmo tique do relógio (idade 0) não podem ser servidas do cache.
+        if idade >= ttl_segundos and _modo_atual != MODO_OFFLINE:
+            logger.info("Cache de consultas: resultado de '%s' expirado (%.1f h).", fonte, idade / 3600)
+            return None
+        try:
+            df = pd.read_pickle(caminho)
+        except Exception as e:
+            logger.warning("Cache de consultas: arquivo '%s' ilegível (%s). Descartando.", caminho.name, e)
+            caminho.unlink(missing_ok=True)
+            indice.pop(fingerprint, None)
+            _salvar_indice(diretorio, indice)
+            return None
+        entrada["ultimo_acesso"] = time.time()
+        _salvar_indice(diretorio, indice)
+    logger.info("Cache de consultas: '%s' servido do cache (%d linhas, %.1f h).", fonte, len(df), idade / 3600)
+    return df
+
+
+def _gravar_no_cache(fonte: str, fingerprint: str, df: pd.DataFrame) -> None:
+    diretorio = CONFIG.paths.cache_consultas_dir
+    diretorio.mkdir(parents=True, exist_ok=True)
+    caminho = diretorio / f"{fingerprint}.pkl"
+    caminho_temp = caminho.with_suffix(".tmp")
+    with _lock:
+        df.to_pickle(caminho_temp)
+        os.replace(caminho_temp, caminho)
+        agora = time.time()
+        indice = _carregar_indice(diretorio)
+        indice[fingerprint] = {
+            "fonte": fonte, "criado_em": agora, "ultimo_acesso": agora, "bytes": caminho.stat().st_size,
+        }
+        _remover_excedentes(diretorio, indice)
+        _salvar_indice(diretorio, indice)
+    logger.info("Cache de consultas: resultado de '%s' gravado (%d linhas).", fonte, len(df))
+
+
+def _remover_excedentes(diretorio: Path, indice: dict) -> None:
+    """Remove as entradas menos usadas recentemente até respeitar o limite de tamanho."""
+    limite = CONFIG.cache_consultas_max_mb * 1024 * 1024
+    total = sum(entrada["bytes"] for entrada in indice.values())
+    for fingerprint, entrada in sorted(indice.items(), key=lambda item: item[1]["ultimo_acesso"]):
+        if total <= limite:
+            break
+        (diretorio / f"{fingerprint}.pkl").unlink(missing_ok=True)
+        total -= entrada["bytes"]
+        del indice[fingerprint]
+        logger.info("Cache de consultas: entrada de '%s' removida por limite de tamanho.", entrada["fonte"])
+
+
+def _carregar_indice(diretorio: Path) -> dict:
+    caminho = diretorio / _ARQUIVO_INDICE
+    if not caminho.exists():
+        return {}
+    try:
+        return json.loads(caminho.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        logger.warning("Índice do cache de consultas corrompido. Recriando.")
+        return {}
+
+
+def _salvar_indice(diretorio: Path, indice: dict) -> None:
+    diretorio.mkdir(parents=True, exist_ok=True)
+    caminho_temp = diretorio / f"{_ARQUIVO_INDICE}.tmp"
+    caminho_temp.write_text(json.dumps(indice, indent=2), encoding="utf-8")
+    os.replace(caminho_temp, diretorio / _ARQUIVO_INDICE)
@@ -0,0 +1,164 @@
+# processamento/chaves.py
+import logging
+import threading
+import unicodedata
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Campos da chave composta e quantos bits cada um ocupa no código inteiro (total de 63 bits).
+CAMPOS_CHAVE = ["PROJETO", "ACAO", "UNIDADE", "ANO"]
+BITS_CAMPOS = {"PROJETO": 20, "ACAO": 20, "UNIDADE": 15, "ANO": 8}
+
+CODIGO_INVALIDO = -1
+SEPARADOR_CHAVE = "|"
+
+
+class CodificadorChaves:
+    """
+    Codifica a chave composta PROJETO|ACAO|UNIDADE|ANO em um único int64.
+
+    Cada campo é fatorado contra um dicionário compartilhado (valor -> código)
+    e os códigos são empacotados em faixas de bits fixas. Como o dicionário é
+    o mesmo para todos os DataFrames, o mesmo conjunto de valores gera sempre o
+    mesmo código, e as junções podem ser feitas sobre inteiros. O texto da
+    chave só é montado sob demanda, em 'decodificar'.
+
+    Com normalizar=True, valores que diferem só em maiúsculas, acentos ou
+    espaços ('normalizar_valor_chave') recebem o mesmo código; 'decodificar'
+    devolve a primeira grafia vista de cada valor.
+    """
+
+    def __init__(self, campos: Optional[list[str]] = None, bits: Optional[dict[str, int]] = None, normalizar: bool = False):
+        self.campos = list(campos or CAMPOS_CHAVE)
+        self.bits = dict(bits or BITS_CAMPOS)
+        self.normalizar = normalizar
+        if sum(self.bits[campo] for campo in self.campos) > 63:
+            raise ValueError("A soma dos bits dos campos da chave não cabe em um int64.")
+        self._codigos: dict[str, dict] = {campo: {} for campo in self.campos}
+        self._valores: dict[str, list] = {campo: [] for campo in self.campos}
+        self._lock = threading.Lock()
+
+    def codificar(self, df: pd.DataFrame, adicionar: bool = True) -> np.ndarray:
+        """
+        Retorna o código inteiro da chave de cada linha de 'df'. Com
+        adicionar=False, valores ainda não vistos não entram no dicionário e a
+        linha recebe CODIGO_INVALIDO (útil para consultas que não devem crescer
+        o dicionário).
+        """
+        faltantes = [campo for campo in self.campos if campo not in df.columns]
+        if faltantes:
+            raise KeyError(f"Colunas da chave ausentes para codificação: {faltantes}")
+
+        codigo = np.zeros(len(df), dtype=np.int64)
+        invalidos = np.zeros(len(df), dtype=bool)
+        with self._lock:
+            for campo in self.campos:
+                codigos_campo = self._codificar_campo(campo, df[campo], adicionar)
+                invalidos |= codigos_campo < 0
+                codigo = (codigo << self.bits[campo]) | np.where(codigos_campo < 0, 0, codigos_campo)
+        codigo[invalidos] = CODIGO_INVALIDO
+        return codigo
+
+    def codificar_textos(self, chaves: Iterable[str], adicionar: bool = False) -> np.ndarray:
+        """
+        Codifica chaves já em texto ('PROJETO|ACAO|UNIDADE|ANO'), como as do mapa
+        de correções. Chaves malformadas recebem CODIGO_INVALIDO.
+        """
+        registros, validas = [], []
+        for chave in chaves:
+            partes = chave.split(SEPARADOR_CHAVE) if isinstance(chave, str) else []
+            try:
+                if len(partes) != len(self.campos):
+                    raise ValueError
+                registros.append(partes[:-1] + [int(partes[-1])])
+                validas.append(True)
+            except ValueError:
+                registros.append([None] * len(self.campos))
+                validas.append(False)
+
+        df_chaves = pd.DataFrame(registros, columns=self.campos)
+        validas = np.array(validas, dtype=bool)
+        codigos = np.full(len(df_chaves), CODIGO_INVALIDO, dtype=np.int64)
+        if validas.any():
+            codigos[validas] = self.codificar(df_chaves[validas], adicionar=adicionar)
+        return codigos
+
+    def decodificar(self, codigos) -> np.ndarray:
+        """
+        Monta o texto 'PROJETO|ACAO|UNIDADE|ANO' dos códigos informados. O texto
+        é montado uma vez por código distinto; CODIGO_INVALIDO vira None.
+        """
+        codigos = np.asarray(codigos, dtype=np.int64)
+        unicos, inversos = np.unique(codigos, return_inverse=True)
+        with self._lock:
+            textos = np.array([self._texto(int(codigo)) for codigo in unicos], dtype=object)
+        return textos[inversos.reshape(-1)]
+
+    def _codificar_campo(self, campo: str, serie: pd.Series, adicionar: bool) -> np.ndarray:
+        # Fatora localmente (vetorizado) e só consulta o dicionário para os valores distintos.
+        codigos_locais, unicos = pd.factorize(serie)
+        dicionario, valores = self._codigos[campo], self._valores[campo]
+        limite = 1 << self.bits[campo]
+        codigos_globais = np.empty(len(unicos), dtype=np.int64)
+        for i, valor in enumerate(unicos):
+            chave = normalizar_valor_chave(valor) if self.normalizar else valor
+            codigo = dicionario.get(chave)
+            if codigo is None:
+                if not adicionar:
+                    codigo = CODIGO_INVALIDO
+                else:
+                    codigo = len(valores)
+                    if codigo >= limite:
+                        raise ValueError(
+                            f"O campo '{campo}' excedeu {limite} valores distintos; aumente seus bits em BITS_CAMPOS."
+                        )
+                    dicionario[chave] = codigo
+                    valores.append(valor)
+            codigos_globais[i] = codigo
+        return np.where(codigos_locais < 0, CODIGO_INVALIDO, codigos_globais[codigos_locais] if len(unicos) else CODIGO_INVALIDO)
+
+    def _texto(self, codigo: int) -> Optional[str]:
+        if codigo < 0:
+            return None
+        partes = []
+        for campo in reversed(self.campos):
+            mascara = (1 << self.bits[campo]) - 1
+            partes.append(str(self._valores[campo][codigo & mascara]))
+            codigo >>= self.bits[campo]
+        return SEPARADOR_CHAVE.join(reversed(partes))
+
+
+def normalizar_valor_chave(valor):
+    """Forma canônica de um campo da chave: sem acentos, sem diferença de maiúsculas e com espaços colapsados."""
+    if not isinstance(valor, str):
+        return valor
+    sem_acentos = "".join(c for c in unicodedata.normalize("NFKD", valor) if not unicodedata.combining(c))
+    return " ".join(sem_acentos.split()).casefold()
+
+
+def normalizar_chave_texto(chave: str) -> str:
+    """Aplica 'normalizar_valor_chave' a cada campo de uma chave 'PROJETO|ACAO|UNIDADE|ANO'."""
+    return SEPARADOR_CHAVE.join(normalizar_valor_chave(parte) for parte in chave.split(SEPARADOR_CHAVE))
+
+
+# Instâncias compartilhadas pelo processo: Orçado, CC e Comprometido precisam do
+# mesmo dicionário para que seus códigos sejam comparáveis.
+CODIFICADOR_PADRAO = CodificadorChaves()
+CODIFICADOR_NORMALIZADO = CodificadorChaves(normalizar=True)
+_codificador_atual = CODIFICADOR_PADRAO
+
+
+def definir_normalizacao_chaves(ativa: bool) -> None:
+    """Seleciona o codificador das chaves de junção: exato (padrão) ou normalizado (--normalizar-chaves)."""
+    global _codificador_atual
+    _codificador_atual = CODIFICADOR_NORMALIZADO if ativa else CODIFICADOR_PADRAO
+    logger.info("Chaves de junção %s.", "normalizadas (maiúsculas, acentos e espaços ignorados)" if ativa else "exatas")
+
+
+def obter_codificador() -> CodificadorChaves:
+    """Retorna o codificador de chaves em vigor."""
+    return _codificador_atual
@@ -1,40 +1,57 @@
 # processamento/correcao_chaves.py (VERSÃO FINAL COM TRATAMENTO DE 'PULAR')
 import logging
 import pandas as pd
-from sqlalchemy import text
-from fuzzywuzzy import process
+from rapidfuzz import process, utils
+
+from processamento.repositorio_correcoes import REPOSITORIO_CORRECOES
+from processamento.sugestoes_correcao import gerar_sugestoes, salvar_sugestoes, selecionar_correcoes_automaticas
 
 logger = logging.getLogger(__name__)
 
-def salvar_correcao_no_sql(chave_quebrada: str, chave_correta: str):
-    from config.database import get_conexao
-    from config.config import CONFIG
-    engine = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
-    stmt = text("""
-        MERGE dbo.MapaCorrecoesChaves AS target
-        USING (SELECT :quebrada AS ChaveQuebrada, :correta AS ChaveCorreta) AS source
-        ON (target.ChaveQuebrada = source.ChaveQuebrada)
-        WHEN MATCHED THEN UPDATE SET ChaveCorreta = source.ChaveCorreta
-        WHEN NOT MATCHED THEN INSERT (ChaveQuebrada, ChaveCorreta) VALUES (source.ChaveQuebrada, source.ChaveCorreta);
-    """)
+# Correções aceitas vão para o diário local e seguem ao servidor a cada N (e ao fim da sessão).
+TAMANHO_LOTE_CORRECOES = 50
+
+def registrar_correcao(chave_quebrada: str, chave_correta: str) -> None:
+    """Aceita uma correção: grava no diário local e envia o lote quando ele enche."""
+    REPOSITORIO_CORRECOES.enfileirar(chave_quebrada, chave_correta)
+    logger.info(f"Correção para '{chave_quebrada}' registrada no diário local.")
+    if REPOSITORIO_CORRECOES.total_pendentes() >= TAMANHO_LOTE_CORRECOES:
+        enviar_correcoes_pendentes()
+
+def enviar_correcoes_pendentes() -> bool:
+    """Envia ao SQL Server as correções do diário. Em caso de falha elas continuam no diário e voltam no próximo envio."""
     try:
-        with engine.begin() as connection:
-            connection.execute(stmt, {"quebrada": chave_quebrada, "correta": chave_correta})
-        logger.info(f"Correção para '{chave_quebrada}' salva no SQL Server com sucesso.")
-    except Exception as e:
-        logger.exception("Falha ao salvar correção no SQL Server.")
-        raise e
-
-def _obter_sugestao_interativa(parte_chave_errada: str, opcoes_validas: list, nome_campo: str) -> str:
+        REPOSITORIO_CORRECOES.enviar_pendentes()
+        return True
+    except Exception:
+        logger.exception(
+            "Falha ao enviar as correções pendentes ao SQL Server. %d continuam no diário local e serão reenviadas.",
+            REPOSITORIO_CORRECOES.total_pendentes(),
+        )
+        return False
+
+def construir_indice_hierarquia(df_referencia: pd.DataFrame) -> dict:
+    """
+    Índice {PROJETO: {ACAO: {UNIDADE: None}}} das combinações válidas da
+    referência, montado uma vez por sessão. Os dicts preservam a ordem da
+    referência (opções exibidas) e respondem pertinência em O(1).
+    """
+    indice = {}
+    combinacoes = df_referencia[['PROJETO', 'ACAO', 'UNIDADE']].astype(object).dropna().drop_duplicates()
+    for projeto, acao, unidade in combinacoes.itertuples(index=False, name=None):
+        indice.setdefault(projeto, {}).setdefault(acao, {})[unidade] = None
+    return indice
+
+def _obter_sugestao_interativa(parte_chave_errada: str, opcoes_validas: dict, nome_campo: str) -> str:
     if not opcoes_validas:
         print(f"\n!!! Alerta: Nenhuma opção válida encontrada para '{nome_campo}' com os filtros atuais.")
         return parte_chave_errada # Retorna o original para indicar que não houve mudança
 
     print(f"\n--- Corrigindo '{nome_campo}': '{parte_chave_errada}' ---")
-    sugestoes = process.extract(parte_chave_errada, opcoes_validas, limit=5)
+    sugestoes = process.extract(parte_chave_errada, list(opcoes_validas), processor=utils.default_process, limit=5)
     print("Sugestões encontradas:")
-    for i, (sugestao, pontuacao) in enumerate(sugestoes):
-        print(f"  {i+1}) {sugestao} (similaridade: {pontuacao}%)")
+    for i, (sugestao, pontuacao, _) in enumerate(sugestoes):
+        print(f"  {i+1}) {sugestao} (similaridade: {pontuacao:.0f}%)")
     
     while True:
         entrada = input(f"Escolha o número, digite o valor manual ou 'p' para pular: ").strip()
@@ -56,65 +73,113 @@ def _obter_sugestao_interativa(parte_chave_errada: str, opcoes_validas: list, no
             else:
                 print("!!! Valor manual não encontrado nas opções. Tente novamente.")
 
+def corrigir_chaves_automaticamente(chaves_com_falha: set, df_referencia: pd.DataFrame, limiar: float) -> set:
+    """
+    Modo não interativo (--auto-corrigir): calcula as sugestões de todas as
+    chaves de uma vez, grava o ranking e salva as correções cuja melhor
+    sugestão atinge 'limiar' sem empate. Retorna as chaves que continuam sem correção.
+    """
+    logger.info("--- CORREÇÃO AUTOMÁTICA DE CHAVES (limiar de %.0f%%) ---", limiar)
+    df_sugestoes = gerar_sugestoes(chaves_com_falha, df_referencia)
+    salvar_sugestoes(df_sugestoes)
+    correcoes = selecionar_correcoes_automaticas(df_sugestoes, limiar)
+    for chave_errada, chave_correta in correcoes.items():
+        logger.info("Correção automática: '%s' -> '%s'", chave_errada, chave_correta)
+        REPOSITORIO_CORRECOES.enfileirar(chave_errada, chave_correta)
+    enviar_correcoes_pendentes()
+    logger.info("%d de %d chaves corrigidas automaticamente.", len(correcoes), len(chaves_com_falha))
+    return set(chaves_com_falha) - set(correcoes)
+
+def _escolher_sugestao_pre_calculada(chave_errada: str, sugestoes: pd.DataFrame):
+    """Mostra as sugestões de chave completa já calculadas. Retorna a chave escolhida, 'c' (campo a campo) ou 'p' (pular)."""
+    if sugestoes.empty:
+        return 'c'
+    print("Sugestões de chave completa:")
+    for i, (chave, pontuacao) in enumerate(zip(sugestoes['ChaveSugerida'], sugestoes['Pontuacao'])):
+        print(f"  {i+1}) {chave} (similaridade: {pontuacao:.0f}%)")
+    while True:
+        entrada = input("Escolha o número, 'c' para corrigir campo a campo ou 'p' para pular: ").strip().lower()
+        if entrada in ('c', 'p'):
+            return entrada
+        if entrada.isdigit() and 0 < int(entrada) <= len(sugestoes):
+            return sugestoes['ChaveSugerida'].iloc[int(entrada) - 1]
+        print("!!! Opção inválida.")
+
+def _corrigir_campo_a_campo(proj_errado: str, acao_errada: str, unidade_errada: str, indice: dict):
+    """Correção guiada PROJETO -> AÇÃO -> UNIDADE sobre o índice da hierarquia. Retorna os três valores ou None se algum campo foi pulado."""
+    # 1. Corrigir PROJETO
+    proj_correto = _obter_sugestao_interativa(proj_errado, indice, "PROJETO")
+    
+    # Se o usuário pulou e o projeto não existe, não há como continuar
+    if proj_correto not in indice:
+        logger.warning(f"Projeto '{proj_correto}' não é válido ou foi pulado. Não é possível continuar a correção para esta chave.")
+        return None
+
+    # 2. Corrigir AÇÃO
+    acoes_validas = indice[proj_correto]
+    acao_correta = _obter_sugestao_interativa(acao_errada, acoes_validas, "AÇÃO")
+    
+    if acao_correta not in acoes_validas:
+        logger.warning(f"Ação '{acao_correta}' não é válida ou foi pulada. Não é possível continuar a correção para esta chave.")
+        return None
+
+    # 3. Corrigir UNIDADE
+    unidades_validas = acoes_validas[acao_correta]
+    unidade_correta = _obter_sugestao_interativa(unidade_errada, unidades_validas, "UNIDADE")
+
+    if unidade_correta not in unidades_validas:
+        logger.warning(f"Unidade '{unidade_correta}' não é válida ou foi pulada. A correção para esta chave será descartada.")
+        return None
+    return proj_correto, acao_correta, unidade_correta
+
 def iniciar_correcao_interativa_chaves(chaves_com_falha: set, df_referencia: pd.DataFrame):
     logger.info("--- MODO DE CORREÇÃO INTERATIVA (COM SUGESTÕES CONTEXTUAIS) ---")
     
-    for i, chave_errada in enumerate(chaves_com_falha):
-        print(f"\n=======================================================")
-        print(f"[{i+1}/{len(chaves_com_falha)}] Corrigindo Chave Quebrada: {chave_errada}")
-        print(f"=======================================================")
+    # Sugestões de todas as chaves calculadas de uma vez, antes da primeira pergunta.
+    df_sugestoes = gerar_sugestoes(chaves_com_falha, df_referencia)
+    salvar_sugestoes(df_sugestoes)
+    sugestoes_por_chave = dict(tuple(df_sugestoes.groupby('ChaveQuebrada', sort=False)))
+    indice = construir_indice_hierarquia(df_referencia)
+    
+    try:
+        for i, chave_errada in enumerate(chaves_com_falha):
+            print(f"\n=======================================================")
+            print(f"[{i+1}/{len(chaves_com_falha)}] Corrigindo Chave Quebrada: {chave_errada}")
+            print(f"=======================================================")
         
-        try:
-            proj_errado, acao_errada, unidade_errada, ano_errado = chave_errada.split('|')
-        except ValueError:
-            logger.warning(f"Chave '{chave_errada}' está em um formato inválido e será pulada.")
-            continue
-
-        # --- LÓGICA DE CORREÇÃO COM TRATAMENTO PARA 'PULAR' ---
+            try:
+                proj_errado, acao_errada, unidade_errada, ano_errado = chave_errada.split('|')
+            except ValueError:
+                logger.warning(f"Chave '{chave_errada}' está em um formato inválido e será pulada.")
+                continue
 
-        # 1. Corrigir PROJETO
-        projetos_validos = df_referencia['PROJETO'].unique().tolist()
-        proj_correto = _obter_sugestao_interativa(proj_errado, projetos_validos, "PROJETO")
-        
-        # Se o usuário pulou e o projeto não existe, não há como continuar
-        if proj_correto not in projetos_validos:
-            logger.warning(f"Projeto '{proj_correto}' não é válido ou foi pulado. Não é possível continuar a correção para esta chave.")
-            continue # Pula para a próxima chave com falha
-
-        # 2. Corrigir AÇÃO
-        df_filtrado_por_projeto = df_referencia[df_referencia['PROJETO'] == proj_correto]
-        acoes_validas = df_filtrado_por_projeto['ACAO'].unique().tolist()
-        acao_correta = _obter_sugestao_interativa(acao_errada, acoes_validas, "AÇÃO")
-        
-        if acao_correta not in acoes_validas:
-            logger.warning(f"Ação '{acao_correta}' não é válida ou foi pulada. Não é possível continuar a correção para esta chave.")
-            continue
-
-        # 3. Corrigir UNIDADE
-        df_filtrado_por_acao = df_filtrado_por_projeto[df_filtrado_por_projeto['ACAO'] == acao_correta]
-        unidades_validas = df_filtrado_por_acao['UNIDADE'].unique().tolist()
-        unidade_correta = _obter_sugestao_interativa(unidade_errada, unidades_validas, "UNIDADE")
-
-        if unidade_correta not in unidades_validas:
-            logger.warning(f"Unidade '{unidade_correta}' não é válida ou foi pulada. A correção para esta chave será descartada.")
-            continue
+            escolha = _escolher_sugestao_pre_calculada(chave_errada, sugestoes_por_chave.get(chave_errada, pd.DataFrame()))
+            if escolha == 'p':
+                logger.warning(f"Chave '{chave_errada}' pulada.")
+                continue
+            if escolha == 'c':
+                campos = _corrigir_campo_a_campo(proj_errado, acao_errada, unidade_errada, indice)
+                if campos is None:
+                    continue # Pula para a próxima chave com falha
+                proj_correto, acao_correta, unidade_correta = campos
+            else:
+                proj_correto, acao_correta, unidade_correta, _ = escolha.split('|')
             
-        chave_correta_final = f"{proj_correto}|{acao_correta}|{unidade_correta}|{ano_errado}"
+            chave_correta_final = f"{proj_correto}|{acao_correta}|{unidade_correta}|{ano_errado}"
         
-        print(f"\nChave Original : {chave_errada}")
-        print(f"Chave Corrigida: {chave_correta_final}")
+            print(f"\nChave Original : {chave_errada}")
+            print(f"Chave Corrigida: {chave_correta_final}")
         
-        # Não salva se a chave não mudou
-        if chave_correta_final == chave_errada:
-            print("Nenhuma alteração feita. Correção não será salva.")
-            continue
+            # Não salva se a chave não mudou
+            if chave_correta_final == chave_errada:
+                print("Nenhuma alteração feita. Correção não será salva.")
+                continue
             
-        confirmacao = input("Salvar esta correção no banco de dados? (s/n): ").strip().lower()
-        if confirmacao == 's':
-            try:
-                salvar_correcao_no_sql(chave_errada, chave_correta_final)
-            except Exception:
-                logger.error("A execução foi interrompida devido a uma falha ao salvar no banco de dados.")
-                return # Interrompe a execução para evitar mais erros
-        else:
-            logger.warning(f"Correção para '{chave_errada}' foi descartada pelo usuário.")
+            confirmacao = input("Salvar esta correção no banco de dados? (s/n): ").strip().lower()
+            if confirmacao == 's':
+                registrar_correcao(chave_errada, chave_correta_final)
+            else:
+                logger.warning(f"Correção para '{chave_errada}' foi descartada pelo usuário.")
+    finally:
+        # Também ao interromper a sessão (Ctrl+C): o que foi aceito segue para o servidor.
+        enviar_correcoes_pendentes()
@@ -0,0 +1,108 @@
+# processamento/deduplicacao.py
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Quantas chaves com mais linhas entram no resumo de duplicidade do log.
+QUANTIDADE_MAIORES_DUPLICIDADES = 5
+
+
+@dataclass(frozen=True)
+class EstatisticasDuplicidade:
+    """Resumo da deduplicação no grão: quantas linhas entraram, quantas saíram e onde estavam as duplicidades."""
+    linhas_entrada: int
+    linhas_chave_nula: int
+    grupos: int
+    grupos_duplicados: int
+    multiplicidade_maxima: int
+    maiores_duplicidades: pd.DataFrame
+
+    @property
+    def linhas_agregadas(self) -> int:
+        """Linhas que deixaram de existir por terem sido somadas a outra linha da mesma chave."""
+        return self.linhas_entrada - self.linhas_chave_nula - self.grupos
+
+
+def deduplicar_no_grao(df: pd.DataFrame, chave: list[str], colunas: list[str]) -> tuple[pd.DataFrame, EstatisticasDuplicidade]:
+    """
+    Reduz 'df' a uma linha por 'chave', olhando apenas 'colunas' (as gravadas).
+    Linhas com algum campo da chave nulo são descartadas antes do agrupamento.
+    Cada campo da chave é fatorado em códigos inteiros (ordenados, como no
+    groupby) e os códigos são combinados em um único inteiro por linha; os
+    grupos saem de uma fatoração por hash desse inteiro. As colunas numéricas
+    são somadas com np.bincount e as demais ficam com o valor da primeira linha
+    do grupo. O resultado vem ordenado pela chave, como no groupby.
+    """
+    colunas = [col for col in colunas if col in df.columns]
+    codigos, validas = _combinar_codigos_da_chave(df, chave)
+    linhas = np.flatnonzero(validas)
+    grupo, valores_chave = pd.factorize(codigos[linhas])
+
+    # Primeira linha de cada grupo: a fatoração numera os grupos na ordem em que aparecem.
+    maximo_acumulado = np.maximum.accumulate(grupo) if len(grupo) else grupo
+    primeiras = np.flatnonzero(np.diff(maximo_acumulado, prepend=-1) > 0)
+    ordem = np.argsort(valores_chave, kind="stable")
+
+    df_final = df.iloc[linhas[primeiras[ordem]], [df.columns.get_loc(col) for col in colunas]].reset_index(drop=True)
+    for col in colunas:
+        if col not in chave and pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            pesos = df[col].to_numpy(dtype="float64", na_value=0.0)[linhas]
+            somas = np.bincount(grupo, weights=pesos, minlength=len(valores_chave))[ordem]
+            df_final[col] = somas.astype(df[col].dtype) if pd.api.types.is_integer_dtype(df[col]) else somas
+
+    multiplicidade = np.bincount(grupo, minlength=len(valores_chave))[ordem]
+    duplicados = np.flatnonzero(multiplicidade > 1)
+    maiores = duplicados[np.argsort(-multiplicidade[duplicados], kind="stable")[:QUANTIDADE_MAIORES_DUPLICIDADES]]
+    estatisticas = EstatisticasDuplicidade(
+        linhas_entrada=len(df),
+        linhas_chave_nula=len(df) - len(linhas),
+        grupos=len(valores_chave),
+        grupos_duplicados=len(duplicados),
+        multiplicidade_maxima=int(multiplicidade.max()) if len(multiplicidade) else 0,
+        maiores_duplicidades=df_final.iloc[maiores][chave].assign(LINHAS=multiplicidade[maiores]).reset_index(drop=True),
+    )
+    return df_final, estatisticas
+
+
+def registrar_estatisticas_duplicidade(estatisticas: EstatisticasDuplicidade, chave: list[str]) -> None:
+    """Registra no log o resumo da deduplicação e as chaves com mais linhas repetidas."""
+    if estatisticas.linhas_chave_nula:
+        logger.warning(f"{estatisticas.linhas_chave_nula} linhas com campo nulo na chave {chave} foram descartadas.")
+    if not estatisticas.grupos_duplicados:
+        logger.info(f"Nenhuma duplicidade na chave {chave}: {estatisticas.grupos} registros.")
+        return
+    logger.warning(
+        "Foram agregadas %d linhas duplicadas: %d de %d chaves tinham mais de uma linha (até %d linhas por chave).",
+        estatisticas.linhas_agregadas, estatisticas.grupos_duplicados, estatisticas.grupos, estatisticas.multiplicidade_maxima,
+    )
+    for registro in estatisticas.maiores_duplicidades.to_dict("records"):
+        linhas = registro.pop("LINHAS")
+        logger.info(f"  {linhas} linhas na chave {registro}")
+
+
+def _combinar_codigos_da_chave(df: pd.DataFrame, chave: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    # Um inteiro por linha que preserva a ordem lexicográfica da chave, e a máscara das linhas sem campo nulo.
+    combinado = np.zeros(len(df), dtype=np.int64)
+    validas = np.ones(len(df), dtype=bool)
+    cardinalidade_acumulada = 1
+    for col in chave:
+        codigos, valores = _fatorar(df[col])
+        validas &= codigos >= 0
+        if cardinalidade_acumulada * max(len(valores), 1) >= np.iinfo(np.int64).max:
+            # O produto das cardinalidades estouraria o int64: renumera o que já foi combinado.
+            combinado, unicos = pd.factorize(combinado, sort=True)
+            cardinalidade_acumulada = len(unicos)
+        combinado = combinado * max(len(valores), 1) + codigos
+        cardinalidade_acumulada *= max(len(valores), 1)
+    return combinado, validas
+
+
+def _fatorar(serie: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    # Categóricas já são códigos na ordem das categorias, a mesma que o groupby usa: não há o que fatorar.
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(dtype=np.int64), serie.cat.categories
+    return pd.factorize(serie, sort=True)
@@ -1,10 +1,16 @@
 # processamento/enriquecimento.py (VERSÃO COM CORREÇÃO DO KEYERROR)
 import logging
-import pandas as pd
 import argparse
+from typing import Optional
+
+import numpy as np
+import pandas as pd
 
 # Importe as funções necessárias, pode ser necessário ajustar o caminho
-from processamento.correcao_chaves import iniciar_correcao_interativa_chaves
+from processamento.chaves import obter_codificador
+from processamento.correcao_chaves import corrigir_chaves_automaticamente, iniciar_correcao_interativa_chaves
+from processamento.esquema import atribuir_valores
+from processamento.indice_cc import IndiceCC
 from processamento.validacao import carregar_mapa_correcoes, aplicar_mapa_correcoes
 
 logger = logging.getLogger(__name__)
@@ -15,33 +21,23 @@ CHAVES_MERGE = ["PROJETO", "ACAO", "UNIDADE", "ANO"]
 def enriquecer_orcado_com_cc(
     df_orcado_pronto: pd.DataFrame, 
     df_cc_pronto: pd.DataFrame,
-    args: argparse.Namespace
+    args: argparse.Namespace,
+    indice_cc: Optional[IndiceCC] = None,
 ) -> pd.DataFrame:
     """
     Enriquece o DataFrame do Orçado com o CODCCUSTO e aciona o modo de
-    correção interativa se houver falhas na junção.
+    correção interativa se houver falhas na junção. 'indice_cc' é a referência
+    já deduplicada (ver indice_cc.obter_indice_cc); sem ele, o índice é montado
+    a partir de 'df_cc_pronto'.
     """
     logger.info("Iniciando a junção (merge) dos dados preparados...")
-
-    df_cc_unico = df_cc_pronto.drop_duplicates(subset=CHAVES_MERGE, keep="first")
+    indice_cc = indice_cc or IndiceCC.da_referencia(df_cc_pronto)
     
-    # Adiciona um "indicador" para saber de onde veio a linha após o merge
-    df_orcado_pronto['_merge_indicator'] = 'left_only'
-    df_cc_unico['_merge_indicator'] = 'both'
-    
-    logger.info("Executando a junção com a chave: %s", CHAVES_MERGE)
-    # Usamos um merge com um indicador para rastrear as falhas
-    df_enriquecido = pd.merge(
-        df_orcado_pronto,
-        df_cc_unico.drop(columns=['CHAVE_CONCAT', 'CHAVE_CONCAT_original'], errors='ignore'), # Remove chaves de CC para não duplicar
-        on=CHAVES_MERGE,
-        how="left",
-        suffixes=('', '_ref') # Adiciona sufixo para colunas de CC
-    )
+    logger.info("Localizando o CODCCUSTO pela chave codificada de: %s", CHAVES_MERGE)
+    df_enriquecido, acertos = _juntar_por_chave_codificada(df_orcado_pronto, indice_cc)
 
     # Identifica as linhas onde a junção falhou
-    linhas_com_falha_mask = df_enriquecido['_merge_indicator_ref'].isnull()
-    num_falhas = linhas_com_falha_mask.sum()
+    num_falhas = int((~acertos).sum())
 
     if num_falhas > 0:
         logger.warning(
@@ -49,40 +45,71 @@ def enriquecer_orcado_com_cc(
             num_falhas,
         )
         
-        # --- CORREÇÃO DO KEYERROR ---
-        # Acessamos a 'CHAVE_CONCAT' do DataFrame original (df_orcado_pronto)
-        # usando a máscara de falha identificada no merge.
-        chaves_com_falha = df_enriquecido.loc[linhas_com_falha_mask, "CHAVE_CONCAT"].unique()
+        # O texto da chave só é montado para as chaves (originais) que falharam.
+        codigos_com_falha = df_enriquecido.loc[~acertos, "CHAVE_COD"].unique()
+        chaves_com_falha = obter_codificador().decodificar(codigos_com_falha)
         
         print("\n--- Chaves de Junção que Falharam ---")
         for chave in chaves_com_falha:
             print(f"  - {chave}")
         print("-" * 35)
 
-        if args.modo_interativo:
+        chaves_pendentes = set(chaves_com_falha)
+        auto_corrigir = getattr(args, 'auto_corrigir', False)
+        if auto_corrigir:
+            chaves_pendentes = corrigir_chaves_automaticamente(chaves_pendentes, indice_cc.referencia, args.limiar)
+
+        if args.modo_interativo and chaves_pendentes:
             print("Ativando o modo de correção interativa para as chaves acima...")
             
-            iniciar_correcao_interativa_chaves(set(chaves_com_falha), df_cc_unico)
+            iniciar_correcao_interativa_chaves(chaves_pendentes, indice_cc.referencia)
             
-            print("\nReaplicando correções após o modo interativo...")
+        if auto_corrigir or args.modo_interativo:
+            print("\nReaplicando correções após a correção de chaves...")
             mapa_atualizado = carregar_mapa_correcoes()
-            df_recorrigido = aplicar_mapa_correcoes(df_orcado_pronto.drop(columns=['_merge_indicator']), mapa_atualizado)
+            df_recorrigido = aplicar_mapa_correcoes(df_orcado_pronto, mapa_atualizado)
             
-            # Tenta o merge novamente
-            df_enriquecido = pd.merge(
-                df_recorrigido,
-                df_cc_unico.drop(columns=['CHAVE_CONCAT', 'CHAVE_CONCAT_original', '_merge_indicator'], errors='ignore'),
-                on=CHAVES_MERGE,
-                how="left",
-            )
-            novas_falhas = df_enriquecido["CODCCUSTO"].isnull().sum()
-            logger.info(f"Após a correção, restam {novas_falhas} linhas sem correspondência.")
+            # Tenta a junção novamente
+            df_enriquecido, acertos = _juntar_por_chave_codificada(df_recorrigido, indice_cc)
+            logger.info(f"Após a correção, restam {int((~acertos).sum())} linhas sem correspondência.")
             
     else:
         logger.info("Sucesso! Todas as linhas do Orçado encontraram um CODCCUSTO.")
-
-    # Limpa as colunas de indicador antes de retornar
-    df_enriquecido.drop(columns=[col for col in df_enriquecido.columns if '_indicator' in col or '_ref' in col], inplace=True, errors='ignore')
     
     return df_enriquecido
 
+
+def verificar_resultado_enriquecido(df_processado: pd.DataFrame, nome_fluxo: str, manter_sem_cc: bool = False) -> pd.DataFrame:
+    """
+    Verificação final de um fluxo de enriquecimento: sem a coluna CODCCUSTO ou
+    sem nenhuma linha com CC, o fluxo não tem o que gravar e retorna vazio. Com
+    'manter_sem_cc' (Orçado), um resultado em que nenhuma linha achou CC é
+    mantido assim mesmo, para que todas as linhas cheguem à quarentena.
+    """
+    if df_processado.empty or 'CODCCUSTO' not in df_processado.columns:
+        logger.error(f"Coluna 'CODCCUSTO' foi perdida ou está vazia para o fluxo '{nome_fluxo}'.")
+        return pd.DataFrame()
+    if df_processado['CODCCUSTO'].isnull().all():
+        logger.error(f"Nenhuma linha do fluxo '{nome_fluxo}' encontrou CODCCUSTO.")
+        return df_processado if manter_sem_cc else pd.DataFrame()
+    return df_processado
+
+
+def _juntar_por_chave_codificada(df_orcado: pd.DataFrame, indice_cc: IndiceCC) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Busca o CODCCUSTO de cada linha do Orçado no índice de CC por um único
+    código inteiro, retornando o Orçado com a coluna CODCCUSTO e a máscara das
+    linhas encontradas. No Orçado o código é recalculado a partir das colunas
+    já corrigidas, pois a CHAVE_COD preserva a chave original da linha. Com
+    chaves normalizadas, as linhas encontradas passam a usar a grafia de
+    PROJETO/ACAO/UNIDADE da referência, como faria uma correção cosmética do mapa.
+    """
+    codificador = obter_codificador()
+    posicoes = indice_cc.localizar(codificador.codificar(df_orcado[CHAVES_MERGE]))
+    acertos = posicoes >= 0
+    df_enriquecido = df_orcado.copy()
+    df_enriquecido['CODCCUSTO'] = indice_cc.valores('CODCCUSTO', posicoes)
+    if codificador.normalizar and acertos.any():
+        for col in [col for col in CHAVES_MERGE if col != 'ANO']:
+            atribuir_valores(df_enriquecido, acertos, col, np.asarray(indice_cc.valores(col, posicoes[acertos]), dtype=object))
+    return df_enriquecido, acertos
@@ -0,0 +1,116 @@
+# processamento/esquema.py
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Colunas de texto com poucas centenas/milhares de valores distintos em milhões de
+# linhas: armazenadas como 'category' (códigos inteiros + um dicionário de valores).
+COLUNAS_CATEGORICAS = [
+    'PROJETO', 'ACAO', 'UNIDADE', 'UNIDADE_FINAL', 'NATUREZA_FINAL', 'tipo_projeto', 'CODCCUSTO',
+    'Descricao_PPA', 'Codigo_Natureza_Orcamentaria', 'Descricao_Natureza_Orcamentaria',
+    # Nomes de origem do Orçado (antes de validacao._renomear_colunas_orcado_fonte)
+    '[Iniciativa].[Iniciativas].[Iniciativa].[MEMBER_CAPTION]',
+    '[Ação].[Ação].[Nome de Ação].[MEMBER_CAPTION]',
+    '[Unidade Organizacional de Ação].[Unidade Organizacional de Ação].[Nome de Unidade Organizacional de Ação].[MEMBER_CAPTION]',
+    '[PPA].[PPA com Fotografia].[Descrição de PPA com Fotografia].[MEMBER_CAPTION]',
+    '[Natureza Orçamentária].[Código Estruturado 4 nível].[Código Estruturado 4 nível].[MEMBER_CAPTION]',
+    '[Natureza Orçamentária].[Descrição de Natureza 4 nível].[Descrição de Natureza 4 nível].[MEMBER_CAPTION]',
+]
+
+# Colunas inteiras de chave, com a menor largura que comporta seus valores.
+# Só são convertidas quando não há nulos e todos os valores são inteiros.
+COLUNAS_INTEIRAS = {'ANO': 'int16', 'MES': 'int8'}
+
+# Valores monetários permanecem em float64: float32 perderia centavos nos totais.
+COLUNAS_DECIMAIS = ['Valor_Ajustado', 'Valor_Planejado', 'Valor_Executado', 'COMPROMETIDO', '[Measures].[ValorAjustado]']
+
+
+def aplicar_esquema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte as colunas declaradas neste módulo para os tipos do esquema, sem
+    alterar os valores (a limpeza de texto fica em 'normalizar_texto').
+    Colunas ausentes são ignoradas e colunas já convertidas não são refeitas,
+    então a função pode ser chamada em qualquer fronteira do pipeline.
+    """
+    if df is None or df.empty:
+        return df
+
+    memoria_antes = df.memory_usage(deep=True).sum()
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+
+    for coluna, tipo in COLUNAS_INTEIRAS.items():
+        if coluna in df.columns and df[coluna].dtype != tipo:
+            valores = pd.to_numeric(df[coluna], errors='coerce')
+            info = np.iinfo(tipo)
+            if valores.notna().all() and (valores % 1 == 0).all() and valores.between(info.min, info.max).all():
+                df[coluna] = valores.astype(tipo)
+
+    for coluna in COLUNAS_DECIMAIS:
+        if coluna in df.columns and df[coluna].dtype != 'float64':
+            df[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype('float64')
+
+    memoria_depois = df.memory_usage(deep=True).sum()
+    logger.debug("Esquema aplicado: %.1f MB -> %.1f MB.", memoria_antes / 1e6, memoria_depois / 1e6)
+    return df
+
+
+def normalizar_texto(serie: pd.Series, valor_ausente: str = 'N/A') -> pd.Series:
+    """
+    Remove espaços das bordas e preenche ausentes com 'valor_ausente',
+    preservando o tipo 'category' quando a coluna já é categórica.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.astype(str).str.strip().fillna(valor_ausente)
+
+    serie = transformar_texto(serie, lambda textos: textos.str.strip())
+    if serie.isna().any():
+        if valor_ausente not in serie.cat.categories:
+            serie = serie.cat.add_categories([valor_ausente])
+        serie = serie.fillna(valor_ausente)
+    return serie
+
+
+def transformar_texto(serie: pd.Series, funcao) -> pd.Series:
+    """
+    Aplica 'funcao' (Series de texto -> Series de texto) à coluna. Em colunas
+    categóricas a função roda só sobre o dicionário de valores, não linha a
+    linha; valores que ficam iguais passam a compartilhar a mesma categoria.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return funcao(serie.astype(str))
+
+    categorias = pd.Series(funcao(pd.Series(serie.cat.categories.astype(str))).to_numpy(), dtype=object)
+    codigos = serie.cat.codes.to_numpy()
+    codigos_categorias, categorias_novas = pd.factorize(categorias)
+    codigos_novos = np.where(codigos < 0, -1, codigos_categorias[codigos] if len(categorias) else -1)
+    return pd.Series(
+        pd.Categorical.from_codes(codigos_novos, categories=categorias_novas), index=serie.index, name=serie.name
+    )
+
+
+def atribuir_valores(df: pd.DataFrame, linhas: np.ndarray, coluna: str, valores) -> None:
+    """
+    Atribui 'valores' à 'coluna' nas 'linhas' (máscara booleana) de 'df'. Em
+    colunas categóricas, os valores novos entram antes no dicionário; em
+    colunas numéricas, são convertidos para o tipo da coluna.
+    """
+    if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+        serie = df[coluna]
+        novas_categorias = pd.Index(valores).unique().difference(serie.cat.categories)
+        if len(novas_categorias):
+            serie = serie.cat.add_categories(novas_categorias)
+        # Atribui pelos códigos: evita o setitem linha a linha do pandas em categóricas.
+        codigos = serie.cat.codes.to_numpy().copy()
+        codigos[linhas] = serie.cat.categories.get_indexer(pd.Index(valores, dtype=object))
+        df[coluna] = pd.Series(
+            pd.Categorical.from_codes(codigos, dtype=serie.dtype), index=serie.index, name=serie.name
+        )
+        return
+    if pd.api.types.is_numeric_dtype(df[coluna].dtype):
+        valores = np.asarray(valores).astype(df[coluna].dtype)
+    df.loc[linhas, coluna] = valores
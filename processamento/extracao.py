@@ -1,51 +1,353 @@
 # processamento/extracao.py (VERSÃO COMPLETA E CORRIGIDA)
+import hashlib
 import logging
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Callable, Iterator
 
+import numpy as np
 import pandas as pd
+from sqlalchemy import bindparam, inspect, text
 from sqlalchemy.engine import Engine
 
-from config.config import CONFIG
+from config.config import CONFIG, DbConfig, FonteCache
 from config.database import get_conexao
+from processamento.cache_consultas import obter_com_cache
+from processamento.esquema import aplicar_esquema
+from processamento.hierarquia_cc import HierarquiaCC
 from utils.utils import carregar_script_sql
 
+try:
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
 logger = logging.getLogger(__name__)
 
 # Constantes para os nomes das tabelas no cache
 TABELA_ORCADO_CACHE = "orcado_nacional_raw"
 TABELA_CC_CACHE = "cc_estrutura_raw"
+COMPRESSAO_PARQUET = "zstd"
+
+# Acima deste número de CCs o filtro de correlação vai por tabela temporária,
+# respeitando o limite de 2100 parâmetros por comando do SQL Server.
+LIMITE_CC_FILTRO_INLINE = 500
+TABELA_TEMP_FILTRO_CC = "#filtro_cc_correlacao"
+
+
+class BackendCacheSQLite:
+    """Backend do cache de dados brutos em um arquivo SQLite (to_sql/read_sql)."""
+    nome = "sqlite"
+
+    def __init__(self, caminho: Path | None = None):
+        self.caminho = Path(caminho or CONFIG.paths.cache_db)
+        self._engine: Engine | None = None
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            self._engine = get_conexao(DbConfig(tipo="sqlite", caminho=self.caminho))
+        return self._engine
+
+    def existe(self, tabela: str) -> bool:
+        return self.caminho.exists() and inspect(self.engine).has_table(tabela)
+
+    def salvar(self, tabela: str, df: pd.DataFrame) -> None:
+        # Grava numa tabela auxiliar e só então troca pela anterior: uma falha na gravação preserva o cache.
+        tabela_temp = f"{tabela}__gravando"
+        df.to_sql(tabela_temp, self.engine, if_exists="replace", index=False)
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{tabela}"')
+            connection.exec_driver_sql(f'ALTER TABLE "{tabela_temp}" RENAME TO "{tabela}"')
+
+    def carregar(self, tabela: str, colunas: list[str] | None = None) -> pd.DataFrame:
+        return pd.read_sql_table(tabela, self.engine, columns=colunas)
+
+    def assinatura(self, tabela: str) -> str | None:
+        # O arquivo é compartilhado pelas tabelas: qualquer gravação muda a assinatura de todas.
+        if not self.existe(tabela):
+            return None
+        estado = self.caminho.stat()
+        return f"{self.nome}:{estado.st_size}:{estado.st_mtime_ns}"
+
+    def carregar_em_lotes(self, tabela: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+        yield from pd.read_sql_table(tabela, self.engine, chunksize=tamanho_lote)
+
+    def remover(self, tabela: str) -> None:
+        if self.caminho.exists():
+            with self.engine.begin() as connection:
+                connection.exec_driver_sql(f'DROP TABLE IF EXISTS "{tabela}"')
+
+    def limpar(self) -> None:
+        if self._engine is not None:
+            self._engine.dispose()
+        self.caminho.unlink(missing_ok=True)
+
+
+class BackendCacheParquet:
+    """
+    Backend do cache de dados brutos em arquivos Parquet (um por tabela),
+    com compressão, preservação de dtypes, projeção de colunas e escrita atômica.
+    """
+    nome = "parquet"
+
+    def __init__(self, diretorio: Path | None = None):
+        if not PYARROW_DISPONIVEL:
+            raise ImportError("O backend 'parquet' requer o pacote 'pyarrow'.")
+        self.diretorio = Path(diretorio or CONFIG.paths.cache_parquet_dir)
+
+    def _caminho(self, tabela: str) -> Path:
+        return self.diretorio / f"{tabela}.parquet"
+
+    def existe(self, tabela: str) -> bool:
+        return self._caminho(tabela).exists()
+
+    def salvar(self, tabela: str, df: pd.DataFrame) -> None:
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        caminho = self._caminho(tabela)
+        caminho_temp = caminho.with_suffix(".parquet.tmp")
+        try:
+            df.to_parquet(caminho_temp, engine="pyarrow", compression=COMPRESSAO_PARQUET, index=False)
+        except Exception:
+            caminho_temp.unlink(missing_ok=True)
+            raise
+        os.replace(caminho_temp, caminho)
+
+    def carregar(self, tabela: str, colunas: list[str] | None = None) -> pd.DataFrame:
+        return pd.read_parquet(self._caminho(tabela), engine="pyarrow", columns=colunas)
 
+    def assinatura(self, tabela: str) -> str | None:
+        if not self.existe(tabela):
+            return None
+        estado = self._caminho(tabela).stat()
+        return f"{self.nome}:{estado.st_size}:{estado.st_mtime_ns}"
+
+    def carregar_em_lotes(self, tabela: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+        arquivo = pq.ParquetFile(self._caminho(tabela))
+        for lote in arquivo.iter_batches(batch_size=tamanho_lote):
+            yield lote.to_pandas()
+
+    def remover(self, tabela: str) -> None:
+        self._caminho(tabela).unlink(missing_ok=True)
+
+    def limpar(self) -> None:
+        for arquivo in self.diretorio.glob("*.parquet*"):
+            arquivo.unlink(missing_ok=True)
 
-def obter_dados_brutos() -> tuple[pd.DataFrame, pd.DataFrame]:
+
+BackendCache = BackendCacheSQLite | BackendCacheParquet
+
+
+def obter_backend_cache(nome: str | None = None) -> BackendCache:
+    """
+    Retorna o backend do cache de dados brutos configurado em CACHE_BACKEND
+    ('parquet' ou 'sqlite'). Sem o pyarrow instalado, recai para o SQLite.
+    """
+    nome = (nome or CONFIG.cache_backend).lower()
+    if nome == "parquet":
+        if PYARROW_DISPONIVEL:
+            return BackendCacheParquet()
+        logger.warning("Backend 'parquet' indisponível (pyarrow não instalado). Usando SQLite.")
+        return BackendCacheSQLite()
+    if nome == "sqlite":
+        return BackendCacheSQLite()
+    raise ValueError(f"Backend de cache desconhecido: '{nome}'.")
+
+
+def obter_dados_brutos(atualizar_incremental: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Obtém os DataFrames BRUTOS do Orçado e da Estrutura de CC, otimizando
     a criação de conexões de cache.
+
+    Com 'atualizar_incremental', cada fonte do cache é atualizada a partir do
+    seu watermark (ver CONFIG.fontes_cache), buscando apenas linhas novas ou alteradas.
     """
-    caminho_cache: Path = CONFIG.paths.cache_db
-
-    if not caminho_cache.exists():
-        logger.warning("Arquivo de cache '%s' não encontrado. Executando queries ao vivo...", caminho_cache.name)
-        df_orcado = _buscar_dados_financa_sql_raw()
-        df_cc = _buscar_dados_hubdados_sql_raw()
-        logger.info("Salvando dados brutos no cache local...")
-        engine_cache = get_conexao(CONFIG.conexoes["CacheDB"])
-        _salvar_dados_no_cache(df_orcado, df_cc, engine_cache)
-    else:
-        logger.info("Carregando dados brutos do cache local '%s'...", caminho_cache.name)
-        try:
-            engine_cache = get_conexao(CONFIG.conexoes["CacheDB"])
-            df_orcado = _carregar_dados_do_cache(TABELA_ORCADO_CACHE, engine_cache)
-            df_cc = _carregar_dados_do_cache(TABELA_CC_CACHE, engine_cache)
-            logger.info("Dados brutos carregados do cache com sucesso.")
-        except Exception as e:
-            logger.error("Erro ao ler tabelas do cache: %s. O cache pode estar corrompido.", e)
-            logger.warning("Excluindo cache e tentando buscar dados ao vivo.")
-            caminho_cache.unlink()
-            return obter_dados_brutos()
+    df_orcado = obter_dado_bruto(TABELA_ORCADO_CACHE, atualizar_incremental)
+    df_cc = obter_dado_bruto(TABELA_CC_CACHE, atualizar_incremental)
     return df_orcado, df_cc
 
 
+def obter_dado_bruto(tabela: str, atualizar_incremental: bool = False) -> pd.DataFrame:
+    """
+    Obtém uma única tabela bruta do cache local ou, na sua ausência, da fonte
+    ao vivo (gravando-a no cache). Permite buscar Orçado e CC em paralelo.
+    """
+    backend = obter_backend_cache()
+    if not backend.existe(tabela) and backend.nome == "parquet":
+        _migrar_cache_sqlite_para(tabela, backend)
+
+    if not backend.existe(tabela):
+        logger.warning("Tabela '%s' não encontrada no cache local ('%s'). Executando query ao vivo...", tabela, backend.nome)
+        return _buscar_ao_vivo_e_gravar(tabela, backend)
+
+    logger.info("Carregando '%s' do cache local ('%s')...", tabela, backend.nome)
+    try:
+        df = _carregar_dados_do_cache(tabela, backend)
+    except Exception as e:
+        logger.error("Erro ao ler '%s' do cache: %s. O cache pode estar corrompido.", tabela, e)
+        logger.warning("Excluindo a tabela do cache e tentando buscar os dados ao vivo.")
+        backend.remover(tabela)
+        # Direto da fonte: o cache SQLite legado não é reconvertido no lugar do que foi descartado.
+        return _buscar_ao_vivo_e_gravar(tabela, backend)
+    if atualizar_incremental:
+        df = _atualizar_cache_incremental(CONFIG.fontes_cache[tabela], df, backend)
+    return aplicar_esquema(df)
+
+
+def assinatura_dado_bruto(tabela: str) -> str | None:
+    """
+    Identifica a versão de uma tabela bruta no cache local (tamanho e data do
+    arquivo, mais o hash da query da fonte). Muda sempre que o cache é regravado
+    (busca ao vivo ou --atualizar-cache); None se a tabela não estiver no cache.
+    """
+    assinatura = obter_backend_cache().assinatura(tabela)
+    if assinatura is None:
+        return None
+    query = carregar_script_sql(CONFIG.fontes_cache[tabela].query)
+    return f"{assinatura}:{hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]}"
+
+
+def iterar_dado_bruto_em_lotes(tabela: str, tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    """
+    Itera uma tabela bruta em lotes de 'tamanho_lote' linhas, sem materializá-la
+    por completo: lê do cache local quando existir, senão direto da fonte.
+    """
+    backend = obter_backend_cache()
+    if backend.existe(tabela):
+        logger.info("Lendo '%s' do cache local ('%s') em lotes de %d linhas...", tabela, backend.nome, tamanho_lote)
+        yield from map(aplicar_esquema, backend.carregar_em_lotes(tabela, tamanho_lote))
+        return
+    fonte = CONFIG.fontes_cache[tabela]
+    logger.info("Lendo '%s' da fonte em lotes de %d linhas (sem gravar no cache)...", tabela, tamanho_lote)
+    query = carregar_script_sql(fonte.query)
+    yield from map(aplicar_esquema, pd.read_sql(query, get_conexao(CONFIG.conexoes[fonte.conexao]), chunksize=tamanho_lote))
+
+
+class ExtracaoUnica:
+    """
+    Executa extrações em um pool de threads com coalescência (single-flight):
+    pedidos com a mesma chave compartilham a mesma execução, de modo que cada
+    dataset é buscado uma única vez por execução, mesmo com chamadas concorrentes.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extracao")
+        self._futuros: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submeter(self, chave: str, funcao: Callable[..., Any], *args, **kwargs) -> Future:
+        """Agenda 'funcao' para a chave, ou devolve a execução já existente para ela."""
+        with self._lock:
+            if chave not in self._futuros:
+                self._futuros[chave] = self._executor.submit(self._cronometrar, chave, funcao, *args, **kwargs)
+            return self._futuros[chave]
+
+    def obter(self, chave: str, funcao: Callable[..., Any], *args, **kwargs) -> Any:
+        """Agenda (ou reaproveita) a extração e aguarda o seu resultado."""
+        return self.submeter(chave, funcao, *args, **kwargs).result()
+
+    @staticmethod
+    def _cronometrar(chave: str, funcao: Callable[..., Any], *args, **kwargs) -> Any:
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        logger.info("Extração '%s' concluída em %.1f s.", chave, time.perf_counter() - inicio)
+        return resultado
+
+    def encerrar(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "ExtracaoUnica":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.encerrar()
+
+
+def _buscar_ao_vivo_e_gravar(tabela: str, backend: BackendCache) -> pd.DataFrame:
+    df = aplicar_esquema(_BUSCAS_AO_VIVO[tabela]())
+    backend.salvar(tabela, df)
+    logger.info("Tabela '%s' salva no cache local (backend '%s').", tabela, backend.nome)
+    return df
+
+
+def _migrar_cache_sqlite_para(tabela: str, backend: BackendCache) -> None:
+    """
+    Converte uma tabela do cache SQLite legado para o backend informado, evitando
+    uma busca ao vivo. A tabela legada é excluída após a conversão: do contrário,
+    remover o arquivo novo (cache corrompido ou atualização forçada) traria de
+    volta os dados antigos em vez de consultar a fonte.
+    """
+    legado = BackendCacheSQLite()
+    if not legado.existe(tabela):
+        return
+    logger.info("Convertendo '%s' do cache SQLite existente para o backend '%s'...", tabela, backend.nome)
+    try:
+        backend.salvar(tabela, legado.carregar(tabela))
+    except Exception as e:
+        logger.warning("Não foi possível converter '%s' do cache SQLite: %s", tabela, e)
+        return
+    legado.remover(tabela)
+    logger.info("Tabela '%s' excluída do cache SQLite legado após a conversão.", tabela)
+
+
+def _atualizar_cache_incremental(fonte: FonteCache, df_cache: pd.DataFrame, backend: BackendCache) -> pd.DataFrame:
+    """
+    Atualiza uma tabela do cache a partir da fonte. Sem watermark configurado
+    (ou com o cache vazio) a fonte é recarregada por completo; caso contrário
+    apenas as linhas com watermark >= ao maior valor em cache são buscadas.
+    Em caso de falha na fonte, mantém o cache atual.
+    """
+    coluna = fonte.coluna_watermark
+    try:
+        query_base = carregar_script_sql(fonte.query).strip().rstrip(';')
+        engine = get_conexao(CONFIG.conexoes[fonte.conexao])
+        watermark = None
+        if coluna and coluna in df_cache.columns and df_cache[coluna].notna().any():
+            watermark = df_cache[coluna].max()
+
+        if watermark is None:
+            logger.info("Fonte '%s' sem watermark utilizável. Recarregando por completo...", fonte.tabela_cache)
+            df_atualizado = pd.read_sql(query_base, engine)
+        else:
+            watermark = watermark.item() if hasattr(watermark, "item") else watermark
+            logger.info("Atualizando '%s' a partir do watermark %s = %r...", fonte.tabela_cache, coluna, watermark)
+            sql = text(f"SELECT * FROM ({query_base}) AS q WHERE q.{_citar_identificador(coluna)} >= :watermark")
+            df_novos = pd.read_sql(sql, engine, params={"watermark": watermark})
+            logger.info("%d linhas novas ou alteradas recebidas para '%s'.", len(df_novos), fonte.tabela_cache)
+            df_atualizado = mesclar_incremento(df_cache, df_novos, coluna, watermark, fonte.chaves)
+    except Exception:
+        logger.exception("Falha na atualização incremental de '%s'. O cache atual será mantido.", fonte.tabela_cache)
+        return df_cache
+
+    backend.salvar(fonte.tabela_cache, df_atualizado)
+    logger.info("Cache '%s' atualizado: %d -> %d linhas.", fonte.tabela_cache, len(df_cache), len(df_atualizado))
+    return df_atualizado
+
+
+def mesclar_incremento(
+    df_cache: pd.DataFrame, df_novos: pd.DataFrame, coluna_watermark: str, watermark, chaves: list[str] | None = None
+) -> pd.DataFrame:
+    """
+    Mescla o incremento ao cache: a janela do watermark (>= watermark) é
+    substituída pelas linhas recém-buscadas e, se houver chaves, versões
+    anteriores das linhas alteradas também são descartadas.
+    """
+    df_mantido = df_cache[~(df_cache[coluna_watermark] >= watermark)]
+    if chaves and not df_novos.empty:
+        chaves_novas = pd.MultiIndex.from_frame(df_novos[chaves])
+        df_mantido = df_mantido[~pd.MultiIndex.from_frame(df_mantido[chaves]).isin(chaves_novas)]
+    return pd.concat([df_mantido, df_novos], ignore_index=True)
+
+
+def _citar_identificador(nome: str) -> str:
+    """Cita um nome de coluna para o T-SQL, escapando colchetes internos."""
+    return "[" + nome.replace("]", "]]") + "]"
+
+
 def _buscar_dados_financa_sql_raw() -> pd.DataFrame:
     """
     Busca dados brutos do Orçado (Nacional) via SQL Server FINANCA.
@@ -70,16 +372,16 @@ def _buscar_dados_hubdados_sql_raw() -> pd.DataFrame:
     return pd.read_sql(query, engine)
 
 
-def _salvar_dados_no_cache(df_orcado: pd.DataFrame, df_cc: pd.DataFrame, engine_cache: Engine) -> None:
-    """Salva os DataFrames brutos no cache SQLite."""
-    df_orcado.to_sql(TABELA_ORCADO_CACHE, engine_cache, if_exists="replace", index=False)
-    df_cc.to_sql(TABELA_CC_CACHE, engine_cache, if_exists="replace", index=False)
-    logger.info("Cache de dados brutos criado com sucesso.")
+# Busca ao vivo de cada tabela bruta, usada quando ela não está no cache.
+_BUSCAS_AO_VIVO = {
+    TABELA_ORCADO_CACHE: _buscar_dados_financa_sql_raw,
+    TABELA_CC_CACHE: _buscar_dados_hubdados_sql_raw,
+}
 
 
-def _carregar_dados_do_cache(tabela: str, engine_cache: Engine) -> pd.DataFrame:
-    """Carrega uma tabela específica do cache SQLite usando uma conexão existente."""
-    return pd.read_sql(tabela, engine_cache)
+def _carregar_dados_do_cache(tabela: str, backend: BackendCache, colunas: list[str] | None = None) -> pd.DataFrame:
+    """Carrega uma tabela do cache, opcionalmente apenas com as colunas informadas."""
+    return backend.carregar(tabela, colunas)
 
 
 # --- FUNÇÃO ADICIONADA PARA CORRIGIR O ERRO ---
@@ -100,17 +402,30 @@ def obter_dados_comprometidos_brutos() -> pd.DataFrame:
     engine = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
     
     try:
-        df = pd.read_sql(query, engine)
+        df = obter_com_cache("comprometido", query, "FINANCA_SQL", lambda: pd.read_sql(query, engine))
         logger.info("Dados do Comprometido (SQL) carregados com sucesso (%d linhas).", len(df))
-        return df
+        return aplicar_esquema(df)
     except Exception as e:
         logger.exception("ERRO CRÍTICO AO BUSCAR DADOS DO COMPROMETIDO.")
         raise e
 
 
-def obter_dados_correlacao(nome_query: str, centros_de_custo: list[str], truncate_cc_keys: bool = False) -> pd.DataFrame | None:
+def iterar_dados_comprometidos_em_lotes(tamanho_lote: int) -> Iterator[pd.DataFrame]:
+    """Itera o Comprometido (Nacional) direto do SQL Server em lotes de 'tamanho_lote' linhas."""
+    logger.info("Lendo o Comprometido (Nacional) em lotes de %d linhas...", tamanho_lote)
+    query = carregar_script_sql(CONFIG.paths.queries_dir / "comprometido.sql")
+    yield from map(aplicar_esquema, pd.read_sql(query, get_conexao(CONFIG.conexoes["FINANCA_SQL"]), chunksize=tamanho_lote))
+
+
+def obter_dados_correlacao(
+    nome_query: str, centros_de_custo: list[str], truncate_cc_keys: bool = False, hierarquia: HierarquiaCC | None = None
+) -> pd.DataFrame | None:
     """
-    Busca dados de correlação, com opção de truncar as chaves de CC para correspondência.
+    Busca dados de correlação, com opção de truncar as chaves de CC para correspondência
+    (pelo índice 'hierarquia', se informado, que já tem o pai de cada CC).
+
+    Os filtros de centro de custo e de ano são enviados ao SQL Server como
+    parâmetros, de modo que apenas as linhas da unidade trafegam pela rede.
     """
     logger.info(f"Buscando dados de correlação da query '{nome_query}' para {len(centros_de_custo)} centros de custo.")
     if not centros_de_custo:
@@ -119,31 +434,126 @@ def obter_dados_correlacao(nome_query: str, centros_de_custo: list[str], truncat
     try:
         caminho_query = CONFIG.paths.queries_dir / nome_query
         query_sql = carregar_script_sql(caminho_query)
-        engine = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
-        df_full = pd.read_sql(query_sql, engine)
-        logger.info(f"Query '{nome_query}' retornou {len(df_full)} linhas.")
-        if df_full.empty: return df_full
-        cc_col = 'CODCCUSTO' if 'CODCCUSTO' in df_full.columns else 'CC'
-        if cc_col not in df_full.columns:
-            logger.error(f"Query '{nome_query}' não contém coluna de Centro de Custo ('CODCCUSTO' ou 'CC').")
-            return None
-        df_filtered = df_full.copy()
         centros_de_custo_para_filtro = centros_de_custo
         if truncate_cc_keys:
             logger.info("Aplicando lógica de truncagem de CCs para correspondência.")
-            centros_de_custo_para_filtro = list(set(['.'.join(str(cc).split('.')[:-1]) for cc in centros_de_custo if '.' in str(cc)]))
+            centros_de_custo_para_filtro = _truncar_centros_de_custo(centros_de_custo, hierarquia)
+        centros_de_custo_str = sorted({str(cc).strip() for cc in centros_de_custo_para_filtro})
+        ano_filtro = int(os.getenv("ANO_FILTRO", 2025))
+        engine = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
+        df_filtered = obter_com_cache(
+            "correlacao", query_sql, "FINANCA_SQL",
+            lambda: _consultar_correlacao_filtrada(query_sql, nome_query, centros_de_custo_str, ano_filtro, engine),
+            params={"centros_de_custo": centros_de_custo_str, "ano": ano_filtro},
+        )
+        if df_filtered is None or df_filtered.empty: return df_filtered
+        cc_col = 'CODCCUSTO' if 'CODCCUSTO' in df_filtered.columns else 'CC'
         df_filtered[cc_col] = df_filtered[cc_col].astype(str).str.strip()
-        centros_de_custo_str = [str(cc).strip() for cc in centros_de_custo_para_filtro]
-        df_filtered = df_filtered[df_filtered[cc_col].isin(centros_de_custo_str)]
-        logger.info(f"Filtro de Centro de Custo resultou em {len(df_filtered)} linhas.")
         if 'ANO' in df_filtered.columns:
-            ano_filtro = int(os.getenv("ANO_FILTRO", 2025))
             df_filtered['ANO'] = pd.to_numeric(df_filtered['ANO'], errors='coerce')
-            df_filtered = df_filtered[df_filtered['ANO'] == ano_filtro]
-            logger.info(f"Filtro final por ANO={ano_filtro} resultou em {len(df_filtered)} linhas.")
-        else:
-            logger.warning(f"Coluna 'ANO' não encontrada em '{nome_query}'. A filtragem por ano será pulada.")
         return df_filtered
     except Exception as e:
         logger.exception(f"Falha ao buscar e filtrar dados de correlação da query '{nome_query}': {e}")
         return None
+
+
+class IndiceCorrelacao:
+    """
+    Dataset de correlação carregado uma única vez por execução e indexado
+    por centro de custo, para que cada unidade fatie apenas as suas linhas.
+    """
+
+    def __init__(self, nome_query: str, df: pd.DataFrame, hierarquia: HierarquiaCC | None = None):
+        self.nome_query = nome_query
+        self.hierarquia = hierarquia
+        self.df = df.reset_index(drop=True)
+        self.cc_col = 'CODCCUSTO' if 'CODCCUSTO' in self.df.columns else 'CC'
+        # CC -> posições das linhas; chaves truncadas são resolvidas no mesmo índice,
+        # pois nas queries truncadas o próprio CC da linha já é o prefixo.
+        self._posicoes: dict[str, np.ndarray] = self.df.groupby(self.cc_col, sort=False).indices
+
+    def fatiar(self, centros_de_custo: list[str], truncate_cc_keys: bool = False) -> pd.DataFrame:
+        """Retorna as linhas dos CCs informados em O(linhas da unidade)."""
+        chaves = _truncar_centros_de_custo(centros_de_custo, self.hierarquia) if truncate_cc_keys else centros_de_custo
+        posicoes = [self._posicoes[cc] for cc in {str(c).strip() for c in chaves} if cc in self._posicoes]
+        if not posicoes:
+            return self.df.iloc[0:0].copy()
+        df_unidade = self.df.iloc[np.sort(np.concatenate(posicoes))].reset_index(drop=True)
+        logger.info(f"Correlação '{self.nome_query}': {len(df_unidade)} linhas fatiadas do dataset compartilhado.")
+        return df_unidade
+
+
+def carregar_correlacao_compartilhada(
+    nome_query: str, centros_de_custo: list[str], truncate_cc_keys: bool = False, hierarquia: HierarquiaCC | None = None
+) -> IndiceCorrelacao | None:
+    """
+    Executa a query de correlação uma única vez para a união dos CCs de todas
+    as unidades da execução e devolve o resultado indexado por CC.
+    """
+    logger.info(f"Carregando dataset compartilhado de correlação para '{nome_query}'...")
+    df = obter_dados_correlacao(nome_query, centros_de_custo, truncate_cc_keys=truncate_cc_keys, hierarquia=hierarquia)
+    if df is None:
+        return None
+    indice = IndiceCorrelacao(nome_query, df, hierarquia)
+    logger.info(f"Dataset '{nome_query}' indexado: {len(indice.df)} linhas em {len(indice._posicoes)} CCs.")
+    return indice
+
+
+def _truncar_centros_de_custo(centros_de_custo: list[str], hierarquia: HierarquiaCC | None = None) -> list[str]:
+    """Remove o último segmento de cada CC (ex: '1.02.003.04' -> '1.02.003'), consultando o pai no índice da hierarquia."""
+    return (hierarquia or HierarquiaCC(centros_de_custo)).pais_de(centros_de_custo)
+
+
+def _consultar_correlacao_filtrada(
+    query_sql: str, nome_query: str, centros_de_custo: list[str], ano_filtro: int, engine: Engine
+) -> pd.DataFrame | None:
+    """
+    Executa a query de correlação como tabela derivada, filtrando no servidor
+    pela lista de CCs e pelo ano. Listas pequenas vão como parâmetros do IN;
+    listas grandes são carregadas em uma tabela temporária e usadas em um JOIN.
+    """
+    query_base = query_sql.strip().rstrip(';')
+    with engine.connect() as connection:
+        # TOP 0 retorna apenas os metadados, permitindo descobrir as colunas sem custo.
+        colunas = pd.read_sql(text(f"SELECT TOP 0 * FROM ({query_base}) AS q"), connection).columns
+        cc_col = 'CODCCUSTO' if 'CODCCUSTO' in colunas else 'CC'
+        if cc_col not in colunas:
+            logger.error(f"Query '{nome_query}' não contém coluna de Centro de Custo ('CODCCUSTO' ou 'CC').")
+            return None
+
+        filtros, juncao, params = [], "", {}
+        if 'ANO' in colunas:
+            filtros.append("q.[ANO] = :ano")
+            params["ano"] = ano_filtro
+        else:
+            logger.warning(f"Coluna 'ANO' não encontrada em '{nome_query}'. A filtragem por ano será pulada.")
+
+        usar_tabela_temporaria = len(centros_de_custo) > LIMITE_CC_FILTRO_INLINE
+        if usar_tabela_temporaria:
+            logger.info(f"Enviando {len(centros_de_custo)} CCs para a tabela temporária '{TABELA_TEMP_FILTRO_CC}'.")
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {TABELA_TEMP_FILTRO_CC};")
+            connection.exec_driver_sql(
+                f"CREATE TABLE {TABELA_TEMP_FILTRO_CC} (CC VARCHAR(100) COLLATE DATABASE_DEFAULT PRIMARY KEY);"
+            )
+            connection.exec_driver_sql(
+                f"INSERT INTO {TABELA_TEMP_FILTRO_CC} (CC) VALUES (?)", [(cc,) for cc in centros_de_custo]
+            )
+            juncao = f" INNER JOIN {TABELA_TEMP_FILTRO_CC} AS f ON q.[{cc_col}] = f.CC"
+        else:
+            filtros.append(f"q.[{cc_col}] IN :centros_de_custo")
+            params["centros_de_custo"] = centros_de_custo
+
+        sql = f"SELECT q.* FROM ({query_base}) AS q{juncao}"
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        stmt = text(sql)
+        if not usar_tabela_temporaria:
+            stmt = stmt.bindparams(bindparam("centros_de_custo", expanding=True))
+
+        try:
+            df = pd.read_sql(stmt, connection, params=params)
+        finally:
+            if usar_tabela_temporaria:
+                connection.exec_driver_sql(f"DROP TABLE IF EXISTS {TABELA_TEMP_FILTRO_CC};")
+    logger.info(f"Query '{nome_query}' filtrada no servidor retornou {len(df)} linhas (ANO={params.get('ano', 'n/a')}).")
+    return df
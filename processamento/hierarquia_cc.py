@@ -0,0 +1,119 @@
+# processamento/hierarquia_cc.py
+import logging
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SEPARADOR_CC = "."
+
+
+class HierarquiaCC:
+    """
+    Hierarquia dos centros de custo: '1.02.003.04' é filho de '1.02.003', que é
+    filho de '1.02'. É montada uma vez a partir de uma coluna de CODCCUSTO
+    (com repetições, como na referência de CC): cada CC distinto é dividido em
+    segmentos uma única vez, e as consultas pai -> filhos, filho -> ancestrais e
+    a junção de CCs truncados com os CCs completos viram buscas em índices.
+    """
+
+    def __init__(self, centros_de_custo: Iterable):
+        codigos_linhas, valores = pd.factorize(_como_serie(centros_de_custo))
+        codigos_nos, centros = pd.factorize(pd.Series(valores, dtype=object).astype(str).str.strip())
+        self.centros = pd.Index(centros, dtype=object)
+        # Nó (CC distinto, sem espaços) de cada linha da coluna original; -1 para nulos.
+        self._no_da_linha = np.where(codigos_linhas < 0, -1, codigos_nos[codigos_linhas] if len(valores) else -1)
+
+        # Pai de cada CC distinto, separado uma única vez (vetorizado).
+        pai_dos_nos = pd.Series(None, index=range(len(self.centros)), dtype=object)
+        if len(self.centros):
+            partes = pd.Series(self.centros, dtype=object).str.rpartition(SEPARADOR_CC)
+            pai_dos_nos = partes[0].where(partes[1] != "", None)
+        self._pai: dict[str, Optional[str]] = dict(zip(self.centros, pai_dos_nos))
+        self._filhos: Optional[dict[str, list[str]]] = None
+
+        # Linhas da coluna original agrupadas pelo pai do seu CC (para 'expandir_filhos').
+        self.pais = pd.Index(pai_dos_nos.dropna().unique(), dtype=object)
+        pai_do_no = self.pais.get_indexer(pai_dos_nos)
+        pai_da_linha = np.where(self._no_da_linha < 0, -1, pai_do_no[self._no_da_linha] if len(self.centros) else -1)
+        com_pai = np.flatnonzero(pai_da_linha >= 0)
+        self._linhas_por_pai = com_pai[np.argsort(pai_da_linha[com_pai], kind="stable")]
+        self._quantidade_filhos = np.bincount(pai_da_linha[com_pai], minlength=len(self.pais))
+        self._inicio_filhos = np.cumsum(self._quantidade_filhos) - self._quantidade_filhos
+
+    def __len__(self) -> int:
+        return len(self.centros)
+
+    def pai(self, centro: str) -> Optional[str]:
+        """Prefixo imediato do CC ('1.02.003.04' -> '1.02.003'); None para a raiz."""
+        centro = str(centro).strip()
+        if centro not in self._pai:
+            # Prefixos intermediários e CCs de fora da referência entram no índice na primeira consulta.
+            self._pai[centro] = centro.rsplit(SEPARADOR_CC, 1)[0] if SEPARADOR_CC in centro else None
+        return self._pai[centro]
+
+    def ancestrais(self, centro: str) -> list[str]:
+        """Prefixos do CC, do pai até a raiz."""
+        ancestrais, pai = [], self.pai(centro)
+        while pai is not None:
+            ancestrais.append(pai)
+            pai = self.pai(pai)
+        return ancestrais
+
+    def filhos(self, prefixo: str) -> list[str]:
+        """CCs (ou prefixos intermediários) imediatamente abaixo de 'prefixo'."""
+        if self._filhos is None:
+            self._filhos = {}
+            # Cada nó liga-se ao pai; prefixos intermediários entram uma vez, na primeira subida até eles.
+            vistos = set(self.centros)
+            for centro in self.centros:
+                filho = centro
+                for pai in self.ancestrais(centro):
+                    self._filhos.setdefault(pai, []).append(filho)
+                    if pai in vistos:
+                        break
+                    vistos.add(pai)
+                    filho = pai
+        return list(self._filhos.get(str(prefixo).strip(), []))
+
+    def pais_de(self, centros_de_custo: Iterable) -> list[str]:
+        """Prefixos imediatos distintos dos CCs informados (a raiz, sem pai, é ignorada)."""
+        return sorted({pai for pai in map(self.pai, set(centros_de_custo)) if pai is not None})
+
+    def contar_filhos(self, prefixos) -> np.ndarray:
+        """Quantas linhas da coluna original são filhas de cada prefixo (0 se nenhuma), sem expandir a junção."""
+        pai = self._localizar_pais(prefixos)
+        return np.where(pai >= 0, self._quantidade_filhos[np.maximum(pai, 0)] if len(self.pais) else 0, 0)
+
+    def primeiro_filho(self, prefixos) -> np.ndarray:
+        """Linha da coluna original do primeiro filho de cada prefixo (na ordem original); -1 se não houver."""
+        pai = self._localizar_pais(prefixos)
+        return np.where(pai >= 0, self._linhas_por_pai[self._inicio_filhos[np.maximum(pai, 0)]] if len(self.pais) else -1, -1)
+
+    def expandir_filhos(self, prefixos) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Junta CCs truncados (prefixos) com as linhas da coluna original cujo CC é
+        filho imediato do prefixo. Retorna os pares (linha de 'prefixos', linha da
+        coluna original), na ordem das linhas de 'prefixos' e, para cada uma, na
+        ordem original: o mesmo resultado de um merge interno pelo CC truncado.
+        """
+        pai = self._localizar_pais(prefixos)
+        encontradas = np.flatnonzero(pai >= 0)
+        quantidade = self._quantidade_filhos[pai[encontradas]]
+        linhas_prefixos = np.repeat(encontradas, quantidade)
+        deslocamento = np.arange(len(linhas_prefixos)) - np.repeat(np.cumsum(quantidade) - quantidade, quantidade)
+        linhas_filhos = self._linhas_por_pai[np.repeat(self._inicio_filhos[pai[encontradas]], quantidade) + deslocamento]
+        return linhas_prefixos, linhas_filhos
+
+    def _localizar_pais(self, prefixos) -> np.ndarray:
+        # Posição de cada prefixo em 'pais' (-1 se não for pai de nenhum CC), consultando cada valor distinto uma vez.
+        codigos, valores = pd.factorize(_como_serie(prefixos))
+        posicao_valor = self.pais.get_indexer(pd.Series(valores, dtype=object).astype(str).str.strip())
+        return np.where(codigos < 0, -1, posicao_valor[codigos] if len(valores) else -1)
+
+
+def _como_serie(valores) -> pd.Series:
+    # Colunas (inclusive categóricas) são fatoradas como estão; só listas e arrays viram Series.
+    return valores if isinstance(valores, pd.Series) else pd.Series(list(valores), dtype=object)
@@ -0,0 +1,111 @@
+# processamento/indice_cc.py
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from config.config import CONFIG
+from processamento.chaves import CAMPOS_CHAVE, CodificadorChaves, obter_codificador
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_INDICE = CAMPOS_CHAVE + ["CODCCUSTO"]
+# Chave, nos metadados do parquet, da assinatura do cache de CC que gerou o índice.
+METADADO_ASSINATURA = b"pulso.assinatura_cc"
+
+
+class IndiceCC:
+    """
+    Referência de CC deduplicada (PROJETO, ACAO, UNIDADE, ANO -> CODCCUSTO) usada
+    na junção do Orçado. Guarda só as colunas da chave, em texto, na ordem da
+    primeira ocorrência; os códigos inteiros (que dependem do dicionário do
+    processo) são calculados uma vez por codificador e reaproveitados.
+    """
+
+    def __init__(self, referencia: pd.DataFrame):
+        self.referencia = referencia.reset_index(drop=True)
+        self._codificador: Optional[CodificadorChaves] = None
+        self._codigos: Optional[pd.Index] = None
+        self._linhas: Optional[np.ndarray] = None
+
+    @classmethod
+    def da_referencia(cls, df_cc_pronto: pd.DataFrame) -> "IndiceCC":
+        """
+        Deduplica a referência preparada pelos valores exatos da chave, mantendo o
+        primeiro CODCCUSTO de cada uma. Não usa a CHAVE_COD, que depende do modo de
+        chaves ativo: gravado em modo normalizado, o índice perderia grafias que o
+        modo exato ainda precisa ('localizar' deduplica de novo conforme o modo).
+        """
+        df_unico = df_cc_pronto.drop_duplicates(subset=CAMPOS_CHAVE, keep="first")
+        return cls(df_unico[COLUNAS_INDICE])
+
+    def __len__(self) -> int:
+        return len(self.referencia)
+
+    def localizar(self, codigos: np.ndarray) -> np.ndarray:
+        """Posição em 'referencia' de cada código de chave; -1 onde não há CC."""
+        codificador = obter_codificador()
+        if self._codificador is not codificador:
+            # Com chaves normalizadas, grafias distintas do índice podem cair no mesmo código: vale a primeira.
+            codigos_indice = pd.Index(codificador.codificar(self.referencia[CAMPOS_CHAVE]))
+            unicos = ~codigos_indice.duplicated()
+            self._codigos, self._linhas = codigos_indice[unicos], np.flatnonzero(unicos)
+            self._codificador = codificador
+        posicoes = self._codigos.get_indexer(codigos)
+        acertos = posicoes >= 0
+        linhas = np.full(len(posicoes), -1, dtype=np.int64)
+        linhas[acertos] = self._linhas[posicoes[acertos]]
+        return linhas
+
+    def valores(self, coluna: str, posicoes: np.ndarray):
+        """Valores de 'coluna' do índice nas 'posicoes' (nulo onde a posição é -1), no dtype da referência."""
+        return pd.api.extensions.take(self.referencia[coluna].array, posicoes, allow_fill=True)
+
+
+def obter_indice_cc(df_cc_pronto: pd.DataFrame, assinatura: Optional[str], caminho: Optional[Path] = None) -> IndiceCC:
+    """
+    Retorna o índice de CC gravado em disco se ele foi gerado a partir da mesma
+    versão do cache de CC ('assinatura', ver extracao.assinatura_dado_bruto);
+    caso contrário, constrói o índice a partir da referência preparada e o grava.
+    Sem assinatura (CC fora do cache) ou sem pyarrow, o índice fica só em memória.
+    """
+    caminho = Path(caminho or CONFIG.paths.indice_cc)
+    if assinatura is None or not PYARROW_DISPONIVEL:
+        return IndiceCC.da_referencia(df_cc_pronto)
+
+    if caminho.exists():
+        try:
+            metadados = pq.read_schema(caminho).metadata or {}
+            if metadados.get(METADADO_ASSINATURA) == assinatura.encode("utf-8"):
+                indice = IndiceCC(pq.read_table(caminho).to_pandas())
+                logger.info("Índice de CC reaproveitado de '%s' (%d chaves).", caminho, len(indice))
+                return indice
+            logger.info("O cache de CC mudou desde a gravação do índice. Reconstruindo...")
+        except Exception as e:
+            logger.warning("Não foi possível ler o índice de CC em '%s': %s. Reconstruindo...", caminho, e)
+
+    indice = IndiceCC.da_referencia(df_cc_pronto)
+    salvar_indice_cc(indice, assinatura, caminho)
+    return indice
+
+
+def salvar_indice_cc(indice: IndiceCC, assinatura: str, caminho: Optional[Path] = None) -> None:
+    """Grava o índice (parquet, escrita atômica) com a assinatura do cache de CC nos metadados."""
+    caminho = Path(caminho or CONFIG.paths.indice_cc)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    tabela = pa.Table.from_pandas(indice.referencia, preserve_index=False)
+    tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), METADADO_ASSINATURA: assinatura.encode("utf-8")})
+    caminho_temp = caminho.with_suffix(".parquet.tmp")
+    pq.write_table(tabela, caminho_temp, compression="zstd")
+    os.replace(caminho_temp, caminho)
+    logger.info("Índice de CC gravado em '%s' (%d chaves).", caminho, len(indice))
@@ -2,6 +2,7 @@
 import logging
 import os
 import sys
+import numpy as np
 import pandas as pd
 
 try:
@@ -23,6 +24,8 @@ except ImportError:
     sys.exit(1)
 
 from config.database import get_conexao
+from processamento.cache_consultas import obter_com_cache
+from processamento.esquema import aplicar_esquema
 
 def formatar_brl(valor):
     if pd.isna(valor) or valor == 0: return "R$ 0"
@@ -90,7 +93,10 @@ def obter_dados_processados() -> pd.DataFrame | None:
         params = (f'{ANO_FILTRO}-01-01', f'{ANO_FILTRO}-12-31', PPA_FILTRO)
         
         logger.info("Carregando dados base via função 'dbo.vw_Analise_Planejado_vs_Executado_v2'...")
-        df_base = pd.read_sql(sql_query, engine_db, params=params)
+        df_base = obter_com_cache(
+            "base_processada", sql_query, "FINANCA_SQL",
+            lambda: pd.read_sql(sql_query, engine_db, params=params), params=params,
+        )
         logger.info("%d linhas carregadas.", len(df_base))
 
         if df_base.empty:
@@ -102,13 +108,15 @@ def obter_dados_processados() -> pd.DataFrame | None:
         df_base['nm_unidade_padronizada'] = df_base['UNIDADE'].astype(str).str.replace('SP - ', '', regex=False).str.strip().str.upper()
         df_base['UNIDADE_FINAL'] = df_base['nm_unidade_padronizada'].map(mapa_unidade).fillna(df_base['nm_unidade_padronizada'])
         
-        unidades_por_projeto = df_base.groupby('PROJETO')['nm_unidade_padronizada'].nunique()
-        df_base['tipo_projeto'] = df_base['PROJETO'].map(unidades_por_projeto).apply(lambda x: 'Compartilhado' if x > 1 else 'Exclusivo')
+        unidades_por_projeto = df_base.groupby('PROJETO', observed=True)['nm_unidade_padronizada'].nunique()
+        df_base['tipo_projeto'] = np.where(df_base['PROJETO'].map(unidades_por_projeto) > 1, 'Compartilhado', 'Exclusivo')
         
         colunas_para_remover = ['UNIDADE', 'nm_unidade_padronizada']
         df_base.drop(columns=[col for col in colunas_para_remover if col in df_base.columns], inplace=True)
         
-        logger.info("Processamento da base de dados (Python) concluído.")
+        # Fixa os tipos do esquema (texto categórico, inteiros estreitos) antes de entregar a base aos relatórios.
+        df_base = aplicar_esquema(df_base)
+        logger.info("Processamento da base de dados (Python) concluído (%.1f MB em memória).", df_base.memory_usage(deep=True).sum() / 1e6)
         return df_base
 
     except Exception as e:
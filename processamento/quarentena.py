@@ -0,0 +1,106 @@
+# processamento/quarentena.py
+import logging
+from typing import Iterable
+
+import pandas as pd
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from comunicacao.carregamento import acumular_dataframe_com_merge
+from processamento.chaves import CAMPOS_CHAVE, SEPARADOR_CHAVE, obter_codificador
+
+logger = logging.getLogger(__name__)
+
+# Linhas do Orçado que não encontraram CODCCUSTO, guardadas com a chave original
+# para serem reprocessadas isoladamente (--reprocessar-quarentena).
+TABELA_QUARENTENA = "ORCADO_QUARENTENA_CC"
+TABELA_DESTINO_QUARENTENA = "ORCADO_ENRIQUECIDO_COM_CC"
+COLUNA_CHAVE_QUARENTENA = "ChaveQuebrada"
+COLUNAS_DETALHE = ["MES", "Codigo_Natureza_Orcamentaria"]
+COLUNA_VALOR = "Valor_Ajustado"
+
+SQL_REMOVER_DA_QUARENTENA = text(f"DELETE FROM [dbo].[{TABELA_QUARENTENA}] WHERE [{COLUNA_CHAVE_QUARENTENA}] = :chave")
+
+
+def montar_quarentena(df_enriquecido: pd.DataFrame) -> pd.DataFrame:
+    """
+    Separa as linhas sem CODCCUSTO após a junção e as devolve com a chave
+    original (antes do mapa de correções), reconstruída a partir da CHAVE_COD.
+    As linhas são agregadas por chave, MES e natureza, somando o Valor_Ajustado,
+    que é tudo o que o grão final da tabela enriquecida precisa.
+    """
+    colunas = [COLUNA_CHAVE_QUARENTENA] + CAMPOS_CHAVE + [col for col in COLUNAS_DETALHE + [COLUNA_VALOR] if col in df_enriquecido.columns]
+    falhas = df_enriquecido["CODCCUSTO"].isna().to_numpy() if "CODCCUSTO" in df_enriquecido.columns else None
+    if falhas is None or not falhas.any():
+        return pd.DataFrame(columns=colunas)
+
+    df_falhas = df_enriquecido.loc[falhas]
+    codigos, unicos = pd.factorize(df_falhas["CHAVE_COD"])
+    chaves = obter_codificador().decodificar(unicos)
+    df_chaves = pd.DataFrame([chave.split(SEPARADOR_CHAVE) for chave in chaves], columns=CAMPOS_CHAVE)
+    df_chaves.insert(0, COLUNA_CHAVE_QUARENTENA, chaves)
+    df_chaves["ANO"] = df_chaves["ANO"].astype(int)
+
+    df_quarentena = df_chaves.iloc[codigos].reset_index(drop=True)
+    for col in colunas[len(CAMPOS_CHAVE) + 1:]:
+        df_quarentena[col] = df_falhas[col].to_numpy()
+    if COLUNA_VALOR not in df_quarentena.columns:
+        return df_quarentena.drop_duplicates(ignore_index=True)
+    agrupamento = [col for col in colunas if col != COLUNA_VALOR]
+    return df_quarentena.groupby(agrupamento, as_index=False, dropna=False, sort=False)[COLUNA_VALOR].sum()
+
+
+def gravar_quarentena(df_quarentena: pd.DataFrame, engine: Engine, substituir: bool = True) -> None:
+    """
+    Grava as linhas de 'montar_quarentena' em dbo.ORCADO_QUARENTENA_CC. Com
+    'substituir' (execução completa ou primeiro lote), a quarentena anterior é
+    descartada antes, mesmo que não haja falhas novas; o modo em lotes acrescenta
+    os lotes seguintes.
+    """
+    if substituir:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS [dbo].[{TABELA_QUARENTENA}];"))
+    if df_quarentena.empty:
+        return
+    df_quarentena.assign(DataQuarentena=pd.Timestamp.now()).to_sql(
+        TABELA_QUARENTENA, engine, if_exists="append", index=False, schema="dbo",
+    )
+    logger.warning(
+        "%d linhas (%d chaves) sem CODCCUSTO gravadas na quarentena '%s'.",
+        len(df_quarentena), df_quarentena[COLUNA_CHAVE_QUARENTENA].nunique(), TABELA_QUARENTENA,
+    )
+
+
+def carregar_quarentena(engine: Engine) -> pd.DataFrame:
+    """Lê a quarentena; vazia se a tabela ainda não existir."""
+    if not inspect(engine).has_table(TABELA_QUARENTENA, schema="dbo"):
+        return pd.DataFrame()
+    return pd.read_sql_table(TABELA_QUARENTENA, engine, schema="dbo").drop(columns=["DataQuarentena"], errors="ignore")
+
+
+def remover_da_quarentena(chaves: Iterable[str], connection) -> int:
+    """Remove da quarentena as linhas das chaves informadas, na transação de 'connection'."""
+    parametros = [{"chave": chave} for chave in chaves]
+    if not parametros:
+        return 0
+    return connection.execute(SQL_REMOVER_DA_QUARENTENA, parametros).rowcount
+
+
+def resolver_quarentena(
+    df_final: pd.DataFrame, chave_primaria: list[str], chaves_resolvidas: Iterable[str], engine: Engine
+) -> None:
+    """
+    Soma as linhas resolvidas (já no grão final) em ORCADO_ENRIQUECIDO_COM_CC e
+    as remove da quarentena na mesma transação: se qualquer passo falhar, nada é
+    somado e as linhas continuam na quarentena para a próxima tentativa.
+    """
+    chaves_resolvidas = list(chaves_resolvidas)
+    with engine.begin() as connection:
+        acumular_dataframe_com_merge(
+            df_final, TABELA_DESTINO_QUARENTENA, connection, chave_primaria=chave_primaria, colunas_soma=[COLUNA_VALOR],
+        )
+        removidas = remover_da_quarentena(chaves_resolvidas, connection)
+    logger.info(
+        "%d chaves resolvidas: %d linhas somadas em '%s' e %d removidas da quarentena.",
+        len(chaves_resolvidas), len(df_final), TABELA_DESTINO_QUARENTENA, removidas,
+    )
@@ -0,0 +1,308 @@
+# processamento/regras_correcao.py
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from processamento.chaves import CAMPOS_CHAVE, SEPARADOR_CHAVE
+from processamento.esquema import atribuir_valores
+
+logger = logging.getLogger(__name__)
+
+# Marca, numa entrada do mapa, um campo que a regra não lê nem altera.
+CURINGA = "*"
+# Uma regra só é derivada se for confirmada por pelo menos esta quantidade de entradas.
+SUPORTE_MINIMO_PADRAO = 2
+
+_POSICAO_PROJETO = CAMPOS_CHAVE.index("PROJETO")
+
+
+@dataclass(frozen=True)
+class RegraCampo:
+    """
+    Reescrita de um único campo da chave: 'campo' passa de 'origem' para
+    'destino'. Com 'projeto' preenchido, a regra só vale para linhas cujo
+    PROJETO original é esse (ex.: UNIDADE no projeto P: A -> B).
+    """
+    campo: str
+    origem: object
+    destino: object
+    projeto: Optional[str] = None
+
+    def para_entrada(self) -> tuple[str, str]:
+        """Serializa a regra como uma entrada do mapa, com '*' nos campos livres."""
+        quebrada = [CURINGA] * len(CAMPOS_CHAVE)
+        correta = [CURINGA] * len(CAMPOS_CHAVE)
+        posicao = CAMPOS_CHAVE.index(self.campo)
+        quebrada[posicao], correta[posicao] = str(self.origem), str(self.destino)
+        if self.projeto is not None:
+            quebrada[_POSICAO_PROJETO] = self.projeto
+        return SEPARADOR_CHAVE.join(quebrada), SEPARADOR_CHAVE.join(correta)
+
+
+class RegrasCorrecao:
+    """
+    Mapa de correções compilado: regras por campo mais as correções de chave
+    inteira que nenhuma regra reproduz ('excecoes').
+
+    As regras são gravadas no próprio dbo.MapaCorrecoesChaves como entradas com
+    curingas ('Projeto X|*|*|*' -> 'Projeto Y|*|*|*'), então a tabela, a cópia
+    local e o JSON continuam guardando só pares de texto. As exceções têm
+    precedência; as regras de projeto têm precedência sobre as globais.
+    """
+
+    def __init__(self, regras: Iterable[RegraCampo] = (), excecoes: Optional[Dict[str, str]] = None):
+        self.excecoes: Dict[str, str] = dict(excecoes or {})
+        self._globais: dict[str, dict] = defaultdict(dict)
+        self._contextuais: dict[str, dict] = defaultdict(dict)
+        for regra in regras:
+            self.adicionar(regra)
+
+    @classmethod
+    def do_mapa(cls, mapa_correcoes: Dict[str, str]) -> "RegrasCorrecao":
+        """Separa as entradas com curinga (regras) das correções de chave inteira."""
+        regras, excecoes = [], {}
+        for chave_quebrada, chave_correta in mapa_correcoes.items():
+            if not isinstance(chave_quebrada, str) or CURINGA not in chave_quebrada.split(SEPARADOR_CHAVE):
+                excecoes[chave_quebrada] = chave_correta
+                continue
+            try:
+                regras.append(_ler_regra(chave_quebrada, chave_correta))
+            except (ValueError, AttributeError) as e:
+                logger.error("Regra de correção inválida '%s' -> '%s': %s", chave_quebrada, chave_correta, e)
+        return cls(regras, excecoes)
+
+    @property
+    def regras(self) -> list[RegraCampo]:
+        regras = [RegraCampo(campo, origem, destino) for campo, mapa in self._globais.items() for origem, destino in mapa.items()]
+        regras += [
+            RegraCampo(campo, origem, destino, projeto)
+            for campo, mapa in self._contextuais.items() for (projeto, origem), destino in mapa.items()
+        ]
+        return regras
+
+    def adicionar(self, regra: RegraCampo) -> None:
+        if regra.projeto is None:
+            self._globais[regra.campo][regra.origem] = regra.destino
+        else:
+            self._contextuais[regra.campo][(regra.projeto, regra.origem)] = regra.destino
+
+    def possui_regra(self, campo: str, origem, projeto: Optional[str] = None) -> bool:
+        if projeto is None:
+            return origem in self._globais.get(campo, {})
+        return (projeto, origem) in self._contextuais.get(campo, {})
+
+    def para_mapa(self) -> Dict[str, str]:
+        """Mapa {ChaveQuebrada: ChaveCorreta} com as regras (curingas) seguidas das exceções."""
+        mapa = dict(regra.para_entrada() for regra in self.regras)
+        mapa.update(self.excecoes)
+        return mapa
+
+    def corrigir_campos(self, campos: tuple) -> tuple:
+        """Aplica só as regras a uma chave já desmontada (PROJETO, ACAO, UNIDADE, ANO)."""
+        projeto = campos[_POSICAO_PROJETO]
+        corrigidos = []
+        for campo, valor in zip(CAMPOS_CHAVE, campos):
+            destino = self._contextuais.get(campo, {}).get((projeto, valor))
+            if destino is None:
+                destino = self._globais.get(campo, {}).get(valor, valor)
+            corrigidos.append(destino)
+        return tuple(corrigidos)
+
+    def corrigir_chave(self, chave: str) -> Optional[str]:
+        """Correção de uma chave em texto: exceção, se houver; senão as regras. None se nada se aplica."""
+        if chave in self.excecoes:
+            return self.excecoes[chave]
+        campos = _desmontar_chave(chave)
+        if campos is None:
+            return None
+        corrigidos = self.corrigir_campos(campos)
+        return _montar_chave(corrigidos) if corrigidos != campos else None
+
+    def aplicar(self, df: pd.DataFrame, linhas: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Reescreve PROJETO, ACAO, UNIDADE e ANO de 'df' (no próprio DataFrame)
+        pelas regras, uma coluna por vez. 'linhas' restringe as linhas
+        elegíveis (as já corrigidas por exceção ficam de fora). Retorna a
+        máscara das linhas alteradas.
+        """
+        elegiveis = np.ones(len(df), dtype=bool) if linhas is None else np.asarray(linhas, dtype=bool)
+        posicoes = np.flatnonzero(elegiveis)
+        alteradas = np.zeros(len(df), dtype=bool)
+        if not len(posicoes) or not (self._globais or self._contextuais):
+            return alteradas
+
+        # Todas as regras leem os valores originais, então as colunas são
+        # calculadas antes de qualquer atribuição. As regras são consultadas uma
+        # vez por valor (ou par projeto/valor) distinto, não por linha.
+        fatorados = {campo: _fatorar(df[campo], posicoes) for campo in CAMPOS_CHAVE}
+        codigos_projeto, projetos = fatorados["PROJETO"]
+        novos = {}
+        for campo in CAMPOS_CHAVE:
+            codigos, valores = fatorados[campo]
+            destino = np.empty(len(posicoes), dtype=object)
+            reescrever = np.zeros(len(posicoes), dtype=bool)
+            globais = self._globais.get(campo)
+            if globais:
+                destinos_valor = np.array([globais.get(valor) for valor in valores] + [None], dtype=object)
+                por_linha = destinos_valor[codigos]
+                encontrados = np.not_equal(por_linha, None)
+                destino[encontrados] = por_linha[encontrados]
+                reescrever |= encontrados
+            contextuais = self._contextuais.get(campo)
+            if contextuais:
+                pares = codigos_projeto.astype(np.int64) * (len(valores) + 1) + codigos
+                pares_unicos, inversos = np.unique(pares, return_inverse=True)
+                destinos_par = np.array([
+                    contextuais.get((_valor(projetos, par // (len(valores) + 1)), _valor(valores, par % (len(valores) + 1))))
+                    for par in pares_unicos.tolist()
+                ], dtype=object)
+                por_linha = destinos_par[inversos.reshape(-1)]
+                encontrados = np.not_equal(por_linha, None)
+                destino[encontrados] = por_linha[encontrados]
+                reescrever |= encontrados
+            if reescrever.any():
+                novos[campo] = (reescrever, destino)
+
+        for campo, (reescrever, destino) in novos.items():
+            mascara = np.zeros(len(df), dtype=bool)
+            mascara[posicoes[reescrever]] = True
+            atribuir_valores(df, mascara, campo, destino[reescrever])
+            alteradas |= mascara
+        return alteradas
+
+
+def compilar_regras(
+    mapa_correcoes: Dict[str, str],
+    suporte_minimo: int = SUPORTE_MINIMO_PADRAO,
+    chaves_validas: Optional[Iterable[str]] = None,
+) -> RegrasCorrecao:
+    """
+    Deriva regras por campo a partir das correções de chave inteira do mapa.
+
+    Uma regra 'campo: X -> Y' (global, ou restrita a um projeto) é criada
+    quando todas as entradas com X nesse campo o corrigem para Y, há pelo
+    menos 'suporte_minimo' delas e X nunca aparece como valor correto (nas
+    chaves corretas do mapa e em 'chaves_validas', ex.: as chaves do CC).
+    ANO só recebe regras por projeto. As entradas que as regras reproduzem
+    exatamente são descartadas; as demais continuam como exceções.
+    """
+    existentes = RegrasCorrecao.do_mapa(mapa_correcoes)
+
+    entradas, nao_analisaveis = [], {}
+    for chave_quebrada, chave_correta in existentes.excecoes.items():
+        quebrada, correta = _desmontar_chave(chave_quebrada), _desmontar_chave(chave_correta)
+        if quebrada is None or correta is None:
+            nao_analisaveis[chave_quebrada] = chave_correta
+        else:
+            entradas.append((chave_quebrada, chave_correta, quebrada, correta))
+
+    # Valores que são corretos em algum lugar não podem virar origem de regra.
+    chaves_corretas = [correta for *_, correta in entradas]
+    chaves_corretas += [campos for campos in map(_desmontar_chave, chaves_validas or []) if campos is not None]
+    validos_globais = {campo: set() for campo in CAMPOS_CHAVE}
+    validos_por_projeto = {campo: set() for campo in CAMPOS_CHAVE}
+    for campos in chaves_corretas:
+        for campo, valor in zip(CAMPOS_CHAVE, campos):
+            validos_globais[campo].add(valor)
+            validos_por_projeto[campo].add((campos[_POSICAO_PROJETO], valor))
+
+    regras = existentes
+    for campo in CAMPOS_CHAVE:
+        posicao = CAMPOS_CHAVE.index(campo)
+        if campo != "ANO":
+            destinos = defaultdict(set)
+            suporte = defaultdict(int)
+            for *_, quebrada, correta in entradas:
+                destinos[quebrada[posicao]].add(correta[posicao])
+                suporte[quebrada[posicao]] += 1
+            for origem, alvos in destinos.items():
+                destino = next(iter(alvos))
+                if (
+                    len(alvos) == 1 and destino != origem and suporte[origem] >= suporte_minimo
+                    and origem not in validos_globais[campo] and not regras.possui_regra(campo, origem)
+                ):
+                    regras.adicionar(RegraCampo(campo, origem, destino))
+
+        if campo == "PROJETO":
+            continue
+        destinos = defaultdict(set)
+        suporte = defaultdict(int)
+        projetos_corretos = defaultdict(set)
+        for *_, quebrada, correta in entradas:
+            contexto = (quebrada[_POSICAO_PROJETO], quebrada[posicao])
+            destinos[contexto].add(correta[posicao])
+            suporte[contexto] += 1
+            projetos_corretos[quebrada[_POSICAO_PROJETO]].add(correta[_POSICAO_PROJETO])
+        for (projeto, origem), alvos in destinos.items():
+            destino = next(iter(alvos))
+            if (
+                len(alvos) == 1 and destino != origem and suporte[(projeto, origem)] >= suporte_minimo
+                and not regras.possui_regra(campo, origem) and not regras.possui_regra(campo, origem, projeto)
+                and all((p, origem) not in validos_por_projeto[campo] for p in projetos_corretos[projeto] | {projeto})
+            ):
+                regras.adicionar(RegraCampo(campo, origem, destino, projeto))
+
+    excecoes = dict(nao_analisaveis)
+    for chave_quebrada, chave_correta, quebrada, correta in entradas:
+        if regras.corrigir_campos(quebrada) != correta:
+            excecoes[chave_quebrada] = chave_correta
+    regras.excecoes = excecoes
+
+    logger.info(
+        "Mapa compilado: %d correções -> %d regras por campo + %d exceções de chave inteira.",
+        len(mapa_correcoes), len(regras.regras), len(excecoes),
+    )
+    return regras
+
+
+def _fatorar(serie: pd.Series, posicoes: np.ndarray) -> tuple[np.ndarray, list]:
+    """Códigos (0..n-1; ausentes = n) e valores distintos da coluna nas posições informadas."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, valores = pd.factorize(serie)
+    codigos = codigos[posicoes].astype(np.int64)
+    valores = list(valores)
+    return np.where(codigos < 0, len(valores), codigos), valores
+
+
+def _valor(valores: list, codigo: int):
+    return valores[codigo] if codigo < len(valores) else None
+
+
+def _desmontar_chave(chave: str) -> Optional[tuple]:
+    partes = chave.split(SEPARADOR_CHAVE) if isinstance(chave, str) else []
+    if len(partes) != len(CAMPOS_CHAVE):
+        return None
+    try:
+        return tuple(partes[:-1]) + (int(partes[-1]),)
+    except ValueError:
+        return None
+
+
+def _montar_chave(campos: tuple) -> str:
+    return SEPARADOR_CHAVE.join(str(valor) for valor in campos)
+
+
+def _ler_regra(chave_quebrada: str, chave_correta: str) -> RegraCampo:
+    quebrada, correta = chave_quebrada.split(SEPARADOR_CHAVE), chave_correta.split(SEPARADOR_CHAVE)
+    if len(quebrada) != len(CAMPOS_CHAVE) or len(correta) != len(CAMPOS_CHAVE):
+        raise ValueError("a regra deve ter os quatro campos da chave")
+    alterados = [i for i, valor in enumerate(correta) if valor != CURINGA]
+    if len(alterados) != 1:
+        raise ValueError("a regra deve alterar exatamente um campo")
+    posicao = alterados[0]
+    lidos = {i for i, valor in enumerate(quebrada) if valor != CURINGA}
+    if lidos not in ({posicao}, {posicao, _POSICAO_PROJETO}):
+        raise ValueError("a regra só pode depender do próprio campo e do PROJETO")
+
+    campo = CAMPOS_CHAVE[posicao]
+    origem, destino = quebrada[posicao], correta[posicao]
+    if campo == "ANO":
+        origem, destino = int(origem), int(destino)
+    projeto = quebrada[_POSICAO_PROJETO] if len(lidos) == 2 else None
+    return RegraCampo(campo, origem, destino, projeto)
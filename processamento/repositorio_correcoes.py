@@ -0,0 +1,337 @@
+# processamento/repositorio_correcoes.py
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from config.config import CONFIG
+from processamento.cache_consultas import MODO_OFFLINE, MODO_REFRESH, obter_modo_cache
+
+logger = logging.getLogger(__name__)
+
+TABELA_MAPA_SERVIDOR = "dbo.MapaCorrecoesChaves"
+# A tabela do servidor é dividida em baldes por hash da ChaveQuebrada; só os
+# baldes cujo (COUNT, CHECKSUM_AGG) mudou desde a última sincronização são baixados.
+NUM_BALDES = 64
+
+_EXPRESSAO_BALDE = f"((CHECKSUM(ChaveQuebrada) % {NUM_BALDES}) + {NUM_BALDES}) % {NUM_BALDES}"
+
+SQL_CHECKSUM_BALDES = f"""
+    SELECT {_EXPRESSAO_BALDE} AS Balde,
+           COUNT(*) AS Linhas,
+           CHECKSUM_AGG(BINARY_CHECKSUM(ChaveQuebrada, ChaveCorreta)) AS Checksum
+    FROM {TABELA_MAPA_SERVIDOR}
+    GROUP BY {_EXPRESSAO_BALDE}
+"""
+
+# Envio em lote: as correções vão para uma tabela temporária da sessão e entram
+# no mapa por um único MERGE, que informa a ação de cada linha.
+SQL_CRIAR_ESTAGIO = "CREATE TABLE #CorrecoesEstagio (ChaveQuebrada NVARCHAR(255) NOT NULL PRIMARY KEY, ChaveCorreta NVARCHAR(255) NOT NULL)"
+SQL_INSERIR_ESTAGIO = "INSERT INTO #CorrecoesEstagio (ChaveQuebrada, ChaveCorreta) VALUES (:quebrada, :correta)"
+SQL_MERGE_ESTAGIO = f"""
+    MERGE {TABELA_MAPA_SERVIDOR} AS target
+    USING #CorrecoesEstagio AS source
+    ON (target.ChaveQuebrada = source.ChaveQuebrada)
+    WHEN MATCHED AND target.ChaveCorreta <> source.ChaveCorreta THEN UPDATE SET ChaveCorreta = source.ChaveCorreta
+    WHEN NOT MATCHED THEN INSERT (ChaveQuebrada, ChaveCorreta) VALUES (source.ChaveQuebrada, source.ChaveCorreta)
+    OUTPUT $action;
+"""
+SQL_REMOVER_ESTAGIO = "DROP TABLE #CorrecoesEstagio"
+
+SQL_LINHAS_DOS_BALDES = f"""
+    SELECT ChaveQuebrada, ChaveCorreta, {_EXPRESSAO_BALDE} AS Balde
+    FROM {TABELA_MAPA_SERVIDOR}
+    WHERE {_EXPRESSAO_BALDE} IN :baldes
+"""
+
+
+# Versão do esquema do arquivo local (PRAGMA user_version). Arquivos de versão
+# anterior são recriados; o conteúdo volta na próxima sincronização.
+VERSAO_ESQUEMA = 2
+# Janela de memory-mapping do arquivo: leituras pontuais e por prefixo vão
+# direto às páginas mapeadas, sem carregar o mapa inteiro.
+TAMANHO_MMAP = 256 * 1024 * 1024
+# Maior caractere Unicode: 'prefixo + FIM_PREFIXO' limita uma varredura por prefixo.
+FIM_PREFIXO = "\U0010ffff"
+TAMANHO_LOTE_ENVIO = 1000
+
+
+class RepositorioCorrecoes:
+    """
+    Cópia local (SQLite) do dbo.MapaCorrecoesChaves, mantida também em memória.
+
+    'obter_mapa' compara os checksums por balde do servidor com os gravados na
+    última sincronização e baixa apenas os baldes alterados; sem alterações, o
+    custo é uma única consulta agregada. Correções gravadas por este processo
+    entram direto na cópia local por 'registrar'.
+
+    Correções aceitas nesta máquina passam por 'enfileirar': entram na cópia
+    local e num diário em disco ('pendentes'), que 'enviar_pendentes' descarrega
+    no servidor em lote. Uma falha ou queda no meio da sessão não perde o que
+    já foi aceito; o diário é reenviado no próximo envio.
+
+    A tabela local é 'WITHOUT ROWID', ordenada pela ChaveQuebrada e com a
+    ChaveCorreta na própria página da chave: 'consultar' e 'listar_por_prefixo'
+    (ex.: todas as chaves de um PROJETO) leem só as páginas necessárias.
+    """
+
+    def __init__(self, caminho: Optional[Path] = None):
+        self.caminho = Path(caminho or CONFIG.paths.mapa_correcoes_db)
+        self._mapa: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def obter_mapa(self) -> Dict[str, str]:
+        """Retorna o mapa {ChaveQuebrada: ChaveCorreta} sincronizado com o servidor."""
+        with self._lock:
+            modo = obter_modo_cache()
+            if modo == MODO_OFFLINE:
+                logger.info("Modo offline: usando a cópia local do mapa de correções sem sincronizar.")
+            else:
+                try:
+                    self._sincronizar(completo=(modo == MODO_REFRESH))
+                except Exception as e:
+                    logger.warning(
+                        "Não foi possível sincronizar '%s' (%s). Usando a cópia local do mapa de correções.",
+                        TABELA_MAPA_SERVIDOR, e,
+                    )
+            if self._mapa is None:
+                self._mapa = self._ler_mapa_local()
+            logger.info("%d correções disponíveis no mapa local.", len(self._mapa))
+            return dict(self._mapa)
+
+    def registrar(self, chave_quebrada: str, chave_correta: str) -> None:
+        """Grava na cópia local uma correção já persistida no servidor."""
+        with self._lock, closing(self._conectar()) as conn, conn:
+            # O balde fica nulo até a próxima sincronização trazer a linha do servidor.
+            conn.execute(
+                "INSERT OR REPLACE INTO correcoes (ChaveQuebrada, ChaveCorreta, Balde) VALUES (?, ?, NULL)",
+                (chave_quebrada, chave_correta),
+            )
+            if self._mapa is not None:
+                self._mapa[chave_quebrada] = chave_correta
+
+    def enfileirar(self, chave_quebrada: str, chave_correta: str) -> None:
+        """Aceita uma correção: grava na cópia local e no diário de pendentes, sem acessar o servidor."""
+        with self._lock, closing(self._conectar()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pendentes (ChaveQuebrada, ChaveCorreta) VALUES (?, ?)", (chave_quebrada, chave_correta)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO correcoes (ChaveQuebrada, ChaveCorreta, Balde) VALUES (?, ?, NULL)",
+                (chave_quebrada, chave_correta),
+            )
+            if self._mapa is not None:
+                self._mapa[chave_quebrada] = chave_correta
+
+    def total_pendentes(self) -> int:
+        """Quantidade de correções aceitas ainda não enviadas ao servidor."""
+        with closing(self._conectar()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM pendentes").fetchone()[0]
+
+    def enviar_pendentes(self) -> dict[str, int]:
+        """
+        Envia o diário de pendentes ao servidor numa única transação (tabela de
+        estágio + MERGE) e só então o esvazia. Retorna quantas linhas foram
+        inseridas e atualizadas no servidor.
+        """
+        with closing(self._conectar()) as conn:
+            pendentes = conn.execute("SELECT ChaveQuebrada, ChaveCorreta FROM pendentes ORDER BY ChaveQuebrada").fetchall()
+        if not pendentes:
+            return {"inseridas": 0, "atualizadas": 0}
+
+        engine = self._engine_servidor()
+        with engine.begin() as connection:
+            contagem = self._mesclar_no_servidor(connection, pendentes)
+        with self._lock, closing(self._conectar()) as conn, conn:
+            # Só sai do diário o que foi enviado; uma correção refeita durante o envio continua pendente.
+            conn.executemany("DELETE FROM pendentes WHERE ChaveQuebrada = ? AND ChaveCorreta = ?", pendentes)
+        logger.info(
+            "%d correções pendentes enviadas para %s: %d inseridas, %d atualizadas.",
+            len(pendentes), TABELA_MAPA_SERVIDOR, contagem["inseridas"], contagem["atualizadas"],
+        )
+        return contagem
+
+    def remover(self, chaves_quebradas: list[str]) -> None:
+        """Remove da cópia local correções já excluídas do servidor."""
+        with self._lock, closing(self._conectar()) as conn, conn:
+            conn.executemany("DELETE FROM correcoes WHERE ChaveQuebrada = ?", [(chave,) for chave in chaves_quebradas])
+            if self._mapa is not None:
+                for chave in chaves_quebradas:
+                    self._mapa.pop(chave, None)
+
+    def consultar(self, chave_quebrada: str) -> Optional[str]:
+        """Correção de uma única chave, lida direto do arquivo local."""
+        with closing(self._conectar()) as conn:
+            linha = conn.execute("SELECT ChaveCorreta FROM correcoes WHERE ChaveQuebrada = ?", (chave_quebrada,)).fetchone()
+        return linha[0] if linha else None
+
+    def consultar_total(self) -> int:
+        """Quantidade de correções na cópia local."""
+        with closing(self._conectar()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM correcoes").fetchone()[0]
+
+    def listar_por_prefixo(self, prefixo: str) -> Dict[str, str]:
+        """Correções cujas chaves quebradas começam por 'prefixo', em ordem, por varredura de faixa no índice."""
+        with closing(self._conectar()) as conn:
+            return dict(conn.execute(
+                "SELECT ChaveQuebrada, ChaveCorreta FROM correcoes WHERE ChaveQuebrada >= ? AND ChaveQuebrada < ? ORDER BY ChaveQuebrada",
+                (prefixo, prefixo + FIM_PREFIXO),
+            ))
+
+    def listar_por_projeto(self, projeto: str) -> Dict[str, str]:
+        """Correções de todas as chaves quebradas do PROJETO informado."""
+        return self.listar_por_prefixo(f"{projeto}|")
+
+    def importar_json(self, caminho: Path) -> int:
+        """Acrescenta (ou substitui) na cópia local as correções de um arquivo JSON {quebrada: correta}."""
+        with open(caminho, 'r', encoding='utf-8') as f:
+            mapa = json.load(f)
+        with self._lock, closing(self._conectar()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO correcoes (ChaveQuebrada, ChaveCorreta, Balde) VALUES (?, ?, NULL)", mapa.items()
+            )
+            self._mapa = None
+        logger.info("%d correções importadas de '%s' para a cópia local.", len(mapa), caminho)
+        return len(mapa)
+
+    def exportar_json(self, caminho: Path) -> int:
+        """Grava a cópia local em JSON (mesmo formato de dados/mapa_correcoes.json), lendo em ordem, sem montar o dict."""
+        total = 0
+        with open(caminho, 'w', encoding='utf-8') as f:
+            f.write("{")
+            for quebrada, correta in self._iterar_local():
+                f.write(("," if total else "") + f"\n    {json.dumps(quebrada, ensure_ascii=False)}: {json.dumps(correta, ensure_ascii=False)}")
+                total += 1
+            f.write("\n}" if total else "}")
+        logger.info("%d correções exportadas para '%s'.", total, caminho)
+        return total
+
+    def enviar_para_servidor(self, substituir: bool = False) -> int:
+        """
+        Grava a cópia local em dbo.MapaCorrecoesChaves: por MERGE (padrão) ou,
+        com substituir=True, apagando antes todo o conteúdo da tabela.
+        """
+        engine = self._engine_servidor()
+        total = 0
+        with engine.begin() as connection:
+            if not substituir:
+                contagem = self._mesclar_no_servidor(connection, self._iterar_local())
+                total = contagem["inseridas"] + contagem["atualizadas"]
+            else:
+                connection.execute(text(f"DELETE FROM {TABELA_MAPA_SERVIDOR}"))
+                comando = text(f"INSERT INTO {TABELA_MAPA_SERVIDOR} (ChaveQuebrada, ChaveCorreta) VALUES (:quebrada, :correta)")
+                for lote in _lotes(self._iterar_local()):
+                    connection.execute(comando, lote)
+                    total += len(lote)
+        logger.info("%d correções enviadas para %s.", total, TABELA_MAPA_SERVIDOR)
+        return total
+
+    def _sincronizar(self, completo: bool = False) -> None:
+        engine = self._engine_servidor()
+
+        baldes_servidor = self._consultar_baldes_servidor(engine)
+        baldes_locais = {} if completo else self._ler_baldes_locais()
+        alterados = sorted(
+            balde for balde in set(baldes_servidor) | set(baldes_locais)
+            if baldes_servidor.get(balde) != baldes_locais.get(balde)
+        )
+        if not alterados and not completo:
+            logger.info("Mapa de correções local já está sincronizado com o servidor.")
+            return
+
+        baixar = [balde for balde in alterados if balde in baldes_servidor]
+        df_linhas = self._baixar_baldes(engine, baixar) if baixar else pd.DataFrame(columns=["ChaveQuebrada", "ChaveCorreta", "Balde"])
+        with closing(self._conectar()) as conn, conn:
+            if completo:
+                conn.execute("DELETE FROM correcoes")
+            else:
+                conn.executemany("DELETE FROM correcoes WHERE Balde = ?", [(balde,) for balde in alterados])
+            conn.executemany(
+                "INSERT OR REPLACE INTO correcoes (ChaveQuebrada, ChaveCorreta, Balde) VALUES (?, ?, ?)",
+                [(quebrada, correta, int(balde)) for quebrada, correta, balde in df_linhas[["ChaveQuebrada", "ChaveCorreta", "Balde"]].itertuples(index=False, name=None)],
+            )
+            # Correções aceitas e ainda não enviadas prevalecem sobre o que veio do servidor.
+            conn.execute("INSERT OR REPLACE INTO correcoes (ChaveQuebrada, ChaveCorreta, Balde) SELECT ChaveQuebrada, ChaveCorreta, NULL FROM pendentes")
+            conn.execute("DELETE FROM baldes")
+            conn.executemany(
+                "INSERT INTO baldes (Balde, Linhas, Checksum) VALUES (?, ?, ?)",
+                [(balde, linhas, checksum) for balde, (linhas, checksum) in baldes_servidor.items()],
+            )
+        self._mapa = None
+        logger.info(
+            "Mapa de correções sincronizado: %d de %d baldes alterados, %d linhas baixadas.",
+            len(alterados), NUM_BALDES, len(df_linhas),
+        )
+
+    def _mesclar_no_servidor(self, connection, linhas) -> dict[str, int]:
+        """Carrega (quebrada, correta) na tabela de estágio e aplica um único MERGE no mapa do servidor."""
+        connection.execute(text(SQL_CRIAR_ESTAGIO))
+        for lote in _lotes(linhas):
+            connection.execute(text(SQL_INSERIR_ESTAGIO), lote)
+        acoes = [acao for (acao,) in connection.execute(text(SQL_MERGE_ESTAGIO))]
+        connection.execute(text(SQL_REMOVER_ESTAGIO))
+        return {"inseridas": acoes.count("INSERT"), "atualizadas": acoes.count("UPDATE")}
+
+    def _engine_servidor(self):
+        from config.database import get_conexao
+        return get_conexao(CONFIG.conexoes["FINANCA_SQL"])
+
+    def _consultar_baldes_servidor(self, engine) -> dict[int, tuple[int, int]]:
+        df = pd.read_sql(text(SQL_CHECKSUM_BALDES), engine)
+        return {
+            int(balde): (int(linhas), None if pd.isna(checksum) else int(checksum))
+            for balde, linhas, checksum in df[["Balde", "Linhas", "Checksum"]].itertuples(index=False, name=None)
+        }
+
+    def _baixar_baldes(self, engine, baldes: list[int]) -> pd.DataFrame:
+        consulta = text(SQL_LINHAS_DOS_BALDES).bindparams(bindparam("baldes", expanding=True))
+        return pd.read_sql(consulta, engine, params={"baldes": baldes})
+
+    def _ler_baldes_locais(self) -> dict[int, tuple[int, int]]:
+        with closing(self._conectar()) as conn:
+            return {balde: (linhas, checksum) for balde, linhas, checksum in conn.execute("SELECT Balde, Linhas, Checksum FROM baldes")}
+
+    def _ler_mapa_local(self) -> Dict[str, str]:
+        with closing(self._conectar()) as conn:
+            return dict(conn.execute("SELECT ChaveQuebrada, ChaveCorreta FROM correcoes"))
+
+    def _iterar_local(self) -> Iterator[tuple[str, str]]:
+        with closing(self._conectar()) as conn:
+            yield from conn.execute("SELECT ChaveQuebrada, ChaveCorreta FROM correcoes ORDER BY ChaveQuebrada")
+
+    def _conectar(self) -> sqlite3.Connection:
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.caminho)
+        conn.execute(f"PRAGMA mmap_size = {TAMANHO_MMAP}")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < VERSAO_ESQUEMA:
+            with conn:
+                conn.execute("DROP TABLE IF EXISTS correcoes")
+                conn.execute("DROP TABLE IF EXISTS baldes")
+                conn.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS correcoes (ChaveQuebrada TEXT PRIMARY KEY, ChaveCorreta TEXT NOT NULL, Balde INTEGER) WITHOUT ROWID"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS baldes (Balde INTEGER PRIMARY KEY, Linhas INTEGER NOT NULL, Checksum INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS pendentes (ChaveQuebrada TEXT PRIMARY KEY, ChaveCorreta TEXT NOT NULL) WITHOUT ROWID")
+        return conn
+
+
+def _lotes(linhas) -> Iterator[list[dict]]:
+    lote = []
+    for quebrada, correta in linhas:
+        lote.append({"quebrada": quebrada, "correta": correta})
+        if len(lote) == TAMANHO_LOTE_ENVIO:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# Instância compartilhada pelo processo (mapa em memória + cópia local em disco).
+REPOSITORIO_CORRECOES = RepositorioCorrecoes()
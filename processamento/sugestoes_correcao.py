@@ -0,0 +1,167 @@
+# processamento/sugestoes_correcao.py
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process, utils
+
+from config.config import CONFIG
+from processamento.chaves import SEPARADOR_CHAVE
+
+logger = logging.getLogger(__name__)
+
+# Campos comparados por similaridade; só concorrem as combinações do mesmo ANO da chave quebrada.
+CAMPOS_SUGESTAO = ["PROJETO", "ACAO", "UNIDADE"]
+SUGESTOES_POR_CHAVE = 5
+LIMIAR_PADRAO = 95
+# Chaves combinadas por vez contra todas as combinações válidas (limita a memória a bloco x combinações).
+TAMANHO_BLOCO = 256
+
+COLUNAS_SUGESTOES = ["ChaveQuebrada", "Posicao", "ChaveSugerida", "Pontuacao"] + [f"Pontuacao_{campo}" for campo in CAMPOS_SUGESTAO]
+
+
+def gerar_sugestoes(
+    chaves_com_falha: Iterable[str],
+    df_referencia: pd.DataFrame,
+    limite: int = SUGESTOES_POR_CHAVE,
+    workers: int = -1,
+) -> pd.DataFrame:
+    """
+    Ranqueia, para cada chave quebrada, as combinações PROJETO/ACAO/UNIDADE
+    existentes na referência de CC no mesmo ANO da chave: uma combinação que
+    só existe em outro ano não corrigiria a junção.
+
+    Cada campo é comparado uma única vez: valores quebrados distintos contra
+    valores válidos distintos, numa matriz calculada por 'rapidfuzz.process.cdist'
+    em todos os núcleos ('workers'). A pontuação de uma combinação é a média
+    das pontuações dos seus três campos (WRatio, 0 a 100), lida dessas matrizes.
+    """
+    chaves = sorted(set(chaves_com_falha))
+    registros, chaves_validas = [], []
+    for chave in chaves:
+        partes = chave.split(SEPARADOR_CHAVE) if isinstance(chave, str) else []
+        try:
+            if len(partes) != len(CAMPOS_SUGESTAO) + 1:
+                raise ValueError
+            registros.append(partes[:-1] + [int(partes[-1])])
+        except ValueError:
+            logger.warning("Chave '%s' está em um formato inválido e não receberá sugestões.", chave)
+            continue
+        chaves_validas.append(chave)
+    df_chaves = pd.DataFrame(registros, columns=CAMPOS_SUGESTAO + ["ANO"])
+    combinacoes = df_referencia[CAMPOS_SUGESTAO + ["ANO"]].astype(object).dropna().drop_duplicates().reset_index(drop=True)
+    combinacoes["ANO"] = combinacoes["ANO"].astype("int64")
+    if df_chaves.empty or combinacoes.empty:
+        return pd.DataFrame(columns=COLUNAS_SUGESTOES)
+
+    codigos_quebrados, codigos_validos, matrizes = {}, {}, {}
+    for campo in CAMPOS_SUGESTAO:
+        codigos_quebrados[campo], quebrados = pd.factorize(df_chaves[campo])
+        codigos_validos[campo], validos = pd.factorize(combinacoes[campo])
+        matrizes[campo] = process.cdist(
+            list(quebrados), list(validos), scorer=fuzz.WRatio, processor=utils.default_process,
+            dtype=np.uint8, workers=workers,
+        )
+
+    resultados, sem_ano_na_referencia = [], 0
+    combinacoes_por_ano = combinacoes.groupby("ANO", sort=False).indices
+    for ano, linhas_chaves in df_chaves.groupby("ANO", sort=True).indices.items():
+        linhas_combinacoes = combinacoes_por_ano.get(ano)
+        if linhas_combinacoes is None:
+            sem_ano_na_referencia += len(linhas_chaves)
+            continue
+        resultados += _ranquear_no_ano(
+            linhas_chaves, linhas_combinacoes, combinacoes, np.asarray(chaves_validas, dtype=object),
+            codigos_quebrados, codigos_validos, matrizes, min(limite, len(linhas_combinacoes)), ano,
+        )
+    if sem_ano_na_referencia:
+        logger.warning("%d chaves têm um ANO sem nenhuma combinação na referência e não receberão sugestões.", sem_ano_na_referencia)
+    if not resultados:
+        return pd.DataFrame(columns=COLUNAS_SUGESTOES)
+
+    df_sugestoes = pd.concat(resultados, ignore_index=True)[COLUNAS_SUGESTOES]
+    df_sugestoes = df_sugestoes.sort_values(["ChaveQuebrada", "Posicao"], kind="stable").reset_index(drop=True)
+    logger.info(
+        "Sugestões calculadas para %d chaves contra %d combinações válidas da referência.",
+        len(chaves_validas), len(combinacoes),
+    )
+    return df_sugestoes
+
+
+def _ranquear_no_ano(
+    linhas_chaves: np.ndarray,
+    linhas_combinacoes: np.ndarray,
+    combinacoes: pd.DataFrame,
+    chaves: np.ndarray,
+    codigos_quebrados: dict,
+    codigos_validos: dict,
+    matrizes: dict,
+    limite: int,
+    ano: int,
+) -> list[pd.DataFrame]:
+    """As 'limite' melhores combinações do ano ('linhas_combinacoes') para cada chave quebrada desse ano, em blocos."""
+    resultados = []
+    for inicio in range(0, len(linhas_chaves), TAMANHO_BLOCO):
+        bloco = linhas_chaves[inicio:inicio + TAMANHO_BLOCO]
+        pontuacoes_campos = {
+            campo: matrizes[campo][np.ix_(codigos_quebrados[campo][bloco], codigos_validos[campo][linhas_combinacoes])]
+            for campo in CAMPOS_SUGESTAO
+        }
+        total = sum(pontuacao.astype(np.float32) for pontuacao in pontuacoes_campos.values()) / len(CAMPOS_SUGESTAO)
+        melhores = np.argpartition(-total, limite - 1, axis=1)[:, :limite]
+        linhas = np.arange(len(total))[:, None]
+        # Ordem final: maior pontuação primeiro; empates pela ordem da referência.
+        ordem = np.lexsort((melhores, -total[linhas, melhores]), axis=1)
+        melhores = np.take_along_axis(melhores, ordem, axis=1)
+
+        resultado = pd.DataFrame({
+            "ChaveQuebrada": chaves[np.repeat(bloco, limite)],
+            "Posicao": np.tile(np.arange(1, limite + 1), len(total)),
+            "Pontuacao": np.round(total[linhas, melhores].reshape(-1), 1),
+        })
+        sugeridas = combinacoes.iloc[linhas_combinacoes[melhores.reshape(-1)]]
+        resultado["ChaveSugerida"] = [
+            SEPARADOR_CHAVE.join((projeto, acao, unidade, str(ano)))
+            for projeto, acao, unidade in zip(sugeridas["PROJETO"], sugeridas["ACAO"], sugeridas["UNIDADE"])
+        ]
+        for campo in CAMPOS_SUGESTAO:
+            resultado[f"Pontuacao_{campo}"] = pontuacoes_campos[campo][linhas, melhores].reshape(-1)
+        resultados.append(resultado)
+    return resultados
+
+
+def selecionar_correcoes_automaticas(df_sugestoes: pd.DataFrame, limiar: float = LIMIAR_PADRAO) -> Dict[str, str]:
+    """
+    Retorna {ChaveQuebrada: ChaveSugerida} para as chaves cuja melhor sugestão
+    atinge 'limiar' e é única (sem empate com a segunda colocada).
+    """
+    if df_sugestoes.empty:
+        return {}
+    primeiras = df_sugestoes[df_sugestoes["Posicao"] == 1].set_index("ChaveQuebrada")
+    segundas = df_sugestoes[df_sugestoes["Posicao"] == 2].set_index("ChaveQuebrada")["Pontuacao"]
+    segunda_pontuacao = segundas.reindex(primeiras.index).fillna(-1)
+    aceitas = primeiras[
+        (primeiras["Pontuacao"] >= limiar)
+        & (primeiras["Pontuacao"] > segunda_pontuacao)
+        & (primeiras["ChaveSugerida"] != primeiras.index)
+    ]
+    return aceitas["ChaveSugerida"].to_dict()
+
+
+def salvar_sugestoes(df_sugestoes: pd.DataFrame, caminho: Optional[Path] = None) -> Path:
+    """Grava o ranking de sugestões (parquet) para consulta posterior ou revisão."""
+    caminho = Path(caminho or CONFIG.paths.sugestoes_correcao)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    df_sugestoes.to_parquet(caminho, index=False)
+    logger.info("%d sugestões gravadas em '%s'.", len(df_sugestoes), caminho)
+    return caminho
+
+
+def carregar_sugestoes(caminho: Optional[Path] = None) -> pd.DataFrame:
+    """Lê o ranking gravado por 'salvar_sugestoes'; vazio se o arquivo não existir."""
+    caminho = Path(caminho or CONFIG.paths.sugestoes_correcao)
+    if not caminho.exists():
+        return pd.DataFrame(columns=COLUNAS_SUGESTOES)
+    return pd.read_parquet(caminho)
@@ -1,32 +1,29 @@
 # processamento/validacao.py
 import json
 import logging
+import numpy as np
 import pandas as pd
-from sqlalchemy.exc import ProgrammingError
 from typing import Dict
 
-from config.config import CONFIG
+from processamento.chaves import CodificadorChaves, normalizar_chave_texto, obter_codificador
+from processamento.esquema import atribuir_valores, normalizar_texto, transformar_texto
+from processamento.regras_correcao import RegrasCorrecao
 
 logger = logging.getLogger(__name__)
 
+# Campos que compõem a chave de correção, na ordem em que aparecem em 'PROJETO|ACAO|UNIDADE|ANO'
+COLUNAS_CHAVE_CORRECAO = ['PROJETO', 'ACAO', 'UNIDADE', 'ANO']
+
 # --- FUNÇÕES MODIFICADAS ---
 
 def carregar_mapa_correcoes() -> Dict[str, str]:
-    from config.database import get_conexao
-    logger.info("Carregando mapa de correções do SQL Server...")
-    engine = get_conexao(CONFIG.conexoes["FINANCA_SQL"])
-    try:
-        query = "SELECT ChaveQuebrada, ChaveCorreta FROM dbo.MapaCorrecoesChaves"
-        df_mapa = pd.read_sql(query, engine)
-        if df_mapa.empty:
-            logger.info("Nenhuma correção encontrada na tabela 'MapaCorrecoesChaves'.")
-            return {}
-        mapa = pd.Series(df_mapa.ChaveCorreta.values, index=df_mapa.ChaveQuebrada).to_dict()
-        logger.info(f"{len(mapa)} correções carregadas do banco de dados.")
-        return mapa
-    except (ProgrammingError, Exception) as e:
-        logger.warning("Tabela 'MapaCorrecoesChaves' não encontrada. Continuando com mapa vazio. Erro: %s", e)
-        return {}
+    """
+    Retorna o mapa {ChaveQuebrada: ChaveCorreta} a partir da cópia local de
+    dbo.MapaCorrecoesChaves, que só baixa do servidor as correções novas ou
+    alteradas desde a última chamada.
+    """
+    from processamento.repositorio_correcoes import REPOSITORIO_CORRECOES
+    return REPOSITORIO_CORRECOES.obter_mapa()
 
 def preparar_dados_para_validacao(
     df_raw: pd.DataFrame, chaves_base: list[str], incluir_ano_na_chave: bool = False
@@ -56,46 +53,98 @@ def preparar_dados_para_validacao(
             # Este erro agora indicaria um problema mais sério
             raise KeyError(f"Coluna essencial '{col}' não encontrada após a preparação inicial.")
         if col != 'ANO':
-            df[col] = df[col].astype(str).str.strip().fillna('N/A')
+            df[col] = normalizar_texto(df[col])
 
     df['ANO'] = pd.to_numeric(df['ANO'], errors='coerce').fillna(0).astype(int)
     
-    df['CHAVE_CONCAT'] = (
-        df[chaves_base].agg('|'.join, axis=1) + '|' + df['ANO'].astype(str)
-    )
+    # Chave composta codificada em int64; o texto 'PROJETO|ACAO|UNIDADE|ANO' só é
+    # montado quando necessário (obter_codificador().decodificar).
+    df['CHAVE_COD'] = obter_codificador().codificar(df)
     
     return df
 
 # --- FUNÇÕES ORIGINAIS (SEM ALTERAÇÃO) ---
 
-def aplicar_mapa_correcoes(df: pd.DataFrame, mapa_correcoes: Dict[str, str]) -> pd.DataFrame:
+def aplicar_mapa_correcoes(
+    df: pd.DataFrame, mapa_correcoes: Dict[str, str], codificador: CodificadorChaves | None = None
+) -> pd.DataFrame:
+    """
+    Substitui PROJETO, ACAO, UNIDADE e ANO das linhas cuja chave está no mapa
+    de correções. As chaves quebradas do mapa são codificadas e localizadas
+    pela CHAVE_COD, que continua representando a chave original da linha.
+    Entradas com curinga ('*') são regras por campo (ver regras_correcao) e
+    valem para as linhas que nenhuma correção de chave inteira alcançou.
+    """
     if not mapa_correcoes:
-        df['CHAVE_CONCAT_original'] = df['CHAVE_CONCAT']
         return df
     
     df_copy = df.copy()
-    df_copy['CHAVE_CONCAT_original'] = df_copy['CHAVE_CONCAT']
+    codificador = codificador or obter_codificador()
+    regras = RegrasCorrecao.do_mapa(mapa_correcoes)
     
-    linhas_para_corrigir_idx = df_copy.index[df_copy['CHAVE_CONCAT'].isin(mapa_correcoes.keys())]
-    if not linhas_para_corrigir_idx.empty:
-        logger.info("Aplicando %d correções conhecidas em %d linhas...", len(mapa_correcoes), len(linhas_para_corrigir_idx))
+    linhas_corrigidas = np.zeros(len(df_copy), dtype=bool)
+    if regras.excecoes:
+        df_mapa = preparar_mapa_correcoes(regras.excecoes)
+        codigos_mapa = pd.Index(codificador.codificar_textos(df_mapa.index))
+        # Chaves com valores desconhecidos não ocorrem nos dados; as repetidas mantêm a primeira correção.
+        entradas_validas = (codigos_mapa >= 0) & ~codigos_mapa.duplicated()
+        df_mapa, codigos_mapa = df_mapa[entradas_validas], codigos_mapa[entradas_validas]
         
-        def aplicar_correcao_linha(row):
-            chave_original = row['CHAVE_CONCAT']
-            chave_corrigida_str = mapa_correcoes.get(chave_original)
-            if chave_corrigida_str:
-                try:
-                    partes = chave_corrigida_str.split('|')
-                    row['PROJETO'], row['ACAO'], row['UNIDADE'], row['ANO'] = partes[0], partes[1], partes[2], int(partes[3])
-                except (IndexError, ValueError) as e:
-                    logger.error("Erro ao desmontar chave corrigida '%s': %s", chave_corrigida_str, e)
-            return row
-            
-        df_copy.loc[linhas_para_corrigir_idx] = df_copy.loc[linhas_para_corrigir_idx].apply(aplicar_correcao_linha, axis=1)
+        posicoes = codigos_mapa.get_indexer(df_copy['CHAVE_COD'])
+        linhas_corrigidas = posicoes >= 0
+        if linhas_corrigidas.any():
+            logger.info("Aplicando %d correções conhecidas em %d linhas...", len(regras.excecoes), int(linhas_corrigidas.sum()))
+            posicoes_validas = posicoes[linhas_corrigidas]
+            for coluna in COLUNAS_CHAVE_CORRECAO:
+                atribuir_valores(df_copy, linhas_corrigidas, coluna, df_mapa[coluna].to_numpy()[posicoes_validas])
+    
+    linhas_por_regra = regras.aplicar(df_copy, ~linhas_corrigidas)
+    if linhas_por_regra.any():
+        logger.info("Regras por campo corrigiram %d linhas.", int(linhas_por_regra.sum()))
+    
+    if linhas_corrigidas.any() or linhas_por_regra.any():
         df_copy['ANO'] = df_copy['ANO'].astype(int)
         
     return df_copy
 
+def preparar_mapa_correcoes(mapa_correcoes: Dict[str, str]) -> pd.DataFrame:
+    """
+    Desmonta cada chave corrigida ('PROJETO|ACAO|UNIDADE|ANO') uma única vez,
+    retornando um DataFrame indexado pela chave quebrada. Entradas com a chave
+    corrigida malformada são descartadas e registradas no log.
+    """
+    chaves_quebradas, partes_corrigidas = [], []
+    for chave_quebrada, chave_corrigida_str in mapa_correcoes.items():
+        try:
+            partes = chave_corrigida_str.split('|')
+            partes_corrigidas.append((partes[0], partes[1], partes[2], int(partes[3])))
+            chaves_quebradas.append(chave_quebrada)
+        except (IndexError, ValueError, AttributeError) as e:
+            logger.error("Erro ao desmontar chave corrigida '%s': %s", chave_corrigida_str, e)
+    return pd.DataFrame(partes_corrigidas, columns=COLUNAS_CHAVE_CORRECAO, index=pd.Index(chaves_quebradas, name='CHAVE_CONCAT'))
+
+def classificar_correcoes_para_normalizacao(mapa_correcoes: Dict[str, str]) -> Dict[str, list[str]]:
+    """
+    Classifica as entradas do mapa sob chaves normalizadas (--normalizar-chaves):
+    - 'redundantes': a chave quebrada e a correta só diferem em maiúsculas, acentos ou espaços;
+    - 'duplicadas': a chave quebrada normalizada já aparece em outra entrada com o mesmo destino;
+    - 'conflitantes': a chave quebrada normalizada aparece com destinos diferentes (não são podadas).
+    Retorna as chaves quebradas de cada grupo.
+    """
+    classificacao = {'redundantes': [], 'duplicadas': [], 'conflitantes': []}
+    destinos: Dict[str, str] = {}
+    for chave_quebrada, chave_correta in mapa_correcoes.items():
+        quebrada_norm, correta_norm = normalizar_chave_texto(chave_quebrada), normalizar_chave_texto(chave_correta)
+        if quebrada_norm == correta_norm:
+            classificacao['redundantes'].append(chave_quebrada)
+        elif quebrada_norm not in destinos:
+            destinos[quebrada_norm] = correta_norm
+        elif destinos[quebrada_norm] == correta_norm:
+            classificacao['duplicadas'].append(chave_quebrada)
+        else:
+            classificacao['conflitantes'].append(chave_quebrada)
+    return classificacao
+
 def _renomear_colunas_orcado_fonte(df: pd.DataFrame) -> pd.DataFrame:
     mapa_renomear = {
         '[Iniciativa].[Iniciativas].[Iniciativa].[MEMBER_CAPTION]': 'PROJETO',
@@ -110,7 +159,7 @@ def _renomear_colunas_orcado_fonte(df: pd.DataFrame) -> pd.DataFrame:
     }
     df_renomeado = df.rename(columns=mapa_renomear)
     if 'UNIDADE' in df_renomeado.columns:
-        df_renomeado['UNIDADE'] = df_renomeado['UNIDADE'].str.replace('SP - ', '', regex=False)
+        df_renomeado['UNIDADE'] = transformar_texto(df_renomeado['UNIDADE'], lambda textos: textos.str.replace('SP - ', '', regex=False))
     return df_renomeado
 
 def _criar_coluna_ano_em_cc(df: pd.DataFrame) -> pd.DataFrame:
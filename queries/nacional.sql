@@ -1 +1,24 @@
-SELECT * FROM FATOAJUSTADONACIONAL
\ No newline at end of file
+-- Orçado Nacional: projeta apenas as colunas usadas no pipeline e soma o
+-- ValorAjustado no grão final (Projeto, Ação, Unidade, Ano, Mês, PPA, Natureza)
+-- antes da transferência. Os nomes de coluna da origem são mantidos, pois são
+-- renomeados em validacao._renomear_colunas_orcado_fonte.
+SELECT
+    [[Iniciativa]].[Iniciativas]].[Iniciativa]].[MEMBER_CAPTION]]],
+    [[Ação]].[Ação]].[Nome de Ação]].[MEMBER_CAPTION]]],
+    [[Unidade Organizacional de Ação]].[Unidade Organizacional de Ação]].[Nome de Unidade Organizacional de Ação]].[MEMBER_CAPTION]]],
+    [[Tempo]].[Ano]].[Número Ano]].[MEMBER_CAPTION]]],
+    [[Tempo]].[Mês]].[Número Mês]].[MEMBER_CAPTION]]],
+    [[PPA]].[PPA com Fotografia]].[Descrição de PPA com Fotografia]].[MEMBER_CAPTION]]],
+    [[Natureza Orçamentária]].[Código Estruturado 4 nível]].[Código Estruturado 4 nível]].[MEMBER_CAPTION]]],
+    [[Natureza Orçamentária]].[Descrição de Natureza 4 nível]].[Descrição de Natureza 4 nível]].[MEMBER_CAPTION]]],
+    SUM([[Measures]].[ValorAjustado]]]) AS [[Measures]].[ValorAjustado]]]
+FROM FATOAJUSTADONACIONAL
+GROUP BY
+    [[Iniciativa]].[Iniciativas]].[Iniciativa]].[MEMBER_CAPTION]]],
+    [[Ação]].[Ação]].[Nome de Ação]].[MEMBER_CAPTION]]],
+    [[Unidade Organizacional de Ação]].[Unidade Organizacional de Ação]].[Nome de Unidade Organizacional de Ação]].[MEMBER_CAPTION]]],
+    [[Tempo]].[Ano]].[Número Ano]].[MEMBER_CAPTION]]],
+    [[Tempo]].[Mês]].[Número Mês]].[MEMBER_CAPTION]]],
+    [[PPA]].[PPA com Fotografia]].[Descrição de PPA com Fotografia]].[MEMBER_CAPTION]]],
+    [[Natureza Orçamentária]].[Código Estruturado 4 nível]].[Código Estruturado 4 nível]].[MEMBER_CAPTION]]],
+    [[Natureza Orçamentária]].[Descrição de Natureza 4 nível]].[Descrição de Natureza 4 nível]].[MEMBER_CAPTION]]]
@@ -1,5 +1,28 @@
 import pytest
 import pandas as pd
+from sqlalchemy import create_engine, event
+
+from config.config import CONFIG
+
+
+@pytest.fixture(autouse=True)
+def cache_consultas_temporario(tmp_path, monkeypatch):
+    """Isola o cache de resultados de consultas em uma pasta temporária por teste."""
+    monkeypatch.setattr(CONFIG.paths, "cache_consultas_dir", tmp_path / "consultas")
+    return CONFIG.paths.cache_consultas_dir
+
+
+@pytest.fixture
+def engine_dbo(tmp_path):
+    """SQLite com um banco anexado como 'dbo', para as tabelas gravadas com schema='dbo'."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'financa.db'}")
+
+    @event.listens_for(engine, "connect")
+    def anexar_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    return engine
+
 
 @pytest.fixture
 def sample_df_unidade() -> pd.DataFrame:
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+from processamento.alocacao_comprometido import (
+    POLITICA_PROPORCIONAL, POLITICA_REJEITAR, ReferenciaComprometido, alocar_comprometido, calcular_pesos_orcado,
+)
+
+
+@pytest.fixture
+def referencia():
+    df_cc = pd.DataFrame({
+        'PROJETO': ['P1', 'P2', 'P2', 'P3'],
+        'ACAO': ['A1', 'A2', 'A2', 'A3'],
+        'UNIDADE': ['U', 'U', 'U', 'U'],
+        'CODCCUSTO': ['1.01.01', '1.01.02', '1.01.02', '1.02.01'],
+        'ANO': [2025, 2025, 2025, 2025],
+    })
+    return ReferenciaComprometido.da_referencia(df_cc)
+
+
+def _comprometido():
+    return pd.DataFrame({
+        'CODCCUSTO': ['1.01', '1.01 ', '1.01', '1.02', '9.99'],
+        'ANO': [2025] * 5,
+        'MES': [1, 1, 2, 1, 1],
+        'COMPROMETIDO': [10.0, 30.0, 5.0, 7.0, 100.0],
+    })
+
+
+def test_primeiro_filho_agrega_e_nao_duplica_valores(referencia):
+    resultado = alocar_comprometido(_comprometido(), referencia)
+
+    assert len(resultado) == 3
+    assert resultado['COMPROMETIDO'].sum() == pytest.approx(52.0)
+    assert resultado[['CODCCUSTO', 'MES', 'COMPROMETIDO']].values.tolist() == [
+        ['1.01.01', 1, 40.0], ['1.01.01', 2, 5.0], ['1.02.01', 1, 7.0],
+    ]
+    assert resultado['PROJETO'].tolist() == ['P1', 'P1', 'P3']
+
+
+def test_rejeitar_descarta_cc_truncado_ambiguo(referencia):
+    resultado = alocar_comprometido(_comprometido(), referencia, politica=POLITICA_REJEITAR)
+
+    assert resultado[['CODCCUSTO', 'COMPROMETIDO']].values.tolist() == [['1.02.01', 7.0]]
+
+
+def test_proporcional_rateia_pelo_orcado(referencia):
+    df_orcado = pd.DataFrame({
+        'CODCCUSTO': ['1.01.01', '1.01.02', '1.01.02', None],
+        'ANO': [2025] * 4,
+        'Valor_Ajustado': [100.0, 200.0, 100.0, 50.0],
+    })
+
+    resultado = alocar_comprometido(_comprometido(), referencia, politica=POLITICA_PROPORCIONAL, pesos_orcado=calcular_pesos_orcado(df_orcado))
+
+    assert resultado['COMPROMETIDO'].sum() == pytest.approx(52.0)
+    por_cc = resultado[resultado['MES'] == 1].groupby('CODCCUSTO')['COMPROMETIDO'].sum()
+    # 40 do CC truncado 1.01 rateados 1:3; 1.02 não tem Orçado e vai para o primeiro CC.
+    assert por_cc.to_dict() == pytest.approx({'1.01.01': 10.0, '1.01.02': 30.0, '1.02.01': 7.0})
+
+
+def test_politica_desconhecida(referencia):
+    with pytest.raises(ValueError):
+        alocar_comprometido(_comprometido(), referencia, politica='duplicar')
+
+
+def test_primeiro_filho_nao_depende_da_ordem_da_referencia(referencia):
+    df_cc = pd.DataFrame({
+        'PROJETO': ['P3', 'P2', 'P1', 'P2'],
+        'ACAO': ['A3', 'A2', 'A1', 'A2'],
+        'UNIDADE': ['U', 'U', 'U', 'U'],
+        'CODCCUSTO': ['1.02.01', '1.01.02', '1.01.01', '1.01.02'],
+        'ANO': [2025, 2025, 2025, 2024],
+    })
+    invertida = ReferenciaComprometido.da_referencia(df_cc)
+
+    esperado = alocar_comprometido(_comprometido(), referencia)
+    pd.testing.assert_frame_equal(alocar_comprometido(_comprometido(), invertida), esperado)
+    assert esperado['CODCCUSTO'].tolist() == ['1.01.01', '1.01.01', '1.02.01']
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from config.config import CONFIG
+from processamento import cache_consultas
+from processamento.cache_consultas import (
+    MODO_NORMAL, MODO_OFFLINE, MODO_REFRESH, calcular_fingerprint, definir_modo_cache, obter_com_cache,
+)
+
+
+@pytest.fixture(autouse=True)
+def modo_normal():
+    definir_modo_cache(MODO_NORMAL)
+    yield
+    definir_modo_cache(MODO_NORMAL)
+
+
+def test_fingerprint_considera_sql_parametros_e_conexao():
+    base = calcular_fingerprint("SELECT 1", "FINANCA_SQL", (2025,))
+    assert base == calcular_fingerprint("SELECT 1 ", "FINANCA_SQL", (2025,))
+    assert base != calcular_fingerprint("SELECT 1", "FINANCA_SQL", (2024,))
+    assert base != calcular_fingerprint("SELECT 1", "HubDados", (2025,))
+
+
+def test_obter_com_cache_reutiliza_resultado_e_respeita_refresh(mocker):
+    carregador = mocker.Mock(return_value=pd.DataFrame({'A': [1, 2]}))
+
+    primeiro = obter_com_cache("comprometido", "SELECT A", "FINANCA_SQL", carregador)
+    segundo = obter_com_cache("comprometido", "SELECT A", "FINANCA_SQL", carregador)
+    assert carregador.call_count == 1
+    pd.testing.assert_frame_equal(primeiro, segundo)
+
+    definir_modo_cache(MODO_REFRESH)
+    obter_com_cache("comprometido", "SELECT A", "FINANCA_SQL", carregador)
+    assert carregador.call_count == 2
+
+
+def test_obter_com_cache_expira_pelo_ttl_mas_serve_expirado_offline(mocker, monkeypatch):
+    monkeypatch.setitem(CONFIG.cache_ttl_horas, "comprometido", 0)
+    # Relógio parado: as duas chamadas caem no mesmo tique (idade 0), como no Windows.
+    monkeypatch.setattr("processamento.cache_consultas.time.time", lambda: 1_700_000_000.0)
+    carregador = mocker.Mock(return_value=pd.DataFrame({'A': [1]}))
+
+    obter_com_cache("comprometido", "SELECT A", "FINANCA_SQL", carregador)
+    obter_com_cache("comprometido", "SELECT A", "FINANCA_SQL", carregador)
+    assert carregador.call_count == 2
+
+    definir_modo_cache(MODO_OFFLINE)
+    assert obter_com_cache("comprometido", "SELECT A", "FINANCA_SQL", carregador)['A'].tolist() == [1]
+    with pytest.raises(FileNotFoundError):
+        obter_com_cache("comprometido", "SELECT B", "FINANCA_SQL", carregador)
+    assert carregador.call_count == 2
+
+
+def test_limite_de_tamanho_remove_entradas_menos_usadas(monkeypatch):
+    monkeypatch.setattr(CONFIG, "cache_consultas_max_mb", 0)
+
+    obter_com_cache("comprometido", "SELECT A", "FINANCA_SQL", lambda: pd.DataFrame({'A': [1]}))
+
+    indice = cache_consultas._carregar_indice(CONFIG.paths.cache_consultas_dir)
+    assert indice == {}
+    assert not list(CONFIG.paths.cache_consultas_dir.glob("*.pkl"))
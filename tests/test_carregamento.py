@@ -0,0 +1,120 @@
+import pandas as pd
+from sqlalchemy import create_engine, inspect, types
+
+from comunicacao.carregamento import (
+    LIMITE_BYTES_CHAVE_INDICE, anexar_em_tabela_de_estagio, gravar_em_lotes, indexar_chave, mapear_tipos_sql,
+    montar_consulta_agregacao_estagio,
+)
+from processamento.deduplicacao import deduplicar_no_grao
+from processamento.esquema import aplicar_esquema
+
+CHAVE = ['ANO', 'MES', 'CODCCUSTO']
+
+
+def _resultado():
+    return aplicar_esquema(pd.DataFrame({
+        'ANO': [2025, 2025, 2025, 2024, 2024],
+        'MES': [1, 2, 3, 1, 2],
+        'CODCCUSTO': ['1.01.001', '1.01.002', '1.01.001', '2.01', '2.01'],
+        'UNIDADE': ['Unidade 1', 'Unidade 1', 'Unidade Longa' * 10, None, 'Unidade 2'],
+        'Valor_Ajustado': [1.5, 2.0, 3.0, 4.0, 5.0],
+    }))
+
+
+def test_tipos_derivados_do_dataframe():
+    tipos = mapear_tipos_sql(_resultado(), create_engine("sqlite://"))
+
+    assert isinstance(tipos['ANO'], types.SmallInteger) and isinstance(tipos['MES'], types.SmallInteger)
+    assert isinstance(tipos['Valor_Ajustado'], types.Float) and tipos['Valor_Ajustado'].precision == 53
+    assert isinstance(tipos['CODCCUSTO'], types.NVARCHAR) and tipos['CODCCUSTO'].length == 50
+    assert tipos['UNIDADE'].length == 130
+    assert isinstance(mapear_tipos_sql(pd.DataFrame({'TEXTO': ['x' * 5000]}), create_engine("sqlite://"))['TEXTO'], types.UnicodeText)
+
+
+def test_tabelas_persistentes_tem_textos_de_largura_fixa():
+    # O tamanho não vem dos dados: um lote ou carga seguinte com textos mais longos precisa caber.
+    tipos = mapear_tipos_sql(_resultado().head(2), create_engine("sqlite://"), chave_primaria=CHAVE, persistente=True)
+
+    # ANO e MES ocupam 2 bytes cada; o resto do limite do índice fica com o único texto da chave.
+    assert isinstance(tipos['CODCCUSTO'], types.NVARCHAR) and tipos['CODCCUSTO'].length == 448
+    assert isinstance(tipos['UNIDADE'], types.UnicodeText)
+    assert isinstance(tipos['ANO'], types.SmallInteger)
+
+
+def test_chave_final_inteira_cabe_no_indice():
+    chave = ['ANO', 'MES', 'CODCCUSTO', 'PROJETO', 'ACAO', 'Codigo_Natureza_Orcamentaria']
+    df = aplicar_esquema(pd.DataFrame({
+        'ANO': [2025], 'MES': [1], 'CODCCUSTO': ['1.01'], 'PROJETO': ['P'], 'ACAO': ['A'], 'Codigo_Natureza_Orcamentaria': ['3.1'],
+    }))
+
+    tipos = mapear_tipos_sql(df, create_engine("sqlite://"), chave_primaria=chave, persistente=True)
+
+    larguras = [tipos[col].length for col in chave[2:]]
+    assert len(set(larguras)) == 1
+    assert sum(2 * largura for largura in larguras) <= LIMITE_BYTES_CHAVE_INDICE - 4
+    # Uma chave declarada acima do limite não é indexada (o SQL Server só avisaria no CREATE INDEX).
+    with create_engine("sqlite://").begin() as connection:
+        df.to_sql('#LARGA', connection, index=False)
+        assert not indexar_chave('#LARGA', connection, chave, {**tipos, 'PROJETO': types.NVARCHAR(450)})
+
+
+def test_tipos_reaproveitados_da_tabela_de_destino(engine_dbo):
+    _resultado().head(0).to_sql(
+        'DESTINO', engine_dbo, schema='dbo', index=False,
+        dtype={'ANO': types.BigInteger(), 'CODCCUSTO': types.NVARCHAR(5), 'UNIDADE': types.Text()},
+    )
+
+    tipos = mapear_tipos_sql(_resultado(), engine_dbo, 'DESTINO')
+
+    assert isinstance(tipos['ANO'], types.BigInteger)
+    # Textos vêm sempre dos dados: o NVARCHAR(5) do destino truncaria a temporária.
+    assert tipos['CODCCUSTO'].length == 50
+    assert isinstance(tipos['UNIDADE'], types.NVARCHAR) and tipos['UNIDADE'].length == 130
+
+
+def test_gravacao_em_lotes_e_indice_da_chave():
+    engine = create_engine("sqlite://")
+    df = _resultado()
+    tipos = mapear_tipos_sql(df, engine)
+
+    with engine.begin() as connection:
+        vazao = gravar_em_lotes(df, '#ESTAGIO', connection, tipos, tamanho_lote=2)
+        assert indexar_chave('#ESTAGIO', connection, CHAVE, tipos)
+        assert not indexar_chave('#ESTAGIO', connection, ['UNIDADE'], {'UNIDADE': types.UnicodeText()})
+
+    assert vazao > 0
+    assert len(pd.read_sql_table('#ESTAGIO', engine)) == len(df)
+    assert [indice['column_names'] for indice in inspect(engine).get_indexes('#ESTAGIO')] == [CHAVE]
+
+
+def test_estagio_criado_com_tipos_e_acrescentado(engine_dbo):
+    df = _resultado()
+    anexar_em_tabela_de_estagio(df.head(2), 'ESTAGIO_LOTES', engine_dbo, substituir=True, chave_primaria=CHAVE)
+    anexar_em_tabela_de_estagio(df.tail(3), 'ESTAGIO_LOTES', engine_dbo, chave_primaria=CHAVE)
+
+    colunas = {col['name']: col['type'] for col in inspect(engine_dbo).get_columns('ESTAGIO_LOTES', schema='dbo')}
+    assert isinstance(colunas['CODCCUSTO'], types.NVARCHAR) and colunas['CODCCUSTO'].length == 448
+    assert isinstance(colunas['UNIDADE'], types.TEXT)
+    assert isinstance(colunas['MES'], types.SMALLINT)
+    assert len(pd.read_sql_table('ESTAGIO_LOTES', engine_dbo, schema='dbo')) == len(df)
+
+
+def test_grao_duplicado_entre_lotes_consolidado_como_na_carga_completa(engine_dbo):
+    chave = ['ANO', 'MES', 'CODCCUSTO', 'PROJETO', 'ACAO', 'Codigo_Natureza_Orcamentaria']
+    colunas = chave + ['UNIDADE', 'Valor_Ajustado']
+    df = aplicar_esquema(pd.DataFrame({
+        'ANO': [2025] * 5, 'MES': [1, 1, 2, 1, 1], 'CODCCUSTO': ['1.01', '1.02', '1.01', '1.01', '1.02'],
+        'PROJETO': ['P'] * 5, 'ACAO': ['A'] * 5, 'Codigo_Natureza_Orcamentaria': ['3.1'] * 5,
+        'UNIDADE': ['U1', 'U2', 'U1', 'U1', 'U2'], 'Valor_Ajustado': [10.0, 1.0, 7.0, 5.0, 2.0],
+    }))
+    esperado, _ = deduplicar_no_grao(df, chave, colunas)
+
+    # Cada lote é deduplicado sozinho; as chaves (2025, 1, '1.01') e (2025, 1, '1.02') se repetem entre os lotes.
+    for numero_lote, df_lote in enumerate([df.iloc[:3], df.iloc[3:]]):
+        df_final_lote, _ = deduplicar_no_grao(df_lote, chave, colunas)
+        anexar_em_tabela_de_estagio(df_final_lote, 'ORCADO_ESTAGIO_LOTES', engine_dbo, substituir=numero_lote == 0, chave_primaria=chave)
+    consulta = montar_consulta_agregacao_estagio('ORCADO_ESTAGIO_LOTES', chave, ['Valor_Ajustado'], ['UNIDADE'])
+    consolidado = pd.read_sql(consulta, engine_dbo).sort_values(['MES', 'CODCCUSTO'], ignore_index=True)
+
+    assert consolidado[colunas].astype(str).equals(esperado[colunas].astype(str))
+    assert consolidado['Valor_Ajustado'].tolist() == [15.0, 3.0, 7.0]
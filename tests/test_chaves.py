@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from processamento.chaves import CODIGO_INVALIDO, CodificadorChaves
+
+
+@pytest.fixture
+def df_chaves() -> pd.DataFrame:
+    return pd.DataFrame({
+        'PROJETO': ['Projeto A', 'Projeto A', 'Projeto B'],
+        'ACAO': ['Ação 1', 'Ação 1', 'Ação 2'],
+        'UNIDADE': ['Unidade X', 'Unidade X', 'Unidade Y'],
+        'ANO': [2024, 2024, 2025],
+    })
+
+
+def test_codificar_e_decodificar_ida_e_volta(df_chaves):
+    codificador = CodificadorChaves()
+
+    codigos = codificador.codificar(df_chaves)
+
+    assert codigos.dtype == np.int64
+    assert codigos[0] == codigos[1] != codigos[2]
+    assert codificador.decodificar(codigos).tolist() == [
+        'Projeto A|Ação 1|Unidade X|2024', 'Projeto A|Ação 1|Unidade X|2024', 'Projeto B|Ação 2|Unidade Y|2025',
+    ]
+
+
+def test_dicionario_compartilhado_gera_codigos_comparaveis(df_chaves):
+    codificador = CodificadorChaves()
+    codigos_orcado = codificador.codificar(df_chaves)
+
+    df_cc = df_chaves.iloc[::-1].reset_index(drop=True)
+    codigos_cc = codificador.codificar(df_cc)
+
+    assert codigos_cc.tolist() == codigos_orcado[::-1].tolist()
+
+
+def test_codificar_textos_nao_cresce_o_dicionario(df_chaves):
+    codificador = CodificadorChaves()
+    codigos = codificador.codificar(df_chaves)
+
+    codigos_texto = codificador.codificar_textos([
+        'Projeto B|Ação 2|Unidade Y|2025', 'Projeto Novo|Ação 2|Unidade Y|2025', 'chave|malformada',
+    ])
+
+    assert codigos_texto.tolist() == [codigos[2], CODIGO_INVALIDO, CODIGO_INVALIDO]
+    assert codificador.codificar_textos(['Projeto Novo|Ação 2|Unidade Y|2025']).tolist() == [CODIGO_INVALIDO]
+
+
+def test_campo_com_valores_demais_gera_erro():
+    codificador = CodificadorChaves(bits={'PROJETO': 1, 'ACAO': 20, 'UNIDADE': 15, 'ANO': 8})
+    df = pd.DataFrame({'PROJETO': ['A', 'B', 'C'], 'ACAO': ['x'] * 3, 'UNIDADE': ['y'] * 3, 'ANO': [2025] * 3})
+
+    with pytest.raises(ValueError):
+        codificador.codificar(df)
+
+
+def test_codificador_normalizado_ignora_maiusculas_acentos_e_espacos():
+    codificador = CodificadorChaves(normalizar=True)
+    df = pd.DataFrame({
+        'PROJETO': ['ALI Brasil Mais', 'ali  brasil mais'],
+        'ACAO': ['Ganhos Rápidos', 'GANHOS RAPIDOS'],
+        'UNIDADE': ['Desenvolvimento Setorial', ' DESENVOLVIMENTO SETORIAL'],
+        'ANO': [2025, 2025],
+    })
+
+    codigos = codificador.codificar(df)
+
+    assert codigos[0] == codigos[1]
+    assert codificador.decodificar(codigos[:1]).tolist() == ['ALI Brasil Mais|Ganhos Rápidos|Desenvolvimento Setorial|2025']
+    assert codificador.codificar_textos(['ALI BRASIL MAIS|Ganhos Rapidos|desenvolvimento setorial|2025']).tolist() == [codigos[0]]
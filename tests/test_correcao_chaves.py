@@ -0,0 +1,34 @@
+import pandas as pd
+
+from processamento.correcao_chaves import _corrigir_campo_a_campo, construir_indice_hierarquia
+
+
+def _df_referencia() -> pd.DataFrame:
+    return pd.DataFrame({
+        'PROJETO': ['P1', 'P1', 'P1', 'P2', None],
+        'ACAO': ['A1', 'A1', 'A2', 'A1', 'A9'],
+        'UNIDADE': ['U1', 'U2', 'U1', 'U3', 'U9'],
+    }).astype('category')
+
+
+def test_indice_hierarquia_agrupa_combinacoes_validas():
+    indice = construir_indice_hierarquia(_df_referencia())
+
+    assert indice == {'P1': {'A1': {'U1': None, 'U2': None}, 'A2': {'U1': None}}, 'P2': {'A1': {'U3': None}}}
+    assert list(indice['P1']) == ['A1', 'A2']
+
+
+def test_corrigir_campo_a_campo_usa_opcoes_do_indice(monkeypatch):
+    indice = construir_indice_hierarquia(_df_referencia())
+    respostas = iter(['P2', '1', '1'])
+    monkeypatch.setattr('builtins.input', lambda _: next(respostas))
+
+    assert _corrigir_campo_a_campo('P 2', 'A 1', 'U 3', indice) == ('P2', 'A1', 'U3')
+
+
+def test_corrigir_campo_a_campo_interrompe_quando_campo_e_pulado(monkeypatch):
+    indice = construir_indice_hierarquia(_df_referencia())
+    respostas = iter(['P1', 'p'])
+    monkeypatch.setattr('builtins.input', lambda _: next(respostas))
+
+    assert _corrigir_campo_a_campo('P1', 'Ação inexistente', 'U1', indice) is None
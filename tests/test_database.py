@@ -0,0 +1,53 @@
+import pytest
+
+from config.config import Config, DbConfig
+from config.database import descartar_engines, estatisticas_pool, get_conexao
+
+
+@pytest.fixture(autouse=True)
+def registro_limpo():
+    descartar_engines()
+    yield
+    descartar_engines()
+
+
+def test_configuracao_igual_reaproveita_a_engine(tmp_path):
+    engine = get_conexao(DbConfig(tipo='sqlite', caminho=tmp_path / 'a.db'))
+
+    assert get_conexao(DbConfig(tipo='sqlite', caminho=tmp_path / 'a.db')) is engine
+    assert get_conexao(DbConfig(tipo='sqlite', caminho=tmp_path / 'b.db')) is not engine
+
+
+def test_parametros_db_pool_sao_aplicados(tmp_path, monkeypatch):
+    monkeypatch.setenv('DB_SERVER_FINANCA', 'servidor-financa')
+    monkeypatch.setenv('DB_SERVER_HUB', 'servidor-hub')
+    monkeypatch.setenv('DB_POOL_SIZE', '2')
+    monkeypatch.setenv('DB_POOL_MAX_OVERFLOW', '3')
+    monkeypatch.setenv('DB_POOL_RECYCLE', '60')
+    monkeypatch.setenv('DB_POOL_PRE_PING', '0')
+    config_sql = Config().conexoes['FINANCA_SQL']
+    assert (config_sql.pool_size, config_sql.max_overflow, config_sql.pool_recycle, config_sql.pool_pre_ping) == (2, 3, 60, False)
+
+    parametros = dict(pool_size=config_sql.pool_size, max_overflow=config_sql.max_overflow,
+                      pool_recycle=config_sql.pool_recycle, pool_pre_ping=config_sql.pool_pre_ping)
+    pool = get_conexao(DbConfig(tipo='sqlite', caminho=tmp_path / 'pool.db', **parametros)).pool
+
+    assert pool.size() == 2
+    assert (pool._max_overflow, pool._recycle, pool._pre_ping) == (3, 60, False)
+
+
+def test_contadores_de_checkout_e_saturacao(tmp_path):
+    caminho = tmp_path / 'contadores.db'
+    engine = get_conexao(DbConfig(tipo='sqlite', caminho=caminho, pool_size=1, max_overflow=2))
+
+    with engine.connect():
+        estatisticas = estatisticas_pool()[str(caminho)]
+        assert (estatisticas['checkouts'], estatisticas['conexoes_abertas'], estatisticas['checkouts_pool_saturado']) == (1, 1, 0)
+        # Com a única conexão do pool em uso, a segunda vem do overflow.
+        with engine.connect():
+            pass
+    with engine.connect():
+        pass
+
+    estatisticas = estatisticas_pool()[str(caminho)]
+    assert (estatisticas['checkouts'], estatisticas['conexoes_abertas'], estatisticas['checkouts_pool_saturado']) == (3, 2, 1)
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from processamento.deduplicacao import deduplicar_no_grao
+from processamento.esquema import aplicar_esquema
+
+CHAVE = ['ANO', 'MES', 'CODCCUSTO', 'PROJETO', 'ACAO', 'Codigo_Natureza_Orcamentaria']
+COLUNAS = ['ANO', 'MES', 'PROJETO', 'ACAO', 'UNIDADE', 'CODCCUSTO', 'Valor_Ajustado', 'Codigo_Natureza_Orcamentaria']
+
+
+def _resultado_enriquecido(linhas):
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        'PROJETO': rng.choice(['Projeto B', 'Projeto A', 'Projeto C'], linhas),
+        'ACAO': rng.choice(['Ação 2', 'Ação 1'], linhas),
+        'UNIDADE': rng.choice(['Unidade 1', 'Unidade 2'], linhas),
+        'ANO': rng.choice([2025, 2024], linhas),
+        'MES': rng.integers(1, 4, linhas),
+        'CODCCUSTO': rng.choice(['1.02.001', '1.01.001', None], linhas),
+        'Codigo_Natureza_Orcamentaria': rng.choice(['3.2', '3.1'], linhas),
+        'Valor_Ajustado': rng.normal(100, 30, linhas).round(2),
+        'CHAVE_ORIGINAL': [f"chave {i}" for i in range(linhas)],
+    })
+    return aplicar_esquema(df)
+
+
+def test_deduplicacao_equivale_ao_groupby_no_grao():
+    df = _resultado_enriquecido(2_000)
+
+    resultado, estatisticas = deduplicar_no_grao(df, CHAVE, COLUNAS)
+
+    esperado = (
+        df.dropna(subset=['CODCCUSTO'])
+        .groupby(CHAVE, as_index=False, observed=True)
+        .agg(UNIDADE=('UNIDADE', 'first'), Valor_Ajustado=('Valor_Ajustado', 'sum'))[COLUNAS]
+    )
+    assert list(resultado.columns) == COLUNAS
+    assert resultado.drop(columns='Valor_Ajustado').astype(str).equals(esperado.drop(columns='Valor_Ajustado').astype(str))
+    np.testing.assert_allclose(resultado['Valor_Ajustado'], esperado['Valor_Ajustado'])
+    assert estatisticas.linhas_chave_nula == int(df['CODCCUSTO'].isna().sum())
+    assert estatisticas.grupos == len(esperado)
+    assert estatisticas.linhas_agregadas == len(df) - estatisticas.linhas_chave_nula - len(esperado)
+
+
+def test_estatisticas_apontam_as_chaves_duplicadas():
+    df = pd.DataFrame({
+        'ANO': [2025, 2025, 2025, 2025], 'MES': [1, 1, 1, 2], 'CODCCUSTO': ['1.01', '1.01', '1.01', None],
+        'PROJETO': ['P'] * 4, 'ACAO': ['A'] * 4, 'Codigo_Natureza_Orcamentaria': ['3.1'] * 4,
+        'UNIDADE': ['U1', 'U2', 'U3', 'U4'], 'Valor_Ajustado': [1.0, 2.0, np.nan, 5.0],
+    })
+
+    resultado, estatisticas = deduplicar_no_grao(df, CHAVE, COLUNAS)
+
+    assert resultado[['UNIDADE', 'Valor_Ajustado']].to_dict('records') == [{'UNIDADE': 'U1', 'Valor_Ajustado': 3.0}]
+    assert (estatisticas.grupos, estatisticas.grupos_duplicados, estatisticas.multiplicidade_maxima) == (1, 1, 3)
+    assert estatisticas.maiores_duplicidades.to_dict('records') == [
+        {'ANO': 2025, 'MES': 1, 'CODCCUSTO': '1.01', 'PROJETO': 'P', 'ACAO': 'A', 'Codigo_Natureza_Orcamentaria': '3.1', 'LINHAS': 3}
+    ]
@@ -0,0 +1,58 @@
+import argparse
+
+import pandas as pd
+import pytest
+
+from processamento.chaves import definir_normalizacao_chaves
+from processamento.enriquecimento import enriquecer_orcado_com_cc
+from processamento.validacao import preparar_dados_para_validacao
+
+CHAVES_BASE = ['PROJETO', 'ACAO', 'UNIDADE']
+
+
+@pytest.fixture
+def chaves_normalizadas():
+    definir_normalizacao_chaves(True)
+    yield
+    definir_normalizacao_chaves(False)
+
+
+def _dados():
+    df_orcado = pd.DataFrame({
+        'PROJETO': ['Projeto A', 'Projeto B'],
+        'ACAO': ['Ação 1', 'Ação 2'],
+        'UNIDADE': ['Desenvolvimento Setorial', 'Unidade Inexistente'],
+        'ANO': [2025, 2025],
+        'Valor_Ajustado': [10.0, 20.0],
+    })
+    df_cc = pd.DataFrame({
+        'PROJETO': ['PROJETO A', 'Projeto B'],
+        'ACAO': ['ACAO 1', 'Ação 2'],
+        'UNIDADE': ['DESENVOLVIMENTO  SETORIAL', 'Outra Unidade'],
+        'ANO': [2025, 2025],
+        'CODCCUSTO': ['1.01.001', '1.02.001'],
+    })
+    return (
+        preparar_dados_para_validacao(df_orcado, CHAVES_BASE, incluir_ano_na_chave=True),
+        preparar_dados_para_validacao(df_cc, CHAVES_BASE, incluir_ano_na_chave=True),
+    )
+
+
+def test_juncao_exata_nao_casa_diferencas_cosmeticas():
+    df_orcado, df_cc = _dados()
+
+    resultado = enriquecer_orcado_com_cc(df_orcado, df_cc, argparse.Namespace(modo_interativo=False))
+
+    assert resultado['CODCCUSTO'].isna().all()
+
+
+def test_juncao_normalizada_usa_a_grafia_da_referencia(chaves_normalizadas):
+    df_orcado, df_cc = _dados()
+
+    resultado = enriquecer_orcado_com_cc(df_orcado, df_cc, argparse.Namespace(modo_interativo=False))
+
+    assert resultado['CODCCUSTO'].tolist()[0] == '1.01.001'
+    assert pd.isna(resultado['CODCCUSTO'].tolist()[1])
+    assert resultado.loc[0, ['PROJETO', 'ACAO', 'UNIDADE']].tolist() == ['PROJETO A', 'ACAO 1', 'DESENVOLVIMENTO  SETORIAL']
+    assert resultado.loc[1, 'UNIDADE'] == 'Unidade Inexistente'
+    assert not any(col.endswith(('_ref', '_grafia_cc')) for col in resultado.columns)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from processamento.esquema import aplicar_esquema, normalizar_texto, transformar_texto
+
+
+def test_aplicar_esquema_converte_tipos_sem_alterar_valores():
+    df = pd.DataFrame({
+        'PROJETO': ['Projeto A', 'Projeto B', 'Projeto A'],
+        'CODCCUSTO': ['1.01.001', None, '1.01.001'],
+        'ANO': [2025, 2025, 2024],
+        'MES': ['1', '2', '12'],
+        'Valor_Ajustado': [1.5, 2.0, 3.25],
+        'OUTRA': ['x', 'y', 'z'],
+    })
+    original = df.copy()
+
+    resultado = aplicar_esquema(df)
+
+    assert isinstance(resultado['PROJETO'].dtype, pd.CategoricalDtype)
+    assert isinstance(resultado['CODCCUSTO'].dtype, pd.CategoricalDtype)
+    assert resultado['ANO'].dtype == np.int16
+    assert resultado['MES'].dtype == np.int8
+    assert resultado['Valor_Ajustado'].dtype == np.float64
+    assert resultado['OUTRA'].dtype == original['OUTRA'].dtype
+    assert resultado['PROJETO'].tolist() == original['PROJETO'].tolist()
+    assert resultado['CODCCUSTO'].isna().tolist() == [False, True, False]
+
+
+def test_aplicar_esquema_mantem_inteiros_com_nulos():
+    df = pd.DataFrame({'ANO': [2025.0, np.nan]})
+
+    assert aplicar_esquema(df)['ANO'].dtype == np.float64
+
+
+def test_normalizar_texto_em_categorica_equivale_ao_texto():
+    serie = pd.Series([' Projeto A', 'Projeto A ', None, 'Projeto B'])
+
+    esperado = normalizar_texto(serie)
+    resultado = normalizar_texto(serie.astype('category'))
+
+    assert isinstance(resultado.dtype, pd.CategoricalDtype)
+    assert resultado.tolist() == esperado.tolist() == ['Projeto A', 'Projeto A', 'N/A', 'Projeto B']
+    assert list(resultado.cat.categories) == ['Projeto A', 'Projeto B', 'N/A']
+
+
+def test_transformar_texto_opera_sobre_o_dicionario():
+    serie = pd.Series(['1.01.001.01', '1.01.001.02', '1.01.002.01']).astype('category')
+
+    resultado = transformar_texto(serie, lambda textos: textos.str.rsplit('.', n=1).str[0])
+
+    assert resultado.tolist() == ['1.01.001', '1.01.001', '1.01.002']
+    assert len(resultado.cat.categories) == 2
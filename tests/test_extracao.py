@@ -0,0 +1,134 @@
+import threading
+
+import pandas as pd
+import pytest
+from processamento.extracao import BackendCacheParquet, BackendCacheSQLite, ExtracaoUnica, IndiceCorrelacao, mesclar_incremento
+
+
+def test_mesclar_incremento_substitui_janela_do_watermark():
+    """
+    Linhas com watermark >= ao valor de corte são substituídas pelo incremento;
+    linhas anteriores ao corte permanecem no cache.
+    """
+    df_cache = pd.DataFrame({'ANO': ['2023', '2024', '2024'], 'VALOR': [1, 2, 3]})
+    df_novos = pd.DataFrame({'ANO': ['2024', '2025'], 'VALOR': [20, 30]})
+
+    resultado = mesclar_incremento(df_cache, df_novos, 'ANO', '2024')
+
+    assert resultado.sort_values('ANO')['VALOR'].tolist() == [1, 20, 30]
+
+
+def test_mesclar_incremento_descarta_versoes_antigas_por_chave():
+    df_cache = pd.DataFrame({'CODCCUSTO': ['1.01', '1.02'], 'DT': [1, 2], 'NOME': ['A', 'B']})
+    df_novos = pd.DataFrame({'CODCCUSTO': ['1.01'], 'DT': [3], 'NOME': ['A renomeado']})
+
+    resultado = mesclar_incremento(df_cache, df_novos, 'DT', 3, chaves=['CODCCUSTO'])
+
+    assert resultado.set_index('CODCCUSTO')['NOME'].to_dict() == {'1.02': 'B', '1.01': 'A renomeado'}
+
+
+def test_indice_correlacao_fatia_por_cc_e_por_chave_truncada():
+    df = pd.DataFrame({'CODCCUSTO': ['1.02.003', '1.02.004', '1.02.003'], 'VALOR': [1, 2, 3]})
+    indice = IndiceCorrelacao("comprometido.sql", df)
+
+    assert indice.fatiar(['1.02.004'])['VALOR'].tolist() == [2]
+    assert indice.fatiar(['1.02.003.01', '1.02.003.02'], truncate_cc_keys=True)['VALOR'].tolist() == [1, 3]
+    assert indice.fatiar(['9.99']).empty
+
+
+def test_extracao_unica_coalesce_pedidos_com_a_mesma_chave():
+    """Pedidos concorrentes para a mesma chave compartilham uma única execução."""
+    chamadas = []
+    liberar = threading.Event()
+
+    def buscar():
+        chamadas.append(1)
+        liberar.wait(timeout=5)
+        return pd.DataFrame({'A': [1]})
+
+    with ExtracaoUnica(max_workers=4) as extracao:
+        futuros = [extracao.submeter("orcado", buscar) for _ in range(5)]
+        outro = extracao.submeter("cc", lambda: "cc")
+        liberar.set()
+        resultados = [futuro.result() for futuro in futuros]
+
+    assert len(chamadas) == 1
+    assert all(resultado is resultados[0] for resultado in resultados)
+    assert outro.result() == "cc"
+
+
+@pytest.fixture(params=['sqlite', 'parquet'])
+def backend_cache(request, tmp_path):
+    if request.param == 'sqlite':
+        backend = BackendCacheSQLite(tmp_path / 'cache.db')
+    else:
+        backend = BackendCacheParquet(tmp_path / 'parquet')
+    yield backend
+    backend.limpar()
+
+
+def _dado_bruto(valores):
+    return pd.DataFrame({'PROJETO': [f"Projeto {v}" for v in valores], 'ANO': [2025] * len(valores), 'VALOR': [float(v) for v in valores]})
+
+
+def test_backend_cache_salva_carrega_e_le_em_lotes(backend_cache):
+    assert not backend_cache.existe('orcado') and backend_cache.assinatura('orcado') is None
+
+    backend_cache.salvar('orcado', _dado_bruto(range(5)))
+
+    assert backend_cache.existe('orcado')
+    assert backend_cache.carregar('orcado').equals(_dado_bruto(range(5)))
+    assert list(backend_cache.carregar('orcado', ['VALOR']).columns) == ['VALOR']
+    lotes = list(backend_cache.carregar_em_lotes('orcado', 2))
+    assert [len(lote) for lote in lotes] == [2, 2, 1]
+    assert pd.concat(lotes, ignore_index=True)['VALOR'].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_backend_cache_assinatura_muda_a_cada_gravacao(backend_cache):
+    backend_cache.salvar('orcado', _dado_bruto(range(3)))
+    primeira = backend_cache.assinatura('orcado')
+
+    assert primeira.startswith(f"{backend_cache.nome}:")
+    assert backend_cache.assinatura('orcado') == primeira
+    backend_cache.salvar('orcado', _dado_bruto(range(4)))
+    assert backend_cache.assinatura('orcado') != primeira
+    backend_cache.remover('orcado')
+    assert backend_cache.assinatura('orcado') is None
+
+
+def test_backend_cache_gravacao_com_falha_preserva_a_anterior(backend_cache):
+    backend_cache.salvar('orcado', _dado_bruto(range(3)))
+    # Dicionários não são graváveis no SQLite, e tipos misturados numa coluna não o são no Parquet.
+    df_invalido = _dado_bruto(range(2)).assign(VALOR=[{'a': 1}, {'b': 2}], PROJETO=[1, 'Projeto 1'])
+
+    with pytest.raises(Exception):
+        backend_cache.salvar('orcado', df_invalido)
+
+    assert backend_cache.carregar('orcado').equals(_dado_bruto(range(3)))
+    backend_cache.salvar('orcado', _dado_bruto(range(4)))
+    assert len(backend_cache.carregar('orcado')) == 4
+
+
+def test_cache_legado_migrado_uma_vez_e_nao_volta_apos_remocao(tmp_path, monkeypatch):
+    from processamento import extracao
+    legado = BackendCacheSQLite(tmp_path / 'legado.db')
+    legado.salvar('orcado', _dado_bruto([1]))
+    parquet = BackendCacheParquet(tmp_path / 'parquet')
+    buscas = []
+    monkeypatch.setattr(extracao, 'BackendCacheSQLite', lambda: legado)
+    monkeypatch.setattr(extracao, 'obter_backend_cache', lambda: parquet)
+    monkeypatch.setitem(extracao._BUSCAS_AO_VIVO, 'orcado', lambda: buscas.append(1) or _dado_bruto([2]))
+
+    assert extracao.obter_dado_bruto('orcado')['VALOR'].tolist() == [1.0]
+    assert not legado.existe('orcado') and buscas == []
+
+    # Arquivo removido para forçar a busca: os dados legados não reaparecem.
+    parquet.remover('orcado')
+    assert extracao.obter_dado_bruto('orcado')['VALOR'].tolist() == [2.0]
+
+    # Cache corrompido: a nova tentativa vai direto à fonte, mesmo com a tabela legada de volta.
+    legado.salvar('orcado', _dado_bruto([1]))
+    parquet._caminho('orcado').write_bytes(b'corrompido')
+    assert extracao.obter_dado_bruto('orcado')['VALOR'].tolist() == [2.0]
+    assert buscas == [1, 1] and legado.existe('orcado')
+    legado.limpar()
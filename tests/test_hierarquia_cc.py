@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from processamento.hierarquia_cc import HierarquiaCC
+
+
+def test_consultas_de_pai_filhos_e_ancestrais():
+    hierarquia = HierarquiaCC(['1.02.003.04', '1.02.003.05 ', '1.02.004.01', '1.02.003.04', None, '9'])
+
+    assert hierarquia.pai('1.02.003.04') == '1.02.003'
+    assert hierarquia.pai('9') is None
+    assert hierarquia.ancestrais('1.02.003.04') == ['1.02.003', '1.02', '1']
+    assert sorted(hierarquia.filhos('1.02.003')) == ['1.02.003.04', '1.02.003.05']
+    assert sorted(hierarquia.filhos('1.02')) == ['1.02.003', '1.02.004']
+    assert hierarquia.filhos('1.02.003.04') == []
+    assert hierarquia.pais_de(['1.02.003.04', '1.02.004.01', '9', '7.01']) == ['1.02.003', '1.02.004', '7']
+
+
+def test_expandir_filhos_equivale_ao_merge_pelo_cc_truncado():
+    rng = np.random.default_rng(0)
+    ccs = pd.Series([f"1.{rng.integers(1, 4):02d}.{rng.integers(1, 6):03d}.{rng.integers(1, 4):02d}" for _ in range(300)])
+    prefixos = pd.Series([f"1.{rng.integers(1, 5):02d}.{rng.integers(1, 7):03d}" for _ in range(500)])
+
+    linhas_prefixos, linhas_ccs = HierarquiaCC(ccs).expandir_filhos(prefixos)
+
+    esperado = pd.merge(
+        pd.DataFrame({'PREFIXO': prefixos, 'linha_prefixo': range(len(prefixos))}),
+        pd.DataFrame({'PREFIXO': ccs.str.rsplit('.', n=1).str[0], 'linha_cc': range(len(ccs))}),
+        on='PREFIXO', how='inner',
+    )
+    assert linhas_prefixos.tolist() == esperado['linha_prefixo'].tolist()
+    assert linhas_ccs.tolist() == esperado['linha_cc'].tolist()
+
+
+def test_expandir_filhos_sem_correspondencia():
+    linhas_prefixos, linhas_ccs = HierarquiaCC(['1.01.01']).expandir_filhos(pd.Series(['2.01', None]))
+
+    assert len(linhas_prefixos) == len(linhas_ccs) == 0
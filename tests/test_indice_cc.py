@@ -0,0 +1,86 @@
+import pandas as pd
+
+from processamento.chaves import definir_normalizacao_chaves, obter_codificador
+from processamento.indice_cc import IndiceCC, obter_indice_cc
+from processamento.validacao import preparar_dados_para_validacao
+
+CHAVES_BASE = ['PROJETO', 'ACAO', 'UNIDADE']
+
+
+def _referencia():
+    df_cc = pd.DataFrame({
+        'PROJETO': ['Projeto A', 'Projeto A', 'PROJETO A', 'Projeto B'],
+        'ACAO': ['Ação 1', 'Ação 1', 'Ação 1', 'Ação 2'],
+        'UNIDADE': ['Unidade 1', 'Unidade 1', 'Unidade 1', 'Unidade 2'],
+        'ANO': [2025, 2025, 2025, 2025],
+        'CODCCUSTO': ['1.01', '1.99', '1.02', '2.01'],
+        'DESCRICAO': ['x', 'y', 'z', 'w'],
+    })
+    return preparar_dados_para_validacao(df_cc, CHAVES_BASE, incluir_ano_na_chave=True)
+
+
+def _consultar(indice, projetos):
+    df = pd.DataFrame({'PROJETO': projetos, 'ACAO': 'Ação 1', 'UNIDADE': 'Unidade 1', 'ANO': 2025})
+    posicoes = indice.localizar(obter_codificador().codificar(df))
+    return list(indice.valores('CODCCUSTO', posicoes))
+
+
+def test_indice_guarda_so_a_chave_e_o_primeiro_codccusto():
+    indice = IndiceCC.da_referencia(_referencia())
+
+    assert list(indice.referencia.columns) == ['PROJETO', 'ACAO', 'UNIDADE', 'ANO', 'CODCCUSTO']
+    assert _consultar(indice, ['Projeto A', 'PROJETO A']) == ['1.01', '1.02']
+    assert pd.isna(_consultar(indice, ['Projeto X'])[0])
+
+
+def test_indice_normalizado_usa_a_primeira_grafia():
+    indice = IndiceCC.da_referencia(_referencia())
+    definir_normalizacao_chaves(True)
+    try:
+        assert _consultar(indice, ['projeto a']) == ['1.01']
+    finally:
+        definir_normalizacao_chaves(False)
+    assert pd.isna(_consultar(indice, ['projeto a'])[0])
+
+
+def test_indice_gravado_e_invalidado_pela_assinatura(tmp_path):
+    caminho = tmp_path / 'indice_cc.parquet'
+    obter_indice_cc(_referencia(), 'v1', caminho)
+
+    # Mesma assinatura: o índice vem do disco, sem olhar a referência.
+    reaproveitado = obter_indice_cc(pd.DataFrame(), 'v1', caminho)
+    assert len(reaproveitado) == 3
+    assert _consultar(reaproveitado, ['Projeto A']) == ['1.01']
+
+    df_alterado = _referencia()
+    df_alterado['CODCCUSTO'] = df_alterado['CODCCUSTO'].astype(object).replace('1.01', '9.99')
+    reconstruido = obter_indice_cc(df_alterado, 'v2', caminho)
+    assert _consultar(reconstruido, ['Projeto A']) == ['9.99']
+    assert _consultar(obter_indice_cc(pd.DataFrame(), 'v2', caminho), ['Projeto A']) == ['9.99']
+
+
+def test_indice_gravado_em_um_modo_de_chaves_serve_ao_outro(tmp_path):
+    caminho = tmp_path / 'indice_cc.parquet'
+    definir_normalizacao_chaves(True)
+    try:
+        obter_indice_cc(_referencia(), 'v1', caminho)
+    finally:
+        definir_normalizacao_chaves(False)
+
+    # O índice gravado em modo normalizado guarda as duas grafias para o modo exato.
+    reaproveitado = obter_indice_cc(pd.DataFrame(), 'v1', caminho)
+    assert _consultar(reaproveitado, ['Projeto A', 'PROJETO A']) == ['1.01', '1.02']
+
+    definir_normalizacao_chaves(True)
+    try:
+        assert _consultar(obter_indice_cc(pd.DataFrame(), 'v1', caminho), ['projeto a']) == ['1.01']
+    finally:
+        definir_normalizacao_chaves(False)
+
+
+def test_indice_sem_assinatura_nao_grava(tmp_path):
+    caminho = tmp_path / 'indice_cc.parquet'
+
+    obter_indice_cc(_referencia(), None, caminho)
+
+    assert not caminho.exists()
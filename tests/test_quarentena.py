@@ -0,0 +1,90 @@
+import argparse
+
+import pandas as pd
+
+from processamento.enriquecimento import enriquecer_orcado_com_cc, verificar_resultado_enriquecido
+from processamento.quarentena import carregar_quarentena, gravar_quarentena, montar_quarentena, remover_da_quarentena
+from processamento.validacao import aplicar_mapa_correcoes, preparar_dados_para_validacao
+
+CHAVES_BASE = ['PROJETO', 'ACAO', 'UNIDADE']
+
+
+def _orcado_enriquecido():
+    df_orcado = pd.DataFrame({
+        'PROJETO': ['Projeto A', 'Projeto Velho', 'Projeto Velho', 'Projeto Sem CC'],
+        'ACAO': ['Ação 1', 'Ação 1', 'Ação 1', 'Ação 9'],
+        'UNIDADE': ['Unidade 1', 'Unidade 1', 'Unidade 1', 'Unidade 9'],
+        'ANO': [2025, 2025, 2025, 2025],
+        'MES': [1, 2, 2, 3],
+        'Codigo_Natureza_Orcamentaria': ['3.1', '3.1', '3.1', '3.2'],
+        'Valor_Ajustado': [10.0, 20.0, 5.0, 7.0],
+    })
+    df_cc = pd.DataFrame({
+        'PROJETO': ['Projeto A'], 'ACAO': ['Ação 1'], 'UNIDADE': ['Unidade 1'], 'ANO': [2025], 'CODCCUSTO': ['1.01.001'],
+    })
+    df_orcado = preparar_dados_para_validacao(df_orcado, CHAVES_BASE, incluir_ano_na_chave=True)
+    df_cc = preparar_dados_para_validacao(df_cc, CHAVES_BASE, incluir_ano_na_chave=True)
+    # A correção leva 'Projeto Velho' para um projeto que também não existe na referência.
+    df_corrigido = aplicar_mapa_correcoes(df_orcado, {'Projeto Velho|Ação 1|Unidade 1|2025': 'Projeto Novo|Ação 1|Unidade 1|2025'})
+    return enriquecer_orcado_com_cc(df_corrigido, df_cc, argparse.Namespace(modo_interativo=False))
+
+
+def test_quarentena_guarda_a_chave_original_e_agrega_no_grao():
+    df_quarentena = montar_quarentena(_orcado_enriquecido())
+
+    assert df_quarentena.to_dict('records') == [
+        {'ChaveQuebrada': 'Projeto Velho|Ação 1|Unidade 1|2025', 'PROJETO': 'Projeto Velho', 'ACAO': 'Ação 1',
+         'UNIDADE': 'Unidade 1', 'ANO': 2025, 'MES': 2, 'Codigo_Natureza_Orcamentaria': '3.1', 'Valor_Ajustado': 25.0},
+        {'ChaveQuebrada': 'Projeto Sem CC|Ação 9|Unidade 9|2025', 'PROJETO': 'Projeto Sem CC', 'ACAO': 'Ação 9',
+         'UNIDADE': 'Unidade 9', 'ANO': 2025, 'MES': 3, 'Codigo_Natureza_Orcamentaria': '3.2', 'Valor_Ajustado': 7.0},
+    ]
+
+
+def test_quarentena_gravada_e_removida_por_chave(engine_dbo):
+    df_quarentena = montar_quarentena(_orcado_enriquecido())
+    gravar_quarentena(df_quarentena, engine_dbo)
+    gravar_quarentena(df_quarentena, engine_dbo)  # uma nova carga completa substitui a anterior
+
+    assert len(carregar_quarentena(engine_dbo)) == 2
+    with engine_dbo.begin() as connection:
+        assert remover_da_quarentena(['Projeto Velho|Ação 1|Unidade 1|2025'], connection) == 1
+    assert carregar_quarentena(engine_dbo)['ChaveQuebrada'].tolist() == ['Projeto Sem CC|Ação 9|Unidade 9|2025']
+
+    gravar_quarentena(montar_quarentena(pd.DataFrame({'CODCCUSTO': ['1.01.001']})), engine_dbo)
+    assert carregar_quarentena(engine_dbo).empty
+
+
+def test_quarentena_reprocessada_com_o_mapa_atual():
+    df_quarentena = montar_quarentena(_orcado_enriquecido())
+    df_cc = preparar_dados_para_validacao(
+        pd.DataFrame({'PROJETO': ['Projeto A'], 'ACAO': ['Ação 1'], 'UNIDADE': ['Unidade 1'], 'ANO': [2025], 'CODCCUSTO': ['1.01.001']}),
+        CHAVES_BASE, incluir_ano_na_chave=True,
+    )
+    df_preparado = preparar_dados_para_validacao(df_quarentena, CHAVES_BASE, incluir_ano_na_chave=True)
+    df_corrigido = aplicar_mapa_correcoes(df_preparado, {'Projeto Velho|Ação 1|Unidade 1|2025': 'Projeto A|Ação 1|Unidade 1|2025'})
+
+    resultado = enriquecer_orcado_com_cc(df_corrigido, df_cc, argparse.Namespace(modo_interativo=False))
+
+    resolvidas = resultado[resultado['CODCCUSTO'].notna()]
+    assert resolvidas['ChaveQuebrada'].tolist() == ['Projeto Velho|Ação 1|Unidade 1|2025']
+    assert resolvidas['PROJETO'].tolist() == ['Projeto A']
+    assert resolvidas['Valor_Ajustado'].tolist() == [25.0]
+
+
+def test_lote_em_que_nenhuma_linha_acha_cc_vai_inteiro_para_a_quarentena():
+    df_orcado = preparar_dados_para_validacao(pd.DataFrame({
+        'PROJETO': ['Projeto Quebrado', 'Projeto Quebrado'], 'ACAO': ['Ação 1', 'Ação 2'], 'UNIDADE': ['Unidade 1', 'Unidade 1'],
+        'ANO': [2025, 2025], 'MES': [1, 1], 'Codigo_Natureza_Orcamentaria': ['3.1', '3.1'], 'Valor_Ajustado': [10.0, 5.0],
+    }), CHAVES_BASE, incluir_ano_na_chave=True)
+    df_cc = preparar_dados_para_validacao(
+        pd.DataFrame({'PROJETO': ['Projeto A'], 'ACAO': ['Ação 1'], 'UNIDADE': ['Unidade 1'], 'ANO': [2025], 'CODCCUSTO': ['1.01.001']}),
+        CHAVES_BASE, incluir_ano_na_chave=True,
+    )
+    df_enriquecido = enriquecer_orcado_com_cc(df_orcado, df_cc, argparse.Namespace(modo_interativo=False))
+
+    df_verificado = verificar_resultado_enriquecido(df_enriquecido, "Orçado Nacional", manter_sem_cc=True)
+
+    assert montar_quarentena(df_verificado)['ChaveQuebrada'].tolist() == [
+        'Projeto Quebrado|Ação 1|Unidade 1|2025', 'Projeto Quebrado|Ação 2|Unidade 1|2025',
+    ]
+    assert verificar_resultado_enriquecido(df_enriquecido, "Comprometido Nacional").empty
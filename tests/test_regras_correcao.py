@@ -0,0 +1,113 @@
+import pandas as pd
+
+from processamento.regras_correcao import RegraCampo, RegrasCorrecao, compilar_regras
+from processamento.validacao import aplicar_mapa_correcoes, preparar_dados_para_validacao
+
+
+def _mapa_completo() -> dict:
+    mapa = {}
+    # Projeto renomeado: uma entrada por ação/unidade/ano.
+    for acao in ['Ação 1', 'Ação 2']:
+        for ano in [2023, 2024]:
+            mapa[f'Projeto Velho|{acao}|Unidade A|{ano}'] = f'Projeto Novo|{acao}|Unidade A|{ano}'
+    # Unidade renomeada só dentro do projeto P.
+    for acao in ['Ação 1', 'Ação 2', 'Ação 3']:
+        mapa[f'P|{acao}|SP - Unidade B|2024'] = f'P|{acao}|Unidade B|2024'
+    # Correções sem padrão: ficam como exceção. Em S, 'SP - Unidade B' é uma unidade válida.
+    mapa['S|Ação 1|SP - Unidade B|2024'] = 'S|Ação 4|SP - Unidade B|2024'
+    mapa['Q|Ação 9|Unidade C|2024'] = 'Q|Ação 10|Unidade C|2023'
+    mapa['R|Ação 1|Unidade D|2024'] = 'R|Ação 1|Unidade E|2024'
+    mapa['R|Ação 2|Unidade D|2024'] = 'R|Ação 2|Unidade F|2024'
+    return mapa
+
+
+def _preparar(registros: list[tuple]) -> pd.DataFrame:
+    df = pd.DataFrame(registros, columns=['PROJETO', 'ACAO', 'UNIDADE', 'ANO'])
+    df['Valor_Ajustado'] = range(len(df))
+    return preparar_dados_para_validacao(df, ['PROJETO', 'ACAO', 'UNIDADE'], incluir_ano_na_chave=True)
+
+
+def test_compilar_regras_gera_regras_por_campo_e_mantem_so_excecoes():
+    mapa = _mapa_completo()
+    regras = compilar_regras(mapa)
+
+    assert set(regras.regras) == {
+        RegraCampo('PROJETO', 'Projeto Velho', 'Projeto Novo'),
+        RegraCampo('UNIDADE', 'SP - Unidade B', 'Unidade B', projeto='P'),
+    }
+    assert regras.excecoes == {chave: mapa[chave] for chave in ['S|Ação 1|SP - Unidade B|2024', 'Q|Ação 9|Unidade C|2024', 'R|Ação 1|Unidade D|2024', 'R|Ação 2|Unidade D|2024']}
+    # Cada entrada original continua sendo corrigida para o mesmo destino.
+    assert all(regras.corrigir_chave(quebrada) == correta for quebrada, correta in mapa.items())
+
+
+def test_mapa_compilado_ida_e_volta_pelo_texto():
+    regras = compilar_regras(_mapa_completo())
+    mapa_compilado = regras.para_mapa()
+
+    assert mapa_compilado['Projeto Velho|*|*|*'] == 'Projeto Novo|*|*|*'
+    assert mapa_compilado['P|*|SP - Unidade B|*'] == '*|*|Unidade B|*'
+    relido = RegrasCorrecao.do_mapa(mapa_compilado)
+    assert set(relido.regras) == set(regras.regras)
+    assert relido.excecoes == regras.excecoes
+
+
+def test_aplicar_mapa_compilado_equivale_ao_mapa_completo_e_generaliza():
+    mapa = _mapa_completo()
+    mapa_compilado = compilar_regras(mapa).para_mapa()
+    df = _preparar([
+        ('Projeto Velho', 'Ação 1', 'Unidade A', 2023),
+        ('Projeto Velho', 'Ação 2', 'Unidade A', 2024),
+        ('P', 'Ação 3', 'SP - Unidade B', 2024),
+        ('Q', 'Ação 9', 'Unidade C', 2024),
+        ('R', 'Ação 2', 'Unidade D', 2024),
+        ('S', 'Ação 1', 'SP - Unidade B', 2024),
+        ('Outro', 'Ação 1', 'SP - Unidade B', 2024),
+    ])
+
+    pd.testing.assert_frame_equal(aplicar_mapa_correcoes(df, mapa_compilado), aplicar_mapa_correcoes(df, mapa))
+
+    # Combinações que o mapa completo não conhece (ano futuro, ação nova) também são corrigidas.
+    df_novo = _preparar([('Projeto Velho', 'Ação 7', 'Unidade A', 2026), ('P', 'Ação 8', 'SP - Unidade B', 2026)])
+    resultado = aplicar_mapa_correcoes(df_novo, mapa_compilado)
+    assert resultado['PROJETO'].tolist() == ['Projeto Novo', 'P']
+    assert resultado['UNIDADE'].tolist() == ['Unidade A', 'Unidade B']
+    assert resultado['ANO'].tolist() == [2026, 2026]
+
+
+def test_aplicar_regras_em_colunas_categoricas():
+    mapa_compilado = compilar_regras(_mapa_completo()).para_mapa()
+    df = _preparar([('Projeto Velho', 'Ação 1', 'Unidade A', 2026), ('Outro', 'Ação 1', 'Unidade A', 2026)])
+    df_categorico = df.astype({'PROJETO': 'category', 'ACAO': 'category', 'UNIDADE': 'category'})
+
+    resultado = aplicar_mapa_correcoes(df_categorico, mapa_compilado)
+    assert isinstance(resultado['PROJETO'].dtype, pd.CategoricalDtype)
+    assert resultado['PROJETO'].tolist() == ['Projeto Novo', 'Outro']
+
+
+def test_compilar_regras_nao_reescreve_valores_validos():
+    mapa = _mapa_completo()
+    # 'Projeto Velho' ainda existe no CC: renomeá-lo por regra corromperia as chaves válidas.
+    regras = compilar_regras(mapa, chaves_validas=['Projeto Velho|Ação 5|Unidade A|2024'])
+
+    assert RegraCampo('PROJETO', 'Projeto Velho', 'Projeto Novo') not in regras.regras
+    assert all(regras.corrigir_chave(quebrada) == correta for quebrada, correta in mapa.items())
+
+
+def test_regras_com_curinga_invalidas_sao_ignoradas():
+    regras = RegrasCorrecao.do_mapa({'*|*|*|*': 'X|Y|*|*', 'A|B|*|*': '*|*|C|*', 'Velho|*|*|*': 'Novo|*|*|*'})
+    assert regras.regras == [RegraCampo('PROJETO', 'Velho', 'Novo')]
+    assert regras.excecoes == {}
+
+
+def test_mapa_compilado_nao_reescreve_chaves_validas_do_cc():
+    from compilar_mapa_correcoes import verificar_chaves_validas
+    mapa = {'P1|A1|Unidade X|2025': 'P1|A1|Unidade Y|2025', 'P2|A2|Unidade X|2025': 'P2|A2|Unidade Y|2025'}
+    chaves_validas = ['P1|A1|Unidade Y|2025', 'P2|A2|Unidade Y|2025', 'P3|A3|Unidade X|2025']
+
+    # Sem as chaves do CC, a regra 'Unidade X -> Unidade Y' alcança uma chave que nunca esteve quebrada.
+    sem_cc = compilar_regras(mapa).para_mapa()
+    assert verificar_chaves_validas(mapa, sem_cc, chaves_validas) == ['P3|A3|Unidade X|2025']
+
+    com_cc = compilar_regras(mapa, chaves_validas=chaves_validas)
+    assert com_cc.corrigir_chave('P3|A3|Unidade X|2025') is None
+    assert verificar_chaves_validas(mapa, com_cc.para_mapa(), chaves_validas) == []
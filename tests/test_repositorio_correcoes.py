@@ -0,0 +1,214 @@
+import json
+import sqlite3
+import zlib
+from contextlib import closing
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from processamento.repositorio_correcoes import NUM_BALDES, VERSAO_ESQUEMA, RepositorioCorrecoes
+
+
+class ServidorFalso:
+    """Simula dbo.MapaCorrecoesChaves e as consultas de checksum por balde."""
+
+    def __init__(self, mapa: dict):
+        self.mapa = dict(mapa)
+        self.linhas_baixadas = 0
+
+    @staticmethod
+    def balde(chave: str) -> int:
+        return zlib.crc32(chave.encode("utf-8")) % NUM_BALDES
+
+    def consultar_baldes(self, engine) -> dict:
+        baldes = {}
+        for quebrada, correta in self.mapa.items():
+            linhas, checksum = baldes.get(self.balde(quebrada), (0, 0))
+            baldes[self.balde(quebrada)] = (linhas + 1, checksum ^ zlib.crc32(f"{quebrada}|{correta}".encode("utf-8")))
+        return baldes
+
+    def baixar_baldes(self, engine, baldes: list) -> pd.DataFrame:
+        linhas = [(q, c, self.balde(q)) for q, c in self.mapa.items() if self.balde(q) in baldes]
+        self.linhas_baixadas += len(linhas)
+        return pd.DataFrame(linhas, columns=["ChaveQuebrada", "ChaveCorreta", "Balde"])
+
+    def mesclar(self, connection, linhas) -> dict:
+        contagem = {"inseridas": 0, "atualizadas": 0}
+        for quebrada, correta in linhas:
+            if quebrada not in self.mapa:
+                contagem["inseridas"] += 1
+            elif self.mapa[quebrada] != correta:
+                contagem["atualizadas"] += 1
+            self.mapa[quebrada] = correta
+        return contagem
+
+
+@pytest.fixture
+def servidor(monkeypatch) -> ServidorFalso:
+    servidor = ServidorFalso({f"P{i}|A|U|2025": f"Projeto {i}|A|U|2025" for i in range(200)})
+    monkeypatch.setattr(RepositorioCorrecoes, "_engine_servidor", lambda self: None)
+    monkeypatch.setattr(RepositorioCorrecoes, "_consultar_baldes_servidor", lambda self, engine: servidor.consultar_baldes(engine))
+    monkeypatch.setattr(RepositorioCorrecoes, "_baixar_baldes", lambda self, engine, baldes: servidor.baixar_baldes(engine, baldes))
+    monkeypatch.setattr(RepositorioCorrecoes, "_mesclar_no_servidor", lambda self, connection, linhas: servidor.mesclar(connection, linhas))
+    return servidor
+
+
+@pytest.fixture
+def engine_transacional(monkeypatch):
+    """Engine real (SQLite em memória) só para fornecer a transação de 'enviar_pendentes'."""
+    monkeypatch.setattr(RepositorioCorrecoes, "_engine_servidor", lambda self: create_engine("sqlite://"))
+
+
+def test_primeira_sincronizacao_baixa_o_mapa_inteiro(tmp_path, servidor):
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+
+    assert repositorio.obter_mapa() == servidor.mapa
+    assert servidor.linhas_baixadas == 200
+
+
+def test_sincronizacao_baixa_apenas_baldes_alterados(tmp_path, servidor):
+    RepositorioCorrecoes(tmp_path / "mapa.db").obter_mapa()
+    servidor.linhas_baixadas = 0
+    servidor.mapa["P0|A|U|2025"] = "Outro|A|U|2025"
+    del servidor.mapa["P1|A|U|2025"]
+    servidor.mapa["Nova|A|U|2025"] = "Corrigida|A|U|2025"
+
+    # Um novo processo reaproveita a cópia local gravada em disco.
+    mapa = RepositorioCorrecoes(tmp_path / "mapa.db").obter_mapa()
+
+    assert mapa == servidor.mapa
+    assert 0 < servidor.linhas_baixadas < 50
+
+
+def test_sem_alteracoes_nada_e_baixado(tmp_path, servidor):
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+    repositorio.obter_mapa()
+    servidor.linhas_baixadas = 0
+
+    assert repositorio.obter_mapa() == servidor.mapa
+    assert servidor.linhas_baixadas == 0
+
+
+def test_registrar_atualiza_a_copia_local(tmp_path, servidor):
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+    repositorio.obter_mapa()
+
+    servidor.mapa["Nova|A|U|2025"] = "Corrigida|A|U|2025"
+    repositorio.registrar("Nova|A|U|2025", "Corrigida|A|U|2025")
+
+    assert RepositorioCorrecoes(tmp_path / "mapa.db")._ler_mapa_local()["Nova|A|U|2025"] == "Corrigida|A|U|2025"
+    assert repositorio.obter_mapa() == servidor.mapa
+
+
+def test_falha_no_servidor_usa_copia_local(tmp_path, servidor, monkeypatch):
+    RepositorioCorrecoes(tmp_path / "mapa.db").obter_mapa()
+
+    def falhar(self, engine):
+        raise ConnectionError("servidor indisponível")
+    monkeypatch.setattr(RepositorioCorrecoes, "_consultar_baldes_servidor", falhar)
+
+    assert RepositorioCorrecoes(tmp_path / "mapa.db").obter_mapa() == servidor.mapa
+
+
+def test_consultas_pontuais_e_por_prefixo_leem_o_arquivo(tmp_path, servidor):
+    RepositorioCorrecoes(tmp_path / "mapa.db").obter_mapa()
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+
+    assert repositorio.consultar("P7|A|U|2025") == "Projeto 7|A|U|2025"
+    assert repositorio.consultar("Inexistente|A|U|2025") is None
+    assert repositorio.listar_por_projeto("P7") == {"P7|A|U|2025": "Projeto 7|A|U|2025"}
+    assert list(repositorio.listar_por_prefixo("P1")) == sorted(chave for chave in servidor.mapa if chave.startswith("P1"))
+    assert repositorio._mapa is None
+
+
+def test_importar_e_exportar_json(tmp_path):
+    mapa = {"Ação Á|B|C|2024": "Ação A|B|C|2024", "X|Y|Z|2025": "X|Y|W|2025"}
+    origem = tmp_path / "origem.json"
+    origem.write_text(json.dumps(mapa, ensure_ascii=False), encoding="utf-8")
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+
+    assert repositorio.importar_json(origem) == 2
+    assert repositorio.exportar_json(tmp_path / "destino.json") == 2
+    assert json.loads((tmp_path / "destino.json").read_text(encoding="utf-8")) == mapa
+    assert RepositorioCorrecoes(tmp_path / "outro.db").exportar_json(tmp_path / "vazio.json") == 0
+    assert json.loads((tmp_path / "vazio.json").read_text(encoding="utf-8")) == {}
+
+
+def test_arquivo_com_esquema_antigo_e_recriado(tmp_path, servidor):
+    caminho = tmp_path / "mapa.db"
+    with closing(sqlite3.connect(caminho)) as conn, conn:
+        conn.execute("CREATE TABLE correcoes (ChaveQuebrada TEXT PRIMARY KEY, ChaveCorreta TEXT NOT NULL, Balde INTEGER)")
+        conn.execute("CREATE TABLE baldes (Balde INTEGER PRIMARY KEY, Linhas INTEGER NOT NULL, Checksum INTEGER)")
+        conn.execute("INSERT INTO correcoes VALUES ('Velha|A|U|2020', 'Antiga|A|U|2020', 0)")
+
+    assert RepositorioCorrecoes(caminho).obter_mapa() == servidor.mapa
+    with closing(sqlite3.connect(caminho)) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == VERSAO_ESQUEMA
+        assert "WITHOUT ROWID" in conn.execute("SELECT sql FROM sqlite_master WHERE name = 'correcoes'").fetchone()[0]
+
+
+def test_enviar_para_servidor_substitui_a_tabela(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'servidor.db'}")
+
+    @event.listens_for(engine, "connect")
+    def anexar_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS dbo.MapaCorrecoesChaves (ChaveQuebrada TEXT PRIMARY KEY, ChaveCorreta TEXT)"))
+        connection.execute(text("INSERT INTO dbo.MapaCorrecoesChaves VALUES ('Antiga|A|U|2020', 'X|A|U|2020')"))
+    monkeypatch.setattr(RepositorioCorrecoes, "_engine_servidor", lambda self: engine)
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+    for i in range(2500):
+        repositorio.registrar(f"P{i}|A|U|2025", f"Projeto {i}|A|U|2025")
+
+    assert repositorio.enviar_para_servidor(substituir=True) == 2500
+    with engine.connect() as connection:
+        mapa_servidor = dict(connection.execute(text("SELECT ChaveQuebrada, ChaveCorreta FROM dbo.MapaCorrecoesChaves")).all())
+    assert mapa_servidor == repositorio._ler_mapa_local()
+
+
+def test_correcoes_enfileiradas_ficam_no_diario_e_no_mapa_local(tmp_path, servidor):
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+    repositorio.obter_mapa()
+    repositorio.enfileirar("Nova|A|U|2025", "Corrigida|A|U|2025")
+
+    # Um novo processo (ex.: após uma queda) ainda encontra a correção e a pendência.
+    reaberto = RepositorioCorrecoes(tmp_path / "mapa.db")
+    assert reaberto.total_pendentes() == 1
+    assert reaberto.consultar("Nova|A|U|2025") == "Corrigida|A|U|2025"
+    assert "Nova|A|U|2025" not in servidor.mapa
+
+
+def test_enviar_pendentes_mescla_em_lote_e_esvazia_o_diario(tmp_path, servidor, engine_transacional):
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+    repositorio.enfileirar("Nova|A|U|2025", "Corrigida|A|U|2025")
+    repositorio.enfileirar("P0|A|U|2025", "Outro|A|U|2025")
+    repositorio.enfileirar("P1|A|U|2025", "Projeto 1|A|U|2025")
+
+    assert repositorio.enviar_pendentes() == {"inseridas": 1, "atualizadas": 1}
+    assert repositorio.total_pendentes() == 0
+    assert servidor.mapa["Nova|A|U|2025"] == "Corrigida|A|U|2025"
+    assert servidor.mapa["P0|A|U|2025"] == "Outro|A|U|2025"
+    assert repositorio.enviar_pendentes() == {"inseridas": 0, "atualizadas": 0}
+
+
+def test_falha_no_envio_mantem_o_diario(tmp_path, servidor, engine_transacional, monkeypatch):
+    def falhar(self, connection, linhas):
+        raise ConnectionError("servidor indisponível")
+    monkeypatch.setattr(RepositorioCorrecoes, "_mesclar_no_servidor", falhar)
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+    repositorio.enfileirar("Nova|A|U|2025", "Corrigida|A|U|2025")
+
+    with pytest.raises(ConnectionError):
+        repositorio.enviar_pendentes()
+    assert repositorio.total_pendentes() == 1
+
+
+def test_sincronizacao_completa_preserva_correcoes_pendentes(tmp_path, servidor):
+    repositorio = RepositorioCorrecoes(tmp_path / "mapa.db")
+    repositorio.enfileirar("P0|A|U|2025", "Pendente|A|U|2025")
+    repositorio._sincronizar(completo=True)
+
+    assert repositorio.obter_mapa()["P0|A|U|2025"] == "Pendente|A|U|2025"
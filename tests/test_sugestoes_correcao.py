@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from processamento.sugestoes_correcao import (
+    COLUNAS_SUGESTOES, carregar_sugestoes, gerar_sugestoes, salvar_sugestoes, selecionar_correcoes_automaticas,
+)
+
+
+@pytest.fixture
+def df_referencia() -> pd.DataFrame:
+    return pd.DataFrame({
+        'PROJETO': ['ALI Rural', 'ALI Rural', 'Sebrae na Escola', 'Sebrae na Escola', 'Empreenda Rápido'],
+        'ACAO': ['Bolsas ALI', 'Atendimento', 'Educação Empreendedora', 'Formação de Professores', 'Crédito'],
+        'UNIDADE': ['Agronegócios', 'Agronegócios', 'Educação', 'Educação', 'Capital'],
+        'ANO': [2025, 2025, 2025, 2025, 2025],
+        'CODCCUSTO': ['1', '2', '3', '4', '5'],
+    }).astype({'PROJETO': 'category', 'ACAO': 'category', 'UNIDADE': 'category'})
+
+
+def test_gerar_sugestoes_ranqueia_combinacoes_da_referencia(df_referencia):
+    chaves = {'ALI rural|Bolsas ALI|Agronegocios|2025', 'Sebrae na Escola|Formacao de Professores|Educação|2025', 'malformada'}
+
+    df_sugestoes = gerar_sugestoes(chaves, df_referencia, limite=3, workers=1)
+
+    assert list(df_sugestoes.columns) == COLUNAS_SUGESTOES
+    assert set(df_sugestoes['ChaveQuebrada']) == chaves - {'malformada'}
+    primeiras = df_sugestoes[df_sugestoes['Posicao'] == 1].set_index('ChaveQuebrada')['ChaveSugerida']
+    assert primeiras['ALI rural|Bolsas ALI|Agronegocios|2025'] == 'ALI Rural|Bolsas ALI|Agronegócios|2025'
+    assert primeiras['Sebrae na Escola|Formacao de Professores|Educação|2025'] == 'Sebrae na Escola|Formação de Professores|Educação|2025'
+    for _, grupo in df_sugestoes.groupby('ChaveQuebrada'):
+        assert grupo['Posicao'].tolist() == [1, 2, 3]
+        assert grupo['Pontuacao'].is_monotonic_decreasing
+
+
+def test_gerar_sugestoes_so_compara_combinacoes_do_mesmo_ano(df_referencia):
+    # 'Empreenda Rápido|Crédito|Capital' só existe em 2025; em 2024 a referência tem outra combinação.
+    df_2024 = pd.DataFrame({
+        'PROJETO': ['Sebrae na Escola'], 'ACAO': ['Educação Empreendedora'], 'UNIDADE': ['Educação'], 'ANO': [2024], 'CODCCUSTO': ['6'],
+    })
+    df_referencia = pd.concat([df_referencia.astype(object), df_2024], ignore_index=True)
+    chaves = {'Empreenda Rapido|Credito|Capital|2024', 'Empreenda Rapido|Credito|Capital|2023'}
+
+    df_sugestoes = gerar_sugestoes(chaves, df_referencia, limite=3, workers=1)
+
+    assert df_sugestoes['ChaveSugerida'].tolist() == ['Sebrae na Escola|Educação Empreendedora|Educação|2024']
+    assert selecionar_correcoes_automaticas(df_sugestoes, limiar=95) == {}
+
+
+def test_selecionar_correcoes_automaticas_respeita_limiar_e_empates():
+    df_sugestoes = pd.DataFrame({
+        'ChaveQuebrada': ['A', 'A', 'B', 'B', 'C', 'C', 'D'],
+        'Posicao': [1, 2, 1, 2, 1, 2, 1],
+        'ChaveSugerida': ['A1', 'A2', 'B1', 'B2', 'C1', 'C2', 'D'],
+        'Pontuacao': [97.0, 80.0, 90.0, 50.0, 98.0, 98.0, 100.0],
+    })
+
+    # B fica abaixo do limiar, C empata com a segunda sugestão e D já é a própria chave.
+    assert selecionar_correcoes_automaticas(df_sugestoes, limiar=95) == {'A': 'A1'}
+
+
+def test_salvar_e_carregar_sugestoes(tmp_path, df_referencia):
+    df_sugestoes = gerar_sugestoes({'ALI rural|Bolsas ALI|Agronegocios|2025'}, df_referencia, workers=1)
+    caminho = salvar_sugestoes(df_sugestoes, tmp_path / 'sugestoes.parquet')
+
+    pd.testing.assert_frame_equal(carregar_sugestoes(caminho), df_sugestoes)
+    assert carregar_sugestoes(tmp_path / 'inexistente.parquet').empty
@@ -0,0 +1,111 @@
+import pandas as pd
+import pytest
+
+from processamento.chaves import CODIFICADOR_PADRAO
+from processamento.validacao import (
+    aplicar_mapa_correcoes, classificar_correcoes_para_normalizacao, preparar_dados_para_validacao, preparar_mapa_correcoes,
+)
+
+
+def _aplicar_mapa_correcoes_linha_a_linha(df: pd.DataFrame, mapa_correcoes: dict) -> pd.DataFrame:
+    """Implementação original (apply por linha), mantida como referência de equivalência."""
+    df_copy = df.copy()
+    df_copy['CHAVE_CONCAT_original'] = df_copy['CHAVE_CONCAT']
+    linhas_para_corrigir_idx = df_copy.index[df_copy['CHAVE_CONCAT'].isin(mapa_correcoes.keys())]
+    if not linhas_para_corrigir_idx.empty:
+        def aplicar_correcao_linha(row):
+            chave_corrigida_str = mapa_correcoes.get(row['CHAVE_CONCAT'])
+            if chave_corrigida_str:
+                try:
+                    partes = chave_corrigida_str.split('|')
+                    row['PROJETO'], row['ACAO'], row['UNIDADE'], row['ANO'] = partes[0], partes[1], partes[2], int(partes[3])
+                except (IndexError, ValueError):
+                    pass
+            return row
+        df_copy.loc[linhas_para_corrigir_idx] = df_copy.loc[linhas_para_corrigir_idx].apply(aplicar_correcao_linha, axis=1)
+        df_copy['ANO'] = df_copy['ANO'].astype(int)
+    return df_copy
+
+
+@pytest.fixture
+def df_orcado_preparado() -> pd.DataFrame:
+    df = pd.DataFrame({
+        'PROJETO': ['ALI BRASIL MAIS', 'ALI BRASIL MAIS', 'Projeto Certo', 'Projeto Velho', 'Projeto Velho'],
+        'ACAO': ['Ganhos Rápidos', 'Ganhos Rápidos', 'Ação 1', 'Ação 2', 'Ação 3'],
+        'UNIDADE': ['Desenvolvimento Setorial e Territorial', 'SP - Desenvolvimento Setorial e Territorial', 'Unidade A', 'Unidade B', 'Unidade C'],
+        'ANO': [2021, 2022, 2025, 2025, 2025],
+        'MES': [1, 2, 3, 4, 5],
+        'Valor_Ajustado': [10.0, 20.0, 30.0, 40.0, 50.0],
+    }, index=[10, 11, 12, 13, 14])
+    return preparar_dados_para_validacao(df, ['PROJETO', 'ACAO', 'UNIDADE'], incluir_ano_na_chave=True)
+
+
+@pytest.fixture
+def mapa_correcoes() -> dict:
+    return {
+        'ALI BRASIL MAIS|Ganhos Rápidos|Desenvolvimento Setorial e Territorial|2021': 'ALI BRASIL MAIS|Ganhos Rápidos|DESENVOLVIMENTO SETORIAL E TERRITORIAL|2020',
+        'Projeto Velho|Ação 2|Unidade B|2025': 'Projeto Novo|Ação 2|Unidade B|2025',
+        'Projeto Velho|Ação 3|Unidade C|2025': 'chave|malformada',
+        'Chave|Sem|Linhas|2025': 'Outra|Chave|Qualquer|2025',
+    }
+
+
+def _com_chave_texto(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(CHAVE_CONCAT=CODIFICADOR_PADRAO.decodificar(df['CHAVE_COD']))
+
+
+def test_aplicar_mapa_correcoes_equivale_a_implementacao_linha_a_linha(df_orcado_preparado, mapa_correcoes):
+    esperado = _aplicar_mapa_correcoes_linha_a_linha(_com_chave_texto(df_orcado_preparado), mapa_correcoes)
+    resultado = aplicar_mapa_correcoes(df_orcado_preparado, mapa_correcoes)
+
+    pd.testing.assert_frame_equal(resultado, esperado.drop(columns=['CHAVE_CONCAT', 'CHAVE_CONCAT_original']))
+    # A CHAVE_COD continua representando a chave original da linha.
+    assert CODIFICADOR_PADRAO.decodificar(resultado['CHAVE_COD']).tolist() == esperado['CHAVE_CONCAT_original'].tolist()
+    assert resultado.loc[10, 'UNIDADE'] == 'DESENVOLVIMENTO SETORIAL E TERRITORIAL'
+    assert resultado.loc[10, 'ANO'] == 2020
+    assert resultado.loc[13, 'PROJETO'] == 'Projeto Novo'
+    assert resultado.loc[14, 'PROJETO'] == 'Projeto Velho'
+
+
+def test_aplicar_mapa_correcoes_sem_correspondencias_mantem_dados(df_orcado_preparado):
+    mapa = {'Nada|Corresponde|Aqui|2025': 'Outra|Chave|Qualquer|2025'}
+    esperado = _aplicar_mapa_correcoes_linha_a_linha(_com_chave_texto(df_orcado_preparado), mapa)
+
+    pd.testing.assert_frame_equal(
+        aplicar_mapa_correcoes(df_orcado_preparado, mapa), esperado.drop(columns=['CHAVE_CONCAT', 'CHAVE_CONCAT_original'])
+    )
+
+
+def test_preparar_mapa_correcoes_descarta_chaves_malformadas(mapa_correcoes):
+    df_mapa = preparar_mapa_correcoes(mapa_correcoes)
+
+    assert 'Projeto Velho|Ação 3|Unidade C|2025' not in df_mapa.index
+    assert df_mapa.loc['Projeto Velho|Ação 2|Unidade B|2025'].tolist() == ['Projeto Novo', 'Ação 2', 'Unidade B', 2025]
+
+
+def test_aplicar_mapa_correcoes_em_colunas_categoricas(df_orcado_preparado, mapa_correcoes):
+    esperado = aplicar_mapa_correcoes(df_orcado_preparado, mapa_correcoes)
+    df_categorico = df_orcado_preparado.astype({'PROJETO': 'category', 'ACAO': 'category', 'UNIDADE': 'category'})
+
+    resultado = aplicar_mapa_correcoes(df_categorico, mapa_correcoes)
+
+    assert isinstance(resultado['PROJETO'].dtype, pd.CategoricalDtype)
+    como_texto = {'PROJETO': object, 'ACAO': object, 'UNIDADE': object}
+    pd.testing.assert_frame_equal(resultado.astype(como_texto), esperado.astype(como_texto))
+
+
+def test_classificar_correcoes_para_normalizacao():
+    mapa = {
+        'Projeto|Ação|Unidade Geral|2025': 'PROJETO|ACAO|UNIDADE GERAL|2025',
+        'Projeto|Ação|Unidade  X|2021': 'Projeto|Ação|Unidade X|2020',
+        'PROJETO|ACAO|UNIDADE X|2021': 'Projeto|Ação|Unidade X|2020',
+        'projeto|ação|unidade x|2021': 'Projeto|Ação|Unidade Y|2020',
+    }
+
+    classificacao = classificar_correcoes_para_normalizacao(mapa)
+
+    assert classificacao == {
+        'redundantes': ['Projeto|Ação|Unidade Geral|2025'],
+        'duplicadas': ['PROJETO|ACAO|UNIDADE X|2021'],
+        'conflitantes': ['projeto|ação|unidade x|2021'],
+    }
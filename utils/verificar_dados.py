@@ -38,11 +38,11 @@ def verificar_unidade(unidade_alvo: str, df_base_total: pd.DataFrame):
     # --- Verificação do Treemap (agora focado no executado) ---
     print("\n[VERIFICAÇÃO TREEMAP - GASTOS EXECUTADOS (EXCLUSIVOS)]")
     if not df_exclusivos.empty:
-        df_agg = df_exclusivos.groupby(['NATUREZA_FINAL', 'PROJETO'])['Valor_Executado'].sum().reset_index()
+        df_agg = df_exclusivos.groupby(['NATUREZA_FINAL', 'PROJETO'], observed=True)['Valor_Executado'].sum().reset_index()
         df_agg = df_agg[df_agg['Valor_Executado'] > 0]
         
         if not df_agg.empty:
-            df_natureza_sum = df_agg.groupby('NATUREZA_FINAL')['Valor_Executado'].sum().nlargest(5)
+            df_natureza_sum = df_agg.groupby('NATUREZA_FINAL', observed=True)['Valor_Executado'].sum().nlargest(5)
             print("Top 5 Naturezas por Valor Executado em Projetos Exclusivos:")
             for natureza, valor in df_natureza_sum.items():
                 print(f"- {natureza}: {formatar_brl(valor)}")
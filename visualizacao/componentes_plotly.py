@@ -10,25 +10,25 @@ def criar_grafico_sunburst(df_exclusivos: pd.DataFrame) -> str:
     """Gera o código HTML de um gráfico Sunburst a partir dos dados de projetos exclusivos."""
     if df_exclusivos.empty:
         return '<div class="flex items-center justify-center h-full text-center text-gray-500">Sem dados para exibir.</div>'
-    df_sun = df_exclusivos.groupby(['PROJETO', 'NATUREZA_FINAL']).agg(Valor_Planejado=('Valor_Planejado', 'sum'), Valor_Executado=('Valor_Executado', 'sum')).reset_index()
+    df_sun = df_exclusivos.groupby(['PROJETO', 'NATUREZA_FINAL'], observed=True).agg(Valor_Planejado=('Valor_Planejado', 'sum'), Valor_Executado=('Valor_Executado', 'sum')).reset_index()
     df_sun = df_sun[df_sun['Valor_Planejado'] > 0]
     if df_sun.empty:
         return '<div class="flex items-center justify-center h-full text-center text-gray-500">Sem dados com orçamento planejado para exibir.</div>'
     df_sun['perc_exec'] = (df_sun['Valor_Executado'] / df_sun['Valor_Planejado']) * 100
-    cores_projeto = df_sun.groupby('PROJETO').apply(lambda x: (x['Valor_Executado'].sum() / x['Valor_Planejado'].sum()) * 100 if x['Valor_Planejado'].sum() > 0 else 0, include_groups=False).tolist()
+    cores_projeto = df_sun.groupby('PROJETO', observed=True).apply(lambda x: (x['Valor_Executado'].sum() / x['Valor_Planejado'].sum()) * 100 if x['Valor_Planejado'].sum() > 0 else 0, include_groups=False).tolist()
     fig = go.Figure()
-    fig.add_trace(go.Sunburst(labels=df_sun['NATUREZA_FINAL'].tolist() + df_sun['PROJETO'].unique().tolist(), parents=df_sun['PROJETO'].tolist() + [""] * df_sun['PROJETO'].nunique(), values=df_sun['Valor_Planejado'].tolist() + df_sun.groupby('PROJETO')['Valor_Planejado'].sum().tolist(), branchvalues='total', marker=dict(colors=df_sun['perc_exec'].tolist() + cores_projeto, colorscale='RdYlGn', cmin=0, cmax=120, colorbar=dict(title='% Executado')), hovertemplate='<b>%{label}</b><br>Planejado: %{value:,.2f}<br>Execução: %{color:.1f}%<extra></extra>'))
+    fig.add_trace(go.Sunburst(labels=df_sun['NATUREZA_FINAL'].tolist() + df_sun['PROJETO'].unique().tolist(), parents=df_sun['PROJETO'].tolist() + [""] * df_sun['PROJETO'].nunique(), values=df_sun['Valor_Planejado'].tolist() + df_sun.groupby('PROJETO', observed=True)['Valor_Planejado'].sum().tolist(), branchvalues='total', marker=dict(colors=df_sun['perc_exec'].tolist() + cores_projeto, colorscale='RdYlGn', cmin=0, cmax=120, colorbar=dict(title='% Executado')), hovertemplate='<b>%{label}</b><br>Planejado: %{value:,.2f}<br>Execução: %{color:.1f}%<extra></extra>'))
     fig.update_layout(margin=dict(t=10, l=10, r=10, b=10))
     return fig.to_html(full_html=False)
 
 def criar_grafico_heatmap(df_exclusivos: pd.DataFrame) -> str:
     """Gera o código HTML de um gráfico Heatmap da performance de execução."""
     if df_exclusivos.empty: return '<div class="flex items-center justify-center h-full text-center text-gray-500">Sem dados para exibir.</div>'
-    df_agg = df_exclusivos.groupby(['PROJETO', 'NATUREZA_FINAL']).agg(Valor_Planejado=('Valor_Planejado', 'sum'), Valor_Executado=('Valor_Executado', 'sum')).reset_index()
+    df_agg = df_exclusivos.groupby(['PROJETO', 'NATUREZA_FINAL'], observed=True).agg(Valor_Planejado=('Valor_Planejado', 'sum'), Valor_Executado=('Valor_Executado', 'sum')).reset_index()
     df_agg = df_agg[df_agg['Valor_Planejado'] > 0]
     if df_agg.empty: return '<div class="flex items-center justify-center h-full text-center text-gray-500">Sem dados com orçamento planejado para exibir.</div>'
     df_agg['perc_exec'] = (df_agg['Valor_Executado'] / df_agg['Valor_Planejado']) * 100
-    pivot_df = df_agg.pivot_table(index='PROJETO', columns='NATUREZA_FINAL', values='perc_exec', fill_value=None)
+    pivot_df = df_agg.pivot_table(index='PROJETO', columns='NATUREZA_FINAL', values='perc_exec', fill_value=None, observed=True)
     if pivot_df.empty: return '<div class="flex items-center justify-center h-full text-center text-gray-500">Não foi possível criar a visão pivotada.</div>'
     num_projetos = len(pivot_df.index)
     dynamic_height = max(400, num_projetos * 35)
@@ -44,12 +44,12 @@ def criar_grafico_inercia(df_exclusivos: pd.DataFrame) -> str:
             if (gasto_mes := group[group['Valor_Executado'] > 0]['MES'].min()) and pd.notna(gasto_mes):
                 return gasto_mes - plan_mes
         return np.nan
-    df_inercia = df_exclusivos.groupby(['PROJETO', 'ACAO', 'NATUREZA_FINAL']).apply(calcular_inercia, include_groups=False).dropna()
+    df_inercia = df_exclusivos.groupby(['PROJETO', 'ACAO', 'NATUREZA_FINAL'], observed=True).apply(calcular_inercia, include_groups=False).dropna()
     if df_inercia.empty: return '<div class="flex items-center justify-center h-full text-center text-gray-500">Não há dados de inércia para calcular.</div>'
     df_inercia = df_inercia.reset_index(name='inercia_meses')
     df_inercia = df_inercia[df_inercia['inercia_meses'] > 0]
     if df_inercia.empty: return '<div class="flex items-center justify-center h-full text-center text-gray-500">Nenhum atraso de execução identificado.</div>'
-    idx_max = df_inercia.groupby('NATUREZA_FINAL')['inercia_meses'].idxmax()
+    idx_max = df_inercia.groupby('NATUREZA_FINAL', observed=True)['inercia_meses'].idxmax()
     df_maior_inercia = df_inercia.loc[idx_max].sort_values(by='inercia_meses', ascending=False)
     hover_text = [f"<b>Projeto:</b> {row['PROJETO']}<br><b>Ação:</b> {row['ACAO']}<br><b>Atraso:</b> {row['inercia_meses']:.0f} meses" for _, row in df_maior_inercia.iterrows()]
     fig = go.Figure()
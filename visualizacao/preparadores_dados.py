@@ -22,7 +22,7 @@ def preparar_dados_kpi(df_unidade: pd.DataFrame, df_exclusivos: pd.DataFrame, df
     }
 
 def preparar_dados_grafico_tendencia(df_unidade: pd.DataFrame) -> dict:
-    df_trend = df_unidade.groupby(['MES', 'tipo_projeto'])['Valor_Executado'].sum().unstack(fill_value=0).reindex(range(1, 13), fill_value=0)
+    df_trend = df_unidade.groupby(['MES', 'tipo_projeto'], observed=True)['Valor_Executado'].sum().unstack(fill_value=0).reindex(range(1, 13), fill_value=0)
     df_trend['Total'] = df_trend.sum(axis=1)
     return {
         "labels": ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez'],
@@ -35,14 +35,14 @@ def preparar_dados_grafico_tendencia(df_unidade: pd.DataFrame) -> dict:
 
 def preparar_dados_treemap(df_source: pd.DataFrame) -> dict:
     if df_source is None or df_source.empty: return {}
-    df_agg = df_source.groupby(['NATUREZA_FINAL', 'PROJETO'])['Valor_Executado'].sum().reset_index()
+    df_agg = df_source.groupby(['NATUREZA_FINAL', 'PROJETO'], observed=True)['Valor_Executado'].sum().reset_index()
     df_agg = df_agg[df_agg['Valor_Executado'] > 0]
     if df_agg.empty: return {}
     def format_projetos(group):
         top_projetos = group.nlargest(3, 'Valor_Executado')
         return '<br>'.join([f"- {row.PROJETO} ({formatar_brl(row.Valor_Executado)})" for _, row in top_projetos.iterrows()])
-    projetos_por_natureza = df_agg.groupby('NATUREZA_FINAL').apply(format_projetos, include_groups=False).to_dict()
-    df_natureza_sum = df_agg.groupby('NATUREZA_FINAL')['Valor_Executado'].sum().reset_index()
+    projetos_por_natureza = df_agg.groupby('NATUREZA_FINAL', observed=True).apply(format_projetos, include_groups=False).to_dict()
+    df_natureza_sum = df_agg.groupby('NATUREZA_FINAL', observed=True)['Valor_Executado'].sum().reset_index()
     return {
         'labels': df_natureza_sum['NATUREZA_FINAL'].tolist(),
         'parents': [""] * len(df_natureza_sum),
@@ -59,7 +59,7 @@ def preparar_dados_orcamento_ocioso(df_unidade: pd.DataFrame) -> dict:
         return {}
 
     # 1. Agrega o total planejado e executado por projeto e tipo.
-    df_agg = df_unidade.groupby(['PROJETO', 'tipo_projeto']).agg(
+    df_agg = df_unidade.groupby(['PROJETO', 'tipo_projeto'], observed=True).agg(
         total_planejado=('Valor_Planejado', 'sum'),
         total_executado=('Valor_Executado', 'sum')
     ).reset_index()
@@ -79,12 +79,13 @@ def preparar_dados_orcamento_ocioso(df_unidade: pd.DataFrame) -> dict:
         index='PROJETO',
         columns='tipo_projeto',
         values='saldo_nao_utilizado',
-        fill_value=0
+        fill_value=0,
+        observed=True
     ).reindex(top_7_nomes_projetos) # Reindexar para manter a ordem do nlargest
 
     # 5. Prepara os detalhes para os tooltips (principais ações contribuintes)
     df_filtrado_para_tooltip = df_unidade[df_unidade['PROJETO'].isin(top_7_nomes_projetos)].copy()
-    df_acoes_agg = df_filtrado_para_tooltip.groupby(['PROJETO', 'ACAO']).agg(
+    df_acoes_agg = df_filtrado_para_tooltip.groupby(['PROJETO', 'ACAO'], observed=True).agg(
         planejado_acao=('Valor_Planejado', 'sum'),
         executado_acao=('Valor_Executado', 'sum')
     ).reset_index()
@@ -94,7 +95,7 @@ def preparar_dados_orcamento_ocioso(df_unidade: pd.DataFrame) -> dict:
         top_acoes = group[group['saldo_acao'] > 0].nlargest(3, 'saldo_acao')
         return [f"- {acao}: {formatar_brl(saldo)}" for _, (acao, saldo) in top_acoes[['ACAO', 'saldo_acao']].iterrows()]
 
-    detalhes_por_projeto = df_acoes_agg.groupby('PROJETO').apply(formatar_acoes, include_groups=False).reindex(df_pivot.index, fill_value=[])
+    detalhes_por_projeto = df_acoes_agg.groupby('PROJETO', observed=True).apply(formatar_acoes, include_groups=False).reindex(df_pivot.index, fill_value=[])
 
     # Monta o dicionário final para o Chart.js
     tipos_projeto = df_top_7.set_index('PROJETO')['tipo_projeto']
@@ -111,7 +112,7 @@ def preparar_dados_orcamento_ocioso(df_unidade: pd.DataFrame) -> dict:
 
 def preparar_dados_execucao_sem_planejamento(df_source: pd.DataFrame, tipo: str) -> dict:
     if df_source is None or df_source.empty: return {}
-    df_agg = df_source.groupby(['NATUREZA_FINAL', 'PROJETO']).agg(
+    df_agg = df_source.groupby(['NATUREZA_FINAL', 'PROJETO'], observed=True).agg(
         Valor_Planejado=('Valor_Planejado', 'sum'),
         Valor_Executado=('Valor_Executado', 'sum')
     ).reset_index()
@@ -120,8 +121,8 @@ def preparar_dados_execucao_sem_planejamento(df_source: pd.DataFrame, tipo: str)
     def formatar_projetos(group):
         top = group.nlargest(3, 'Valor_Executado')
         return [f"- {row.PROJETO}: {formatar_brl(row.Valor_Executado)}" for _, row in top.iterrows()]
-    df_sum = df_sem_plan.groupby('NATUREZA_FINAL')['Valor_Executado'].sum().sort_values(ascending=False)
-    detalhes = df_sem_plan.groupby('NATUREZA_FINAL').apply(formatar_projetos, include_groups=False).reindex(df_sum.index)
+    df_sum = df_sem_plan.groupby('NATUREZA_FINAL', observed=True)['Valor_Executado'].sum().sort_values(ascending=False)
+    detalhes = df_sem_plan.groupby('NATUREZA_FINAL', observed=True).apply(formatar_projetos, include_groups=False).reindex(df_sum.index)
     return {
         "labels": df_sum.index.tolist(),
         "values": df_sum.values.tolist(),